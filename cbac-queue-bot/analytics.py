@@ -0,0 +1,164 @@
+"""Columnar match-history analytics: map winrates, side balance, head-to-head.
+
+The match ledger is a dict of JSON records, which is fine for settling
+matches but means every stats question parses every record. MatchColumns
+keeps each guild's matches as parallel arrays instead:
+
+    match_ids   list        per match: ledger key
+    map_side    array("H")  per match: map code * 2 + 1 if CT won
+    by_player   {user id: array("i")}, the player column stored by player:
+                row * 2 + 1 if they were on CT, for each match they played
+
+Guild-wide stats are a single Counter over map_side, which runs in C;
+per-player and head-to-head stats only visit the player's own entries.
+Tables are built lazily per guild from the ledger, appended to as matches
+settle, and patched in place when a result is corrected. Only the stdlib
+is used, so the store server can hold them next to the ledger.
+"""
+from array import array
+from collections import Counter
+
+UNKNOWN_MAP = "UNKNOWN"
+
+def record_guild(match_id, record):
+    """Guild id of a ledger record. Older records only carry it in the key
+    ("<guild>_<lobby>_<time>"), newer keys are "<guild>:<lobby>:<lobby id>" """
+    guild_id = record.get("guild_id")
+    if guild_id is None:
+        guild_id = match_id.replace(":", "_").split("_", 1)[0]
+    try:
+        return int(guild_id)
+    except (TypeError, ValueError):
+        return 0
+
+def record_sides(record):
+    """(T side ids, CT side ids, ct_won) with corrections applied, or None if unusable.
+    /correctwin only ever flips a result, so a corrected record's winner is the other side"""
+    winner = record.get("winner")
+    if winner not in ("T", "CT"):
+        return None
+    winning = record.get("winning_side", [])
+    losing = record.get("losing_side", [])
+    t_side, ct_side = (winning, losing) if winner == "T" else (losing, winning)
+    ct_won = winner == "CT"
+    if record.get("corrected_at"):
+        ct_won = not ct_won
+    return t_side, ct_side, ct_won
+
+class GuildMatches:
+    """One guild's matches as parallel columns"""
+
+    def __init__(self):
+        self.maps = []       # map code -> name
+        self.map_codes = {}  # name -> map code
+        self.match_ids = []
+        self.map_side = array("H")
+        self.by_player = {}
+
+    def __len__(self):
+        return len(self.map_side)
+
+    def add_record(self, match_id, record):
+        sides = record_sides(record)
+        if sides is None:
+            return
+        t_side, ct_side, ct_won = sides
+        map_name = record.get("selected_map") or UNKNOWN_MAP
+        code = self.map_codes.get(map_name)
+        if code is None:
+            code = self.map_codes[map_name] = len(self.maps)
+            self.maps.append(map_name)
+
+        row = len(self.map_side)
+        self.match_ids.append(match_id)
+        self.map_side.append(code * 2 + ct_won)
+        by_player = self.by_player
+        for entry, user_ids in ((row * 2, t_side), (row * 2 + 1, ct_side)):
+            for user_id in user_ids:
+                slots = by_player.get(user_id)
+                if slots is None:
+                    slots = by_player[user_id] = array("i")
+                slots.append(entry)
+
+    def flip(self, match_id):
+        """Swap a corrected match's winner. False if the match isn't in the table"""
+        # Corrections are for recent matches, so look from the end
+        for row in range(len(self.match_ids) - 1, -1, -1):
+            if self.match_ids[row] == match_id:
+                self.map_side[row] ^= 1
+                return True
+        return False
+
+    def map_stats(self):
+        """{map: [matches, T wins, CT wins]}, most played first"""
+        stats = {}
+        for key, n in Counter(self.map_side).items():
+            entry = stats.setdefault(self.maps[key >> 1], [0, 0, 0])
+            entry[0] += n
+            entry[2 if key & 1 else 1] += n
+        return dict(sorted(stats.items(), key=lambda item: -item[1][0]))
+
+    def player_stats(self, user_id):
+        """({map: [played, wins]}, {"T"|"CT": [played, wins]}) for one player"""
+        by_map, by_side = {}, {"T": [0, 0], "CT": [0, 0]}
+        map_side, maps = self.map_side, self.maps
+        for entry in self.by_player.get(str(user_id), ()):
+            key = map_side[entry >> 1]
+            side = entry & 1
+            won = (key & 1) == side
+            stats = by_map.setdefault(maps[key >> 1], [0, 0])
+            stats[0] += 1
+            stats[1] += won
+            stats = by_side["CT" if side else "T"]
+            stats[0] += 1
+            stats[1] += won
+        return dict(sorted(by_map.items(), key=lambda item: -item[1][0])), by_side
+
+    def head_to_head(self, user_id, other_id):
+        """{"against": [matches, user_id's wins], "together": [matches, wins]}"""
+        result = {"against": [0, 0], "together": [0, 0]}
+        sides = {entry >> 1: entry & 1 for entry in self.by_player.get(str(user_id), ())}
+        for entry in self.by_player.get(str(other_id), ()):
+            row = entry >> 1
+            side = sides.get(row)
+            if side is None:
+                continue
+            stats = result["together" if side == entry & 1 else "against"]
+            stats[0] += 1
+            stats[1] += (self.map_side[row] & 1) == side
+        return result
+
+class MatchColumns:
+    """GuildMatches for every guild that's been queried, built on first use"""
+
+    def __init__(self):
+        self.guilds = {}  # {guild_id: GuildMatches}
+
+    def guild(self, guild_id, ledger):
+        """This guild's table. If it isn't built, `ledger` is called for the
+        {match_id: record} to scan; a built table never calls it"""
+        table = self.guilds.get(guild_id)
+        if table is None:
+            table = GuildMatches()
+            for match_id, record in ledger().items():
+                if record_guild(match_id, record) == guild_id:
+                    table.add_record(match_id, record)
+            self.guilds[guild_id] = table
+        return table
+
+    def add(self, match_id, record):
+        """Append a newly settled match to its guild's table, if that's built"""
+        table = self.guilds.get(record_guild(match_id, record))
+        if table is not None:
+            table.add_record(match_id, record)
+
+    def drop(self, guild_id):
+        """Forget a guild's table, it's rebuilt from the ledger when next asked for"""
+        self.guilds.pop(guild_id, None)
+
+    def flip(self, match_id, record):
+        """Apply a correction, dropping the guild's table if the match isn't in it"""
+        guild_id = record_guild(match_id, record)
+        table = self.guilds.get(guild_id)
+        if table is not None and not table.flip(match_id):
+            del self.guilds[guild_id]
@@ -0,0 +1,260 @@
+"""Incremental, point-in-time backups of the data files.
+
+    backups = Backups("backups")
+    with store.lock:
+        pinned = backups.pin(files)  # Fast: stat and hardlink, no copying
+    backups.write(pinned)            # Hash and copy what changed, off the lock
+    backups.prune(keep=24)
+
+    python backup.py list
+    python backup.py restore 20260101-120000 --to restored/
+    python backup.py prune --keep 24
+
+Files are stored as content-addressed, zlib-compressed chunks under
+objects/, and each backup is a manifest in snapshots/ listing every file's
+chunks. A chunk that's already stored is never written again, so a backup
+only copies what changed since the last one:
+
+- files whose size, mtime and inode haven't changed aren't even read;
+- append-only files (match log segments and indexes, the ELO history
+  journal) are cut every CHUNK_BYTES, reuse their full chunks from the last
+  backup and only hash what was appended;
+- JSON files, rewritten whole on every save, are cut at content-defined
+  line boundaries, so a save that changed a few players adds a few chunks.
+
+A backup is consistent because the store's files are pinned under its lock.
+JSON files are replaced atomically when saved, so a hardlink keeps the
+version that was current. Append-only files only grow, so recording their
+size is enough. The lock is held for a stat and a link per changed file;
+reading, hashing and compressing happen after it's released. Pinned files
+live in a staging directory next to the data (a hardlink can't cross
+filesystems) and are copied instead if linking isn't supported.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import zlib
+from datetime import datetime
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "24"))  # Snapshots kept by prune
+# Minutes between backups taken by the process holding the files, 0 for none
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "60"))
+CHUNK_BYTES = 256 * 1024  # Largest chunk
+MIN_CHUNK_BYTES = 2048
+BOUNDARY_MASK = 0xFF  # A line ends a chunk about once in 256 distinct lines
+APPEND_ONLY = (".log", ".idx")
+STAGING_DIR = ".backup-staging"
+
+def fixed_chunks(f, size):
+    while size > 0:
+        data = f.read(min(CHUNK_BYTES, size))
+        if not data:
+            break
+        size -= len(data)
+        yield data
+
+def line_chunks(f, size):
+    """Chunks cut after lines whose hash hits BOUNDARY_MASK. The cuts depend
+    only on the content around them, so when a rewritten JSON file changes a
+    few players, only the chunks holding them change, not every one after"""
+    lines, length = [], 0
+    for line in f:
+        line = line[:size]
+        size -= len(line)
+        lines.append(line)
+        length += len(line)
+        if length >= CHUNK_BYTES or (length >= MIN_CHUNK_BYTES and not zlib.crc32(line) & BOUNDARY_MASK):
+            yield b"".join(lines)
+            lines, length = [], 0
+        if not size:
+            break
+    if lines:
+        yield b"".join(lines)
+
+def data_root(paths):
+    """The deepest directory holding every one of these files and directories"""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+
+def data_files(paths):
+    """Every file under these files and directories, leaving temp files out"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if not name.endswith(".tmp"):
+                    yield os.path.join(root, name)
+
+class Backups:
+    def __init__(self, directory=BACKUP_DIR, staging=STAGING_DIR):
+        self.directory = directory
+        self.staging = staging  # On the data's filesystem, for hardlinks
+        self.objects_dir = os.path.join(directory, "objects")
+        self.snapshots_dir = os.path.join(directory, "snapshots")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    def snapshots(self):
+        """Backup names, oldest first"""
+        return sorted(name[:-5] for name in os.listdir(self.snapshots_dir) if name.endswith(".json"))
+
+    def manifest(self, name):
+        with open(os.path.join(self.snapshots_dir, name + ".json"), "r") as f:
+            return json.load(f)
+
+    def latest(self):
+        names = self.snapshots()
+        return self.manifest(names[-1]) if names else {"files": {}}
+
+    # ---------- taking a backup ----------
+
+    def pin(self, paths, root=None):
+        """Freeze the current version of every changed file. Call with the store locked.
+
+        Files are keyed by their path under root (default: the directory
+        holding all of paths), which is where restore puts them back.
+        Returns {key: (stat tuple, pinned path or None if unchanged, size)}"""
+        root = root or data_root(paths)
+        previous = self.latest()["files"]
+        shutil.rmtree(self.staging, ignore_errors=True)
+        pinned = {}
+        for path in data_files(paths):
+            key = os.path.relpath(os.path.abspath(path), root)
+            if key.startswith(os.pardir + os.sep):
+                raise ValueError(f"{path} isn't under the backup root {root}")
+            st = os.stat(path)
+            stat = [st.st_size, st.st_mtime_ns, st.st_ino]
+            if previous.get(key, {}).get("stat") == stat:
+                pinned[key] = (stat, None, st.st_size)
+                continue
+            target = os.path.join(self.staging, key.replace(os.sep, "__"))
+            os.makedirs(self.staging, exist_ok=True)
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copyfile(path, target)
+            pinned[key] = (stat, target, st.st_size)
+        return pinned
+
+    def _store(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.objects_dir, digest[:2], digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(path + ".tmp", path)
+            self.written += len(data)
+        return digest
+
+    def write(self, pinned):
+        """Copy the pinned files' new chunks and write the manifest. Returns its name"""
+        previous = self.latest()["files"]
+        self.written = 0
+        files = {}
+        for key, (stat, source, size) in pinned.items():
+            before = previous.get(key)
+            if source is None:
+                files[key] = before
+                continue
+            chunks = []
+            # An append-only file that only grew keeps its full chunks from the last backup
+            if (before and key.endswith(APPEND_ONLY) and before["stat"][2] == stat[2]
+                    and before["stat"][0] <= size):
+                chunks = before["chunks"][:before["stat"][0] // CHUNK_BYTES]
+            with open(source, "rb") as f:
+                if key.endswith(APPEND_ONLY):
+                    f.seek(len(chunks) * CHUNK_BYTES)
+                    split = fixed_chunks(f, size - f.tell())
+                else:
+                    split = line_chunks(f, size)
+                chunks.extend(self._store(data) for data in split)
+            files[key] = {"stat": stat, "chunks": chunks}
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        while os.path.exists(os.path.join(self.snapshots_dir, name + ".json")):
+            name += "a"
+        path = os.path.join(self.snapshots_dir, name + ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"created_at": datetime.now().isoformat(), "copied_bytes": self.written, "files": files}, f)
+        os.replace(path + ".tmp", path)
+        return name
+
+    # ---------- restore and retention ----------
+
+    def restore(self, name, target):
+        """Write every file of a backup under target. Returns the files written.
+        Raises ValueError, before writing anything, if a file would land outside target"""
+        files = self.manifest(name)["files"]
+        root = os.path.realpath(target)
+        paths = {}
+        for key in files:
+            path = os.path.realpath(os.path.join(root, key))
+            if os.path.isabs(key) or os.path.commonpath([root, path]) != root or path == root:
+                raise ValueError(f"Backup {name} has a file outside the restore directory: {key}")
+            paths[key] = path
+        for key, entry in files.items():
+            path = paths[key]
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                for digest in entry["chunks"]:
+                    with open(os.path.join(self.objects_dir, digest[:2], digest), "rb") as chunk:
+                        f.write(zlib.decompress(chunk.read()))
+            os.replace(path + ".tmp", path)
+        return len(files)
+
+    def prune(self, keep=BACKUP_KEEP):
+        """Drop all but the newest `keep` backups (0 keeps them all) and the
+        chunks only they used. Returns (backups removed, chunks removed)"""
+        names = self.snapshots()
+        dropped = names[:-keep] if keep > 0 else []
+        for name in dropped:
+            os.remove(os.path.join(self.snapshots_dir, name + ".json"))
+        if not dropped:
+            return 0, 0
+        used = set()
+        for name in names[len(dropped):]:
+            for entry in self.manifest(name)["files"].values():
+                used.update(entry["chunks"])
+        removed = 0
+        for prefix in os.listdir(self.objects_dir):
+            for digest in os.listdir(os.path.join(self.objects_dir, prefix)):
+                if digest not in used:
+                    os.remove(os.path.join(self.objects_dir, prefix, digest))
+                    removed += 1
+        return len(dropped), removed
+
+def main():
+    parser = argparse.ArgumentParser(description="List, restore and prune backups of the bot's data files")
+    parser.add_argument("command", choices=["list", "restore", "prune"])
+    parser.add_argument("name", nargs="?", help="Backup to restore (default: the latest)")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="Backup directory")
+    parser.add_argument("--to", default=".", help="Directory to restore into")
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help="Backups prune keeps, 0 for all")
+    args = parser.parse_args()
+
+    backups = Backups(args.dir)
+    names = backups.snapshots()
+    if args.command == "list":
+        for name in names:
+            manifest = backups.manifest(name)
+            size = sum(entry["stat"][0] for entry in manifest["files"].values())
+            print(f"{name}  {len(manifest['files'])} files, {size:,} bytes, {manifest['copied_bytes']:,} copied")
+    elif args.command == "restore":
+        name = args.name or (names[-1] if names else None)
+        if name not in names:
+            parser.exit(1, f"❌ No backup {name} in {args.dir}\n")
+        try:
+            print(f"✅ Restored {backups.restore(name, args.to)} files from {name} into {args.to}")
+        except ValueError as e:
+            parser.exit(1, f"❌ {e}\n")
+    else:
+        dropped, removed = backups.prune(args.keep)
+        print(f"🧹 Removed {dropped} backups and {removed} chunks, kept {len(names) - dropped}")
+
+if __name__ == "__main__":
+    main()
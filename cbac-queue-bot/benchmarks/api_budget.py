@@ -0,0 +1,180 @@
+"""Discord API call budgets for the bot's high-level flows.
+
+    python benchmarks/api_budget.py            # check against benchmarks/budgets/
+    python benchmarks/api_budget.py --update   # accept the current counts
+
+Plays one lobby through its whole life with the real callbacks and the fakes
+in fakes.py, which record every REST request as "METHOD /route":
+
+    create_lobby  /startlobby
+    fill          ten players joining by /join and the Join button
+    start_match   the host's Start Match click
+    vote          ten map votes, the last one ending the vote
+    report        /reportwin and its confirm button
+    correct       /correctwin flipping the result
+    end           /end in the match channel
+
+Each flow's counts are compared with its budget file in benchmarks/budgets/.
+A flow that makes more requests in total, or more on any route, than its
+budget fails the run with exit code 1. Fewer requests are reported so the
+budget can be tightened with --update. The run is seeded, so the counts only
+change when the code does. /end waits its 5 seconds for real.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from collections import Counter
+
+from bench_suite import BENCH_DIR, Scenario, bot
+import fakes
+from fakes import FakeInteraction
+
+BUDGET_DIR = os.path.join(BENCH_DIR, "budgets")
+SEED = 1
+PLAYERS = 1000
+LOBBY = "budget"
+
+class Flows:
+    """Runs the flows in order on one lobby, recording each one's requests"""
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.guild = scenario.guild
+        self.recorded = {}  # {flow: Counter}
+        self.host = scenario.member()
+        self.host.roles.append(next(r for r in self.guild.roles if r.name == "Host"))
+        self.view = None
+        self.match_channel = None
+
+    def interaction(self, user, channel=None):
+        return FakeInteraction(self.guild, user, channel or self.scenario.lobby_channel)
+
+    async def record(self, flow, coro):
+        fakes.api_calls.clear()
+        # Each flow draws from its own seed, so code that changes how often an
+        # earlier flow calls random doesn't move this one's ELO changes and rank-ups
+        random.seed(f"{SEED}:{flow}")
+        await coro
+        self.recorded[flow] = Counter(fakes.api_calls)
+
+    async def create_lobby(self):
+        interaction = self.interaction(self.host)
+        await bot.startlobby.callback(interaction, LOBBY)
+        self.view = interaction.response.sent[0]["view"]
+
+    async def fill(self):
+        players = [self.host]
+        while len(players) < 10:
+            member = self.scenario.member()
+            if member not in players:
+                players.append(member)
+        for i, player in enumerate(players):
+            if i % 2:
+                await bot.join.callback(self.interaction(player), LOBBY)
+            else:
+                await self.view.join.callback(self.interaction(player))
+
+    async def start_match(self):
+        await self.view.start.callback(self.interaction(self.host))
+        queue = bot.get_lobbies(self.guild.id)[LOBBY]
+        self.match_channel = self.guild.get_channel(queue.match_lobby_channel_id)
+
+    async def vote(self):
+        vote = bot.map_votes[self.guild.id][LOBBY]
+        view = self.match_channel.messages[vote["message_id"]].view
+        for i, player in enumerate(view.players):
+            await view.children[i % len(view.children)].callback(self.interaction(player))
+
+    async def report(self):
+        interaction = self.interaction(self.scenario.admin)
+        await bot.reportwin.callback(interaction, LOBBY, "T")
+        view = interaction.response.sent[-1]["view"]
+        await view.confirm_t.callback(self.interaction(self.scenario.admin))
+
+    async def correct(self):
+        await bot.correctwin.callback(self.interaction(self.scenario.admin), LOBBY, "CT")
+
+    async def end(self):
+        await bot.end_match.callback(self.interaction(self.scenario.admin, self.match_channel))
+
+    async def run(self):
+        for flow in ("create_lobby", "fill", "start_match", "vote", "report", "correct", "end"):
+            await self.record(flow, getattr(self, flow)())
+        return self.recorded
+
+def budget_path(flow):
+    return os.path.join(BUDGET_DIR, f"{flow}.json")
+
+def load_budget(flow):
+    path = budget_path(flow)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_budget(flow, counts):
+    os.makedirs(BUDGET_DIR, exist_ok=True)
+    with open(budget_path(flow), "w") as f:
+        json.dump({"flow": flow, "total": sum(counts.values()), "routes": dict(sorted(counts.items()))}, f, indent=4)
+        f.write("\n")
+
+def check(flow, counts, budget):
+    """(problems, notes) comparing one flow's counts with its budget"""
+    problems, notes = [], []
+    total = sum(counts.values())
+    if total > budget["total"]:
+        problems.append(f"{flow}: {total} requests, budget {budget['total']}")
+    elif total < budget["total"]:
+        notes.append(f"{flow}: {total} requests, under the budget of {budget['total']}")
+    for route in sorted(set(counts) | set(budget["routes"])):
+        allowed = budget["routes"].get(route, 0)
+        if counts[route] > allowed:
+            problems.append(f"{flow}: {route} x{counts[route]}, budget {allowed}")
+    return problems, notes
+
+async def record_flows():
+    random.seed(SEED)
+    scenario = Scenario(PLAYERS, random.Random(SEED), ".")
+    return await Flows(scenario).run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Discord REST calls per flow against the checked-in budgets")
+    parser.add_argument("--update", action="store_true", help="Write the current counts as the new budgets")
+    args = parser.parse_args()
+
+    bot.profiling.SLOW_COMMAND_MS = float("inf")
+    recorded = asyncio.run(record_flows())
+
+    problems, notes = [], []
+    print(f"{'flow':<13} {'requests':>8} {'budget':>7}")
+    for flow, counts in recorded.items():
+        budget = load_budget(flow)
+        print(f"{flow:<13} {sum(counts.values()):>8} {budget['total'] if budget else '-':>7}")
+        for route, n in counts.most_common():
+            print(f"    {n:>4}  {route}")
+        if args.update:
+            save_budget(flow, counts)
+        elif budget is None:
+            problems.append(f"{flow}: no budget file, run with --update to create {budget_path(flow)}")
+        else:
+            flow_problems, flow_notes = check(flow, counts, budget)
+            problems += flow_problems
+            notes += flow_notes
+
+    if args.update:
+        print(f"\n💾 Budgets written to {BUDGET_DIR}")
+        return
+    for note in notes:
+        print(f"📉 {note} (tighten with --update)")
+    if problems:
+        print(f"\n❌ {len(problems)} budget problems:")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("\n✅ Every flow is within its API call budget")
+
+if __name__ == "__main__":
+    main()
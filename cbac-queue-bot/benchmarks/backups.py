@@ -0,0 +1,72 @@
+"""Benchmark for incremental backups in backup.py.
+
+    python benchmarks/backups.py --guilds 20 --players 5000 --matches 2000 --rounds 5
+
+Settles `matches` matches over `guilds` guilds in a temporary directory,
+takes a first backup, then `rounds` times settles a few more matches and
+backs up again. For each backup it prints how long the store was locked
+(pinning the files), the time spent copying after the lock, and the bytes
+copied next to the bytes a whole-file copy of everything would write.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+from backup import Backups
+from storage import LocalStore
+
+def settle(store, rng, n, guilds, players):
+    guild_id = rng.randint(1, guilds)
+    ids = rng.sample(range(10**17, 10**17 + players), 10)
+    deltas = [(uid, 30, {"map": "MIRAGE"}) for uid in ids[:5]] + [(uid, -10, {"map": "MIRAGE"}) for uid in ids[5:]]
+    store.apply_match_deltas(guild_id, f"{guild_id}:bench:{n}", deltas, {
+        "guild_id": guild_id, "winner": "T", "winning_side": [str(uid) for uid in ids[:5]],
+        "losing_side": [str(uid) for uid in ids[5:]], "selected_map": "MIRAGE",
+        "timestamp": "2026-01-01T00:00:00"})
+
+def backup(store, backups):
+    start = time.perf_counter()
+    with store.lock:
+        pinned = backups.pin([store.guilds_dir, store.matches_file, store.blacklist_file])
+    locked = time.perf_counter() - start
+    backups.write(pinned)
+    copied = time.perf_counter() - start - locked
+    total = sum(stat[0] for stat, _, _ in pinned.values())
+    return locked, copied, backups.written, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Time incremental backups and the store lock they hold")
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--players", type=int, default=5000, help="Player pool per guild")
+    parser.add_argument("--matches", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--between", type=int, default=10, help="Matches settled between backups")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        store = LocalStore("guilds", "blacklist.json", "match_history.json", "players.json")
+        backups = Backups("backups")
+        for n in range(args.matches):
+            settle(store, rng, n, args.guilds, args.players)
+        print(f"📚 {args.matches:,} matches over {args.guilds} guilds")
+
+        print(f"{'backup':<8} {'locked':>9} {'copying':>9} {'copied':>9} {'all files':>10}")
+        for i in range(args.rounds + 1):
+            if i:
+                for n in range(args.between):
+                    settle(store, rng, args.matches + i * args.between + n, args.guilds, args.players)
+            locked, copied, written, total = backup(store, backups)
+            print(f"{'first' if not i else i:<8} {locked * 1000:>7.1f}ms {copied * 1000:>7.1f}ms "
+                  f"{memory.format_bytes(written):>9} {memory.format_bytes(total):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Offline benchmarks for the bot's hot paths, no Discord connection needed.
+
+    python benchmarks/bench_suite.py --players 1000 10000 100000
+    python benchmarks/bench_suite.py --json before.json
+    python benchmarks/bench_suite.py --baseline before.json --max-regression 20
+
+Imports bot.py for real and runs get_user_party, queue_embed, start_match,
+process_win_report, leaderboard and the /profile card against the fakes in fakes.py, with a
+LocalStore holding a synthetic player base of each requested size (up to a
+million). Player ELOs, party sizes and the bot's own shuffles come from
+--seed, so two runs on the same commit do the same work.
+
+Each function is timed for --seconds (at least one call), with per-call
+setup such as filling and starting a lobby left out of the timing. A second,
+shorter pass under tracemalloc records the peak memory one call allocates.
+Results are printed per player-base size along with the process RSS; with
+--baseline, any function that got more than --max-regression percent slower
+or hungrier than the baseline fails the run with exit code 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# bot.py reads its data files from the working directory and starts a metrics
+# server on import, so give it a scratch directory and no port
+LAUNCH_DIR = os.getcwd()
+workdir = tempfile.TemporaryDirectory()
+os.chdir(workdir.name)
+os.environ["METRICS_PORT"] = "0"
+
+import bot
+import fakes
+from fakes import FakeGuild, FakeInteraction
+from storage import LOBBY_SIZE, LocalStore, PlayerStats
+
+FIRST_ID = 200000000000000000
+LOBBY = "bench"
+PARTY_EVERY = 200  # One party per this many players in the base
+
+def build_store(size, rng, directory, guild_id):
+    """A LocalStore holding `size` synthetic players in one guild"""
+    store = LocalStore(os.path.join(directory, "guilds"),
+                       os.path.join(directory, "blacklist.json"),
+                       os.path.join(directory, "match_history.json"),
+                       os.path.join(directory, "players.json"))
+    partition = store._guild(guild_id)
+    for i in range(size):
+        wins, losses = rng.randint(0, 60), rng.randint(0, 60)
+        partition.players[str(FIRST_ID + i)] = PlayerStats({
+            "elo": max(0, int(rng.gauss(700, 350))), "wins": wins, "losses": losses})
+    partition.elo_index = sorted((stats.elo, uid) for uid, stats in partition.players.items())
+    return store
+
+class Scenario:
+    """One synthetic guild wired into the bot module"""
+
+    def __init__(self, size, rng, directory):
+        self.size = size
+        self.rng = rng
+        role_names = list(bot.RANK_CONFIG) + ["Host", "[ Players ]"]
+        self.guild = FakeGuild(name=f"Bench {size}", role_names=role_names)
+        self.store = build_store(size, rng, directory, self.guild.id)
+        self.guild.add_text_channel("⌏rank-up⌌")
+        self.lobby_channel = self.guild.add_text_channel("lobbies")
+        self.admin = self.guild.add_member(FIRST_ID - 1, name="admin", administrator=True)
+        self.starts = 0
+
+        bot.store = self.store
+        bot.bot.get_guild = lambda guild_id: self.guild if guild_id == self.guild.id else None
+        for state in (bot.lobbies, bot.parties, bot.map_votes, bot.lobby_messages,
+                      bot.member_cache, bot.available_members, bot.busy_members):
+            state.clear()
+        self.make_parties()
+
+    def player_id(self):
+        return FIRST_ID + self.rng.randrange(self.size)
+
+    def member(self, user_id=None):
+        return self.guild.add_member(user_id or self.player_id())
+
+    def make_parties(self):
+        """Parties of 2 to 5 over the base, their members loaded into the guild"""
+        for n in range(max(1, self.size // PARTY_EVERY)):
+            leader = self.member()
+            if self.store.claim_party_code(self.guild.id, f"{n:06d}", leader.id) is None:
+                continue
+            for _ in range(self.rng.randint(1, 4)):
+                self.store.join_party(self.guild.id, f"{n:06d}", self.member().id)
+        self.party_leader = next(iter(self.store.get_parties(self.guild.id)))
+
+    def interaction(self, user=None):
+        return FakeInteraction(self.guild, user or self.admin, self.lobby_channel)
+
+    def fill_lobby(self, started=False):
+        """A full lobby of random players, started if asked. Returns its QueueData"""
+        self.starts += 1
+        name = f"{LOBBY}{self.starts}"
+        self.store.create_lobby(self.guild.id, name, self.admin.id)
+        members = []
+        while len(members) < LOBBY_SIZE:
+            member = self.member()
+            if member not in members:
+                members.append(member)
+        bot.join_lobby(self.guild.id, name, members)
+        bot.update_lobby(self.guild.id, name, host=members[0].id)
+        if started:
+            self.store.begin_match(self.guild.id, name)
+        return name, bot.get_lobbies(self.guild.id)[name]
+
+    def drop_lobby(self, name):
+        bot.cleanup_lobby(self.guild.id, name)
+        bot.map_votes.get(self.guild.id, {}).pop(name, None)
+
+# ==================== BENCHMARKS ====================
+# Each is (setup, run, teardown): setup returns the args for run, only run is timed
+
+def bench_get_user_party(scenario):
+    def setup():
+        # Half the lookups are party members, half players in no party
+        if scenario.rng.random() < 0.5:
+            return (scenario.party_leader,)
+        return (scenario.player_id(),)
+
+    async def run(user_id):
+        bot.get_user_party(scenario.guild.id, user_id)
+
+    return setup, run, None
+
+def bench_queue_embed(scenario):
+    name, queue = scenario.fill_lobby()
+
+    async def run():
+        bot.queue_embed(name, queue)
+
+    return lambda: (), run, None
+
+def bench_start_match(scenario):
+    def setup():
+        name, queue = scenario.fill_lobby(started=True)
+        return scenario.interaction(), name, queue
+
+    async def run(interaction, name, queue):
+        await bot.start_match(interaction, name, queue)
+
+    def teardown(interaction, name, queue):
+        scenario.drop_lobby(name)
+
+    return setup, run, teardown
+
+def bench_process_win_report(scenario):
+    def setup():
+        name, queue = scenario.fill_lobby(started=True)
+        return scenario.interaction(), name, queue, queue.players[:5], queue.players[5:]
+
+    async def run(interaction, name, queue, t_side, ct_side):
+        await bot.process_win_report(interaction, name, queue, scenario.rng.choice("TC"), t_side, ct_side)
+
+    def teardown(interaction, name, queue, t_side, ct_side):
+        scenario.drop_lobby(name)
+
+    return setup, run, teardown
+
+def bench_leaderboard(scenario):
+    async def run(interaction):
+        await bot.leaderboard.callback(interaction)
+
+    return lambda: (scenario.interaction(),), run, None
+
+def bench_profile(scenario):
+    # Mostly repeat views of the same few players, as when a lobby checks each other out
+    regulars = [scenario.member() for _ in range(20)]
+
+    async def run(member):
+        bot.get_profile_card(member)
+
+    return lambda: (scenario.rng.choice(regulars),), run, None
+
+BENCHMARKS = {
+    "get_user_party": bench_get_user_party,
+    "queue_embed": bench_queue_embed,
+    "start_match": bench_start_match,
+    "process_win_report": bench_process_win_report,
+    "leaderboard": bench_leaderboard,
+    "profile": bench_profile,
+}
+
+async def measure(scenario, factory, seconds, memory_calls):
+    """(calls, seconds spent in run, peak bytes of one call, Discord calls per call)"""
+    setup, run, teardown = factory(scenario)
+    calls = 0
+    elapsed = 0.0
+    fakes.api_calls.clear()
+    deadline = time.perf_counter() + seconds
+    while calls == 0 or time.perf_counter() < deadline:
+        args = setup()
+        start = time.perf_counter()
+        await run(*args)
+        elapsed += time.perf_counter() - start
+        calls += 1
+        if teardown:
+            teardown(*args)
+    api_per_call = sum(fakes.api_calls.values()) / calls
+
+    peak = 0
+    tracemalloc.start()
+    for _ in range(memory_calls):
+        args = setup()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await run(*args)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        if teardown:
+            teardown(*args)
+    tracemalloc.stop()
+    return calls, elapsed, peak, api_per_call
+
+async def run_size(size, args, directory):
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # For the bot's own shuffles and ELO rolls
+    rss_before = bot.get_rss_mb()
+    build_start = time.perf_counter()
+    scenario = Scenario(size, rng, directory)
+    build_seconds = time.perf_counter() - build_start
+    rss_after = bot.get_rss_mb()
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        calls, elapsed, peak, api_per_call = await measure(scenario, BENCHMARKS[name], args.seconds, args.memory_calls)
+        results[name] = {
+            "calls": calls,
+            "ops_per_sec": calls / elapsed if elapsed else float("inf"),
+            "mean_us": elapsed / calls * 1e6,
+            "peak_bytes": peak,
+            "api_calls": api_per_call,
+        }
+    return {"build_seconds": build_seconds, "rss_mb": rss_after,
+            "base_mb": (rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+            "functions": results}
+
+def print_size(size, report):
+    base = f", base ~{report['base_mb']:.0f} MB" if report["base_mb"] is not None else ""
+    rss = f", RSS {report['rss_mb']:.0f} MB" if report["rss_mb"] is not None else ""
+    print(f"\n👥 {size:,} players (built in {report['build_seconds']:.1f}s{base}{rss})")
+    print(f"  {'function':<20} {'ops/s':>10} {'mean':>11} {'peak mem':>10} {'API calls':>10}")
+    for name, r in report["functions"].items():
+        print(f"  {name:<20} {r['ops_per_sec']:>10,.0f} {r['mean_us']:>9,.0f}µs "
+              f"{r['peak_bytes'] / 1024:>8,.1f}KB {r['api_calls']:>10.1f}")
+
+def compare(results, baseline, max_regression):
+    """Lines describing every function that regressed past max_regression percent"""
+    problems = []
+    limit = 1 + max_regression / 100
+    for size, report in results.items():
+        old_report = baseline.get(size)
+        if not old_report:
+            continue
+        for name, new in report["functions"].items():
+            old = old_report["functions"].get(name)
+            if not old:
+                continue
+            if new["ops_per_sec"] * limit < old["ops_per_sec"]:
+                problems.append(f"{name} @ {size} players: {old['ops_per_sec']:,.0f} → {new['ops_per_sec']:,.0f} ops/s")
+            if old["peak_bytes"] and new["peak_bytes"] > old["peak_bytes"] * limit:
+                problems.append(f"{name} @ {size} players: peak {old['peak_bytes']:,} → {new['peak_bytes']:,} bytes")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bot hot paths against fake Discord objects")
+    parser.add_argument("--players", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Player base sizes to run (1k to 1M)")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time budget per function and size")
+    parser.add_argument("--memory-calls", type=int, default=5, help="Calls traced for peak memory")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Run only these functions")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file from an earlier --json run to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Allowed slowdown or memory growth, in percent")
+    args = parser.parse_args()
+
+    # Slow-call logging would interleave with the table
+    bot.profiling.SLOW_COMMAND_MS = float("inf")
+    results = {}
+    for size in args.players:
+        with tempfile.TemporaryDirectory() as directory:
+            report = asyncio.run(run_size(size, args, directory))
+        results[str(size)] = report
+        print_size(size, report)
+
+    if args.json:
+        with open(os.path.join(LAUNCH_DIR, args.json), "w") as f:
+            json.dump({"seed": args.seed, "sizes": results}, f, indent=4)
+        print(f"\n💾 Results written to {args.json}")
+
+    if args.baseline:
+        with open(os.path.join(LAUNCH_DIR, args.baseline)) as f:
+            baseline = json.load(f)["sizes"]
+        problems = compare(results, baseline, args.max_regression)
+        if problems:
+            print(f"\n❌ {len(problems)} regressions over {args.max_regression:.0f}%:")
+            for problem in problems:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print(f"\n✅ No regressions over {args.max_regression:.0f}% against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
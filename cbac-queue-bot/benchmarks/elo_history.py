@@ -0,0 +1,64 @@
+"""Benchmark for the downsampled ELO history in timeseries.py.
+
+    python benchmarks/elo_history.py --players 5000 --matches 400 --days 730
+
+Gives every player `matches` rating changes spread over the last `days`
+days, then reports how many points survive downsampling against keeping
+every change, the memory and snapshot size, and the time to record a change
+and to answer a range query for the last 30 days and for all time.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+from timeseries import DAY, EloHistory, EloSeries, Tier
+
+def main():
+    parser = argparse.ArgumentParser(description="Time recording and querying downsampled ELO history")
+    parser.add_argument("--players", type=int, default=5000)
+    parser.add_argument("--matches", type=int, default=400, help="Rating changes per player")
+    parser.add_argument("--days", type=int, default=730, help="Span the changes are spread over")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = time.time()
+    start = now - args.days * DAY
+    changes = []
+    for i in range(args.players):
+        elo = 1000
+        for ts in sorted(rng.uniform(start, now) for _ in range(args.matches)):
+            elo = max(0, elo + rng.randint(-30, 30))
+            changes.append((ts, str(i), elo))
+    changes.sort()
+    print(f"📚 {len(changes):,} rating changes, {args.players:,} players over {args.days} days")
+
+    history = EloHistory()
+    began = time.perf_counter()
+    for ts, uid, elo in changes:
+        history.add(uid, ts, elo)
+    history.roll_all(now)
+    added = time.perf_counter() - began
+    size = memory.deep_sizeof(history, follow=(EloHistory, EloSeries, Tier))
+    snapshot = len(json.dumps(history.to_dict()))
+    points = history.point_count()
+    print(f"add      {added / len(changes) * 1e6:>8.2f}µs per change")
+    print(f"kept     {points:,} points ({points / len(changes) * 100:.1f}% of changes), "
+          f"{memory.format_bytes(size)} in memory, {memory.format_bytes(snapshot)} snapshot")
+
+    users = [str(rng.randrange(args.players)) for _ in range(args.queries)]
+    for label, since in (("30 days", now - 30 * DAY), ("all time", None)):
+        began = time.perf_counter()
+        returned = sum(len(history.range(uid, since)) for uid in users)
+        elapsed = time.perf_counter() - began
+        print(f"{label:<8} {elapsed / args.queries * 1e6:>8.1f}µs per query, {returned / args.queries:.0f} points")
+
+if __name__ == "__main__":
+    main()
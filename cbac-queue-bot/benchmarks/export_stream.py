@@ -0,0 +1,73 @@
+"""Benchmark for streaming exports in export.py.
+
+    python benchmarks/export_stream.py --players 100000 --matches 100000
+
+Fills one guild and the ledger, then exports its players and matches as
+gzipped CSV and JSONL, printing each export's time, size and the memory it
+allocated at peak (tracemalloc). The baseline is what admins did before:
+dumping the whole dict with json.dumps, which holds every row at once.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import export
+import memory
+from storage import LocalStore, PlayerStats
+
+GUILD_ID = 1
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed * 1000, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Time streaming exports and the memory they take")
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--matches", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalStore(os.path.join(directory, "guilds"), os.path.join(directory, "blacklist.json"),
+                           os.path.join(directory, "matches.json"), os.path.join(directory, "players.json"))
+        partition = store._guild(GUILD_ID)
+        ids = [str(10**17 + i) for i in range(args.players)]
+        for uid in ids:
+            partition.players[uid] = PlayerStats({"elo": rng.randint(0, 2000), "wins": rng.randint(0, 60),
+                                                  "losses": rng.randint(0, 60)})
+        for i in range(args.matches):
+            players = rng.sample(ids, 10)
+            store.matches[f"{GUILD_ID}:bench:{i}"] = {"guild_id": GUILD_ID, "winner": rng.choice(("T", "CT")),
+                                                      "winning_side": players[:5], "losing_side": players[5:],
+                                                      "selected_map": "MIRAGE", "timestamp": "2026-01-01T00:00:00",
+                                                      "elo_gain": 32, "elo_loss": 27}
+            store.guild_match_ids.setdefault(GUILD_ID, {})[f"{GUILD_ID}:bench:{i}"] = None
+        print(f"📚 {args.players:,} players, {args.matches:,} matches, {export.EXPORT_PAGE_SIZE} rows per page")
+
+        print(f"{'export':<16} {'time':>9} {'file':>9} {'peak':>9}")
+        for kind in ("players", "matches"):
+            for fmt in export.FORMATS:
+                path = os.path.join(directory, f"{kind}.{fmt}.gz")
+                _, elapsed, peak = measure(export.export, store, kind, path, fmt, GUILD_ID)
+                print(f"{kind + ' ' + fmt:<16} {elapsed:>7.0f}ms {memory.format_bytes(os.path.getsize(path)):>9} "
+                      f"{memory.format_bytes(peak):>9}")
+        dumped, elapsed, peak = measure(json.dumps, store.matches)
+        print(f"{'json.dumps':<16} {elapsed:>7.0f}ms {memory.format_bytes(len(dumped)):>9} {memory.format_bytes(peak):>9}"
+              f"  (the whole ledger, uncompressed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Lightweight stand-ins for the discord objects the bot touches.
+
+They carry the attributes and coroutines bot.py uses (ids, mentions, roles,
+send/edit/defer, channel creation) and nothing else.
+
+Every coroutine that would be a REST call is recorded in `api_calls` as
+"METHOD /route", the requests discord.py would send for it, with ids
+templated the way bot.rest_route() labels the live REST metrics. A call
+that discord.py splits into several requests is recorded as several:
+Member.add_roles/remove_roles make one request per role, and the first DM to
+a member opens the DM channel first.
+
+Members are created lazily: a FakeGuild stands for a guild of any size, and
+only members the code actually looks at (get_member/fetch_member or
+add_member) take up memory. That keeps million-player bases affordable.
+"""
+import asyncio
+import itertools
+from collections import Counter
+
+api_calls = Counter()
+ids = itertools.count(100000000000000000)
+
+def next_id():
+    return next(ids)
+
+def rest_call(method, route, latency=0.0, times=1):
+    if times:
+        api_calls[f"{method} {route}"] += times
+    return asyncio.sleep(latency)
+
+class FakePermissions:
+    def __init__(self, administrator=False):
+        self.administrator = administrator
+
+class FakeRole:
+    def __init__(self, guild, name, administrator=False):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.permissions = FakePermissions(administrator)
+        self.mention = f"<@&{self.id}>"
+
+    def __hash__(self):
+        return hash(("role", self.id))
+
+class FakeAsset:
+    def __init__(self, url):
+        self.url = url
+
+class FakeVoiceState:
+    def __init__(self, channel=None):
+        self.channel = channel
+
+class FakeMember:
+    def __init__(self, guild, user_id, name=None, administrator=False):
+        self.id = user_id
+        self.guild = guild
+        self.name = name or f"player{user_id % 100000}"
+        self.display_name = self.name
+        self.global_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.display_avatar = FakeAsset(f"https://cdn.discordapp.com/embed/avatars/{user_id % 6}.png")
+        self.bot = False
+        self.roles = []
+        self.voice = None
+        self.dm_open = False
+        self.status = "online"
+        self.guild_permissions = FakePermissions(administrator)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeMember) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    async def send(self, content=None, **kwargs):
+        if not self.dm_open:
+            self.dm_open = True
+            await rest_call("POST", "/users/@me/channels", self.guild.latency)
+        await rest_call("POST", "/channels/{id}/messages", self.guild.latency)
+        return FakeMessage(None, content, **kwargs)
+
+    async def add_roles(self, *roles, reason=None):
+        await rest_call("PUT", "/guilds/{id}/members/{id}/roles/{id}", self.guild.latency * len(roles), len(roles))
+        self.roles.extend(r for r in roles if r not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await rest_call("DELETE", "/guilds/{id}/members/{id}/roles/{id}", self.guild.latency * len(roles), len(roles))
+        self.roles = [r for r in self.roles if r not in roles]
+
+    async def move_to(self, channel, reason=None):
+        await rest_call("PATCH", "/guilds/{id}/members/{id}", self.guild.latency)
+        self.voice = FakeVoiceState(channel)
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None, view=None, **kwargs):
+        self.id = next_id()
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+
+    @property
+    def guild(self):
+        return self.channel.guild if self.channel else None
+
+    @property
+    def latency(self):
+        return self.channel.guild.latency if self.channel else 0.0
+
+    async def edit(self, **kwargs):
+        await rest_call("PATCH", "/channels/{id}/messages/{id}", self.latency)
+        self.embed = kwargs.get("embed", self.embed)
+        self.view = kwargs.get("view", self.view)
+
+    async def delete(self):
+        await rest_call("DELETE", "/channels/{id}/messages/{id}", self.latency)
+
+class FakeChannel:
+    def __init__(self, guild, name, kind="text", category=None):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.kind = kind
+        self.category = category
+        self.mention = f"<#{self.id}>"
+        self.channels = []  # For categories
+        self.messages = {}
+
+    async def send(self, content=None, **kwargs):
+        await rest_call("POST", "/channels/{id}/messages", self.guild.latency)
+        message = FakeMessage(self, content, **kwargs)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        await rest_call("GET", "/channels/{id}/messages/{id}", self.guild.latency)
+        return self.messages.get(message_id) or FakeMessage(self)
+
+    async def _create(self, name, kind):
+        await rest_call("POST", "/guilds/{id}/channels", self.guild.latency)
+        channel = FakeChannel(self.guild, name, kind, category=self)
+        self.channels.append(channel)
+        self.guild.channels[channel.id] = channel
+        return channel
+
+    async def create_text_channel(self, name, **kwargs):
+        return await self._create(name, "text")
+
+    async def create_voice_channel(self, name, **kwargs):
+        return await self._create(name, "voice")
+
+    async def delete(self, reason=None):
+        await rest_call("DELETE", "/channels/{id}", self.guild.latency)
+        self.guild.channels.pop(self.id, None)
+
+class FakeGuild:
+    def __init__(self, guild_id=None, name="Bench Guild", role_names=(), latency=0.0):
+        self.id = guild_id or next_id()
+        self.name = name
+        self.latency = latency  # Seconds each fake REST call sleeps
+        self.member_map = {}
+        self.channels = {}
+        self.default_role = FakeRole(self, "@everyone")
+        self.roles = [self.default_role, FakeRole(self, "Admin", administrator=True)]
+        self.roles += [FakeRole(self, name) for name in role_names]
+
+    @property
+    def text_channels(self):
+        return [c for c in self.channels.values() if c.kind == "text"]
+
+    @property
+    def members(self):
+        return list(self.member_map.values())
+
+    @property
+    def member_count(self):
+        return len(self.member_map)
+
+    def add_member(self, user_id, **kwargs):
+        member = self.member_map.get(user_id)
+        if member is None:
+            member = self.member_map[user_id] = FakeMember(self, user_id, **kwargs)
+        return member
+
+    def get_member(self, user_id):
+        return self.member_map.get(user_id)
+
+    async def fetch_member(self, user_id):
+        await rest_call("GET", "/guilds/{id}/members/{id}", self.latency)
+        return self.add_member(int(user_id))
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def add_text_channel(self, name):
+        channel = FakeChannel(self, name)
+        self.channels[channel.id] = channel
+        return channel
+
+    async def create_category(self, name, overwrites=None, **kwargs):
+        await rest_call("POST", "/guilds/{id}/channels", self.latency)
+        category = FakeChannel(self, name, "category")
+        self.channels[category.id] = category
+        return category
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+        self.sent = []
+
+    def is_done(self):
+        return self.done
+
+    async def _respond(self, payload):
+        if self.done:
+            raise RuntimeError("Interaction already responded to")
+        self.done = True
+        self.sent.append(payload)
+        await rest_call("POST", "/interactions/{id}/{token}/callback", self.interaction.guild.latency)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond({"content": content, **kwargs})
+
+    async def defer(self, **kwargs):
+        await self._respond(kwargs)
+
+    async def edit_message(self, **kwargs):
+        await self._respond(kwargs)
+
+    async def send_modal(self, modal):
+        await self._respond({"modal": modal})
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        await rest_call("POST", "/webhooks/{id}/{token}", self.interaction.guild.latency)
+        self.sent.append({"content": content, **kwargs})
+        return FakeMessage(self.interaction.channel, content, **kwargs)
+
+class FakeInteraction:
+    def __init__(self, guild, user, channel=None, command=None):
+        self.id = next_id()
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel
+        self.command = command
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def original_response(self):
+        await rest_call("GET", "/webhooks/{id}/{token}/messages/@original", self.guild.latency)
+        return FakeMessage(self.channel)
+
+    async def delete_original_response(self):
+        await rest_call("DELETE", "/webhooks/{id}/{token}/messages/@original", self.guild.latency)
+
+    async def edit_original_response(self, **kwargs):
+        await rest_call("PATCH", "/webhooks/{id}/{token}/messages/@original", self.guild.latency)
@@ -0,0 +1,83 @@
+"""Benchmark for guild-partitioned player stats in storage.py.
+
+    python benchmarks/guild_partitions.py --big 100000 --small 200 --guilds 50
+
+Writes one big guild and `guilds` small ones to a temporary guilds
+directory, then times what serving a small guild costs next to the big one:
+loading it, its leaderboard and settling one of its matches, with the
+bytes that settle writes. The same is done for the big guild, and the
+bytes are compared with rewriting every player in one global file, as the
+store did before stats were split by guild.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+import storage
+from storage import GuildPlayers, LocalStore, PlayerStats
+
+BIG_GUILD = 1
+
+def write_guild(guilds_dir, guild_id, size, rng):
+    partition = GuildPlayers(guild_id, os.path.join(guilds_dir, str(guild_id)))
+    for i in range(size):
+        partition.players[str(guild_id * 10**7 + i)] = PlayerStats({
+            "elo": max(0, int(rng.gauss(700, 350))), "wins": rng.randint(0, 60), "losses": rng.randint(0, 60)})
+    partition.save_players()
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def settle(store, guild_id, n):
+    ids = [guild_id * 10**7 + i for i in range(10)]
+    deltas = [(uid, 30, {"map": "MIRAGE"}) for uid in ids[:5]] + [(uid, -10, {"map": "MIRAGE"}) for uid in ids[5:]]
+    return store.apply_match_deltas(guild_id, f"{guild_id}:bench:{n}", deltas, {"guild_id": guild_id})
+
+def guild_bytes(store, guild_id):
+    return os.path.getsize(os.path.join(store.guilds_dir, str(guild_id), storage.PLAYERS_FILE))
+
+def main():
+    parser = argparse.ArgumentParser(description="Time serving small guilds next to a big one")
+    parser.add_argument("--big", type=int, default=100000, help="Players in the big guild")
+    parser.add_argument("--small", type=int, default=200, help="Players in each small guild")
+    parser.add_argument("--guilds", type=int, default=50, help="Small guilds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        guilds_dir = os.path.join(directory, "guilds")
+        write_guild(guilds_dir, BIG_GUILD, args.big, rng)
+        for guild_id in range(2, args.guilds + 2):
+            write_guild(guilds_dir, guild_id, args.small, rng)
+        store = LocalStore(guilds_dir, os.path.join(directory, "blacklist.json"),
+                           os.path.join(directory, "matches.json"), os.path.join(directory, "players.json"))
+        total_players = args.big + args.small * args.guilds
+        print(f"📚 {total_players:,} players: one guild of {args.big:,}, {args.guilds} of {args.small:,}")
+
+        print(f"{'guild':<6} {'load':>9} {'leaderboard':>12} {'settle':>9} {'written':>9}  in memory")
+        for label, guild_id in (("small", 2), ("big", BIG_GUILD)):
+            _, load = timed(store._guild, guild_id)
+            _, top = timed(store.top_players, guild_id, 10)
+            _, settled = timed(settle, store, guild_id, 1)
+            loaded = memory.deep_sizeof([p.players for p in store.partitions.values()], follow=(PlayerStats,))
+            print(f"{label:<6} {load:>7.1f}ms {top:>10.3f}ms {settled:>7.1f}ms "
+                  f"{memory.format_bytes(guild_bytes(store, guild_id)):>9}  {memory.format_bytes(loaded)}")
+
+        # Before partitioning, every settle rewrote every player's stats
+        everyone = {}
+        for guild_id in range(1, args.guilds + 2):
+            everyone.update({uid: stats.to_dict() for uid, stats in store._guild(guild_id).players.items()})
+        print(f"global  one file for everyone: {memory.format_bytes(len(json.dumps(everyone, indent=4)))} per settle")
+
+if __name__ == "__main__":
+    main()
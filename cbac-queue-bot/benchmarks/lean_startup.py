@@ -0,0 +1,129 @@
+"""Benchmark for lean gateway mode (LEAN_MODE) against the full member cache.
+
+    python benchmarks/lean_startup.py --members 100000 --online 0.3 --seen 5000
+
+Runs each mode in its own process, importing bot.py for real with LEAN_MODE
+set, so each RSS is that mode's alone. Full mode feeds a guild of `members`
+members, `online` of them online, through discord.py's own GUILD_MEMBERS_CHUNK
+handler, 1000 per chunk as the gateway sends them, then rebuilds the member
+index as on_ready does. Lean mode gets no chunks: `seen` members arrive with
+interactions and are cached on demand as on_interaction does, then a
+reconnect rebuilds the index, which has to keep them.
+
+For each mode it prints the time spent turning chunks into members, the
+index rebuild, the members cached and indexed, and the process RSS before
+the guild loaded and after. In full mode the time the gateway takes to
+send the chunks comes on top and isn't measured here.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK_SIZE = 1000  # Members per GUILD_MEMBERS_CHUNK
+FIRST_ID = 300000000000000000
+GUILD_ID = 1
+
+def member_payload(user_id):
+    return {"user": {"id": str(user_id), "username": f"player{user_id % 10**6}", "discriminator": "0",
+                     "avatar": None, "global_name": None},
+            "roles": [], "joined_at": "2025-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+def presence_payload(user_id):
+    return {"user": {"id": str(user_id)}, "status": "online", "activities": [], "client_status": {"desktop": "online"}}
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+async def run_mode(args):
+    """One mode in this process: returns its numbers as a dict"""
+    os.chdir(tempfile.mkdtemp())  # bot.py reads its data files from here
+    os.environ["METRICS_PORT"] = "0"
+    sys.path.insert(0, BOT_DIR)
+    import discord
+    from discord.state import ChunkRequest
+    import bot
+
+    state = bot.bot._connection
+    rss_before = bot.get_rss_mb()
+    guild = discord.Guild(data={"id": str(GUILD_ID), "name": "Big", "member_count": args.members, "roles": [],
+                                "emojis": [], "stickers": [], "channels": [], "features": []}, state=state)
+    state._add_guild(guild)
+    result = {"chunks": None}
+
+    if not bot.LEAN_MODE:
+        # What chunk_guild sets up at startup: a request the chunks are added through
+        request = ChunkRequest(guild.id, 0, asyncio.get_running_loop(), state._get_guild, cache=True)
+        state._chunk_requests[request.nonce] = request
+        count = -(-args.members // CHUNK_SIZE)
+        parsing = 0.0
+        for index in range(count):
+            ids = range(FIRST_ID + index * CHUNK_SIZE, FIRST_ID + min((index + 1) * CHUNK_SIZE, args.members))
+            online = ids[:int(len(ids) * args.online)]
+            chunk = {"guild_id": str(GUILD_ID), "members": [member_payload(i) for i in ids],
+                     "presences": [presence_payload(i) for i in online],
+                     "chunk_index": index, "chunk_count": count, "nonce": request.nonce}
+            parsing += timed(state.parse_guild_members_chunk, chunk)[1]
+        result["chunks"] = parsing
+        _, result["rebuild"] = timed(bot.rebuild_member_index, guild)
+    else:
+        bot.rebuild_member_index(guild)
+        start = time.perf_counter()
+        for i in range(args.seen):
+            # An interaction carries the member; on_interaction caches and indexes it
+            member = discord.Member(data=member_payload(FIRST_ID + i), guild=guild, state=state)
+            bot.cache_member(member)
+            bot.refresh_member_index(member)
+        result["interactions"] = time.perf_counter() - start
+        result["indexed_before_reconnect"] = len(bot.get_available_members(GUILD_ID))
+        _, result["rebuild"] = timed(bot.rebuild_member_index, guild)
+
+    result.update({
+        "cached": len(guild.members) + len(bot.member_cache),
+        "indexed": len(bot.get_available_members(GUILD_ID)),
+        "rss_before": rss_before,
+        "rss_after": bot.get_rss_mb(),
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare lean mode's startup work and memory with the full member cache")
+    parser.add_argument("--members", type=int, default=100000)
+    parser.add_argument("--online", type=float, default=0.3, help="Share of members online (full mode)")
+    parser.add_argument("--seen", type=int, default=5000, help="Members who interact with the bot (lean mode)")
+    parser.add_argument("--mode", choices=["full", "lean"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    print(f"🏟️ One guild of {args.members:,} members, {args.online:.0%} online; "
+          f"{args.seen:,} of them interact in lean mode")
+    print(f"{'mode':<6} {'chunks':>9} {'rebuild':>9} {'cached':>9} {'indexed':>9} {'RSS':>18}")
+    for mode in ("full", "lean"):
+        env = dict(os.environ, LEAN_MODE="1" if mode == "lean" else "0")
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode,
+                                 "--members", str(args.members), "--online", str(args.online),
+                                 "--seen", str(args.seen)],
+                                env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        chunks = f"{result['chunks'] * 1000:.0f}ms" if result["chunks"] is not None else "none"
+        rss = f"{result['rss_before']:.0f} -> {result['rss_after']:.0f} MB" if result["rss_after"] else "n/a"
+        print(f"{mode:<6} {chunks:>9} {result['rebuild'] * 1000:>7.1f}ms {result['cached']:>9,} "
+              f"{result['indexed']:>9,} {rss:>18}")
+        if mode == "lean":
+            kept = result["indexed"] == result["indexed_before_reconnect"]
+            print(f"{'✅' if kept else '❌'} Lean reconnect kept {result['indexed']:,} of "
+                  f"{result['indexed_before_reconnect']:,} indexed members "
+                  f"({result['interactions'] * 1000:.0f}ms to cache them as they interacted)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""In-process load simulator replaying interaction storms.
+
+    python benchmarks/load_sim.py --lobbies 20 --join-rate 200 --latency-ms 50
+
+Drives the bot's real slash command and view callbacks with FakeInteractions
+(see fakes.py) on one event loop, in the shapes our peaks take:
+
+- create: every host runs /startlobby at the same moment
+- fill:   lobbies fill up from a burst of /join and Join-button clicks
+          arriving at --join-rate per second, with --overflow extra players
+          per lobby racing for the last seats
+- start:  each host mashes Start Match --start-clicks times
+- vote:   the 10 players of every match vote within --vote-window seconds
+- report: every match is reported and confirmed within --report-window
+
+Latency is measured from when an interaction arrives to when its callback
+returns, so time spent waiting for a busy loop counts. Fake REST calls sleep
+--latency-ms. A monitor task measures event-loop lag throughout. Reports
+throughput, p50/p99 latency per interaction type and loop lag per phase,
+and exits nonzero if an interaction raised or a match didn't settle.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import traceback
+from collections import defaultdict
+
+from bench_suite import Scenario, bot
+from fakes import FakeInteraction
+from storage import LOBBY_SIZE
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+class LagMonitor:
+    """Measures how late the loop wakes a task that sleeps `interval` seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = []  # (time, lag seconds)
+        self.task = None
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.samples.append((now, max(0.0, now - start - self.interval)))
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    def between(self, start, end):
+        return [lag for at, lag in self.samples if start <= at <= end]
+
+class Simulator:
+    def __init__(self, scenario, args):
+        self.scenario = scenario
+        self.args = args
+        self.rng = scenario.rng
+        self.guild = scenario.guild
+        self.latencies = defaultdict(list)  # {interaction type: [seconds]}
+        self.errors = []
+        self.lobbies = {}                   # {name: (host, LobbyView)}
+        self.phases = []                    # (name, start, end, interactions)
+
+    def interaction(self, user):
+        return FakeInteraction(self.guild, user, self.scenario.lobby_channel)
+
+    async def fire(self, kind, arrival, callback, *args):
+        """Wait for `arrival` (a perf_counter time), run the callback, record its latency"""
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await callback(*args)
+        except Exception as e:
+            self.errors.append(f"{kind}: {type(e).__name__}: {e}")
+            if len(self.errors) == 1:
+                traceback.print_exc()
+        self.latencies[kind].append(time.perf_counter() - arrival)
+
+    async def phase(self, name, coros):
+        before = sum(len(v) for v in self.latencies.values())
+        start = time.perf_counter()
+        await asyncio.gather(*coros)
+        end = time.perf_counter()
+        self.phases.append((name, start, end, sum(len(v) for v in self.latencies.values()) - before))
+
+    # ---------- phases ----------
+
+    async def create(self):
+        host_role = next(r for r in self.guild.roles if r.name == "Host")
+        now = time.perf_counter()
+        coros = []
+        for i in range(self.args.lobbies):
+            host = self.scenario.member()
+            host.roles.append(host_role)
+            interaction = self.interaction(host)
+            self.lobbies[f"sim{i}"] = (host, interaction)
+            coros.append(self.fire("startlobby", now, bot.startlobby.callback, interaction, f"sim{i}"))
+        await self.phase("create", coros)
+        for name, (host, interaction) in list(self.lobbies.items()):
+            self.lobbies[name] = (host, interaction.response.sent[0]["view"])
+
+    async def fill(self):
+        hosts = {host.id for host, _ in self.lobbies.values()}
+        clicks = []
+        taken = set(hosts)
+        for name in self.lobbies:
+            for _ in range(LOBBY_SIZE - 1 + self.args.overflow):  # The host doesn't count as joined
+                member = self.scenario.member()
+                while member.id in taken:
+                    member = self.scenario.member()
+                taken.add(member.id)
+                clicks.append((name, member))
+        # The host takes a seat too, so lobbies fill the way real ones do
+        clicks += [(name, host) for name, (host, _) in self.lobbies.items()]
+        self.rng.shuffle(clicks)
+
+        now = time.perf_counter()
+        coros = []
+        for i, (name, member) in enumerate(clicks):
+            arrival = now + i / self.args.join_rate
+            interaction = self.interaction(member)
+            if self.rng.random() < 0.5:
+                coros.append(self.fire("join", arrival, bot.join.callback, interaction, name))
+            else:
+                coros.append(self.fire("join_button", arrival, self.lobbies[name][1].join.callback, interaction))
+        await self.phase("fill", coros)
+
+    async def start(self):
+        now = time.perf_counter()
+        coros = []
+        for name, (host, view) in self.lobbies.items():
+            for _ in range(self.args.start_clicks):
+                arrival = now + self.rng.uniform(0, 0.2)
+                coros.append(self.fire("start_button", arrival, view.start.callback, self.interaction(host)))
+        await self.phase("start", coros)
+
+    def vote_view(self, name):
+        vote = bot.map_votes.get(self.guild.id, {}).get(name)
+        if vote is None:
+            return None
+        channel = self.guild.get_channel(vote["channel_id"])
+        return channel.messages[vote["message_id"]].view
+
+    async def vote(self):
+        now = time.perf_counter()
+        coros = []
+        for name in self.lobbies:
+            view = self.vote_view(name)
+            if view is None:
+                continue
+            for player in view.players:
+                button = self.rng.choice(view.children)
+                arrival = now + self.rng.uniform(0, self.args.vote_window)
+                coros.append(self.fire("vote", arrival, button.callback, self.interaction(player)))
+        await self.phase("vote", coros)
+
+    async def report_one(self, name, arrival):
+        interaction = self.interaction(self.scenario.admin)
+        await self.fire("reportwin", arrival, bot.reportwin.callback, interaction, name, self.rng.choice(["T", "CT"]))
+        sent = interaction.response.sent
+        view = sent[-1].get("view") if sent else None
+        if view is None:
+            return
+        confirm = view.confirm_t if self.rng.random() < 0.5 else view.confirm_ct
+        await self.fire("confirm", time.perf_counter(), confirm.callback, self.interaction(self.scenario.admin))
+
+    async def report(self):
+        now = time.perf_counter()
+        await self.phase("report", [self.report_one(name, now + self.rng.uniform(0, self.args.report_window))
+                                    for name in self.lobbies])
+
+    async def run(self):
+        await self.create()
+        await self.fill()
+        await self.start()
+        await self.vote()
+        await self.report()
+
+def print_report(sim, monitor):
+    print(f"\n{'phase':<8} {'interactions':>12} {'seconds':>8} {'per sec':>9} {'lag p50':>9} {'lag p99':>9} {'lag max':>9}")
+    for name, start, end, count in sim.phases:
+        lags = monitor.between(start, end)
+        print(f"{name:<8} {count:>12} {end - start:>8.2f} {count / (end - start):>9,.0f} "
+              f"{percentile(lags, 50) * 1000:>7.1f}ms {percentile(lags, 99) * 1000:>7.1f}ms "
+              f"{max(lags, default=0) * 1000:>7.1f}ms")
+
+    print(f"\n{'interaction':<13} {'count':>7} {'p50':>9} {'p99':>9} {'max':>9}")
+    for kind, values in sim.latencies.items():
+        print(f"{kind:<13} {len(values):>7} {percentile(values, 50) * 1000:>7.1f}ms "
+              f"{percentile(values, 99) * 1000:>7.1f}ms {max(values) * 1000:>7.1f}ms")
+
+async def run(args):
+    scenario = Scenario(args.players, random.Random(args.seed), args.directory)
+    random.seed(args.seed)
+    scenario.guild.latency = args.latency_ms / 1000
+    sim = Simulator(scenario, args)
+    monitor = LagMonitor(args.lag_interval_ms / 1000)
+    monitor.start()
+    start = time.perf_counter()
+    await sim.run()
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+
+    total = sum(len(v) for v in sim.latencies.values())
+    print(f"⚡ {total} interactions over {args.lobbies} lobbies in {elapsed:.2f}s "
+          f"({total / elapsed:,.0f}/s, {args.players:,} players, {args.latency_ms:.0f}ms fake REST latency)")
+    print_report(sim, monitor)
+
+    problems = list(sim.errors)
+    settled = len(scenario.store.matches)
+    if settled != args.lobbies:
+        problems.append(f"only {settled} of {args.lobbies} matches settled")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay interaction storms against the bot's callbacks")
+    parser.add_argument("--players", type=int, default=10000, help="Size of the synthetic player base")
+    parser.add_argument("--lobbies", type=int, default=20)
+    parser.add_argument("--join-rate", type=float, default=200, help="Join clicks per second during the fill burst")
+    parser.add_argument("--overflow", type=int, default=4, help="Extra joiners per lobby racing for seats")
+    parser.add_argument("--start-clicks", type=int, default=3, help="Start Match clicks per host")
+    parser.add_argument("--vote-window", type=float, default=1.0, help="Seconds the 10 votes of a match arrive in")
+    parser.add_argument("--report-window", type=float, default=1.0, help="Seconds all matches are reported in")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake Discord REST latency")
+    parser.add_argument("--lag-interval-ms", type=float, default=10.0, help="Event-loop lag sampling interval")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bot.profiling.SLOW_COMMAND_MS = float("inf")
+    args.directory = "."  # bench_suite already moved us into a scratch directory
+    problems = asyncio.run(run(args))
+    if problems:
+        print(f"\n❌ {len(problems)} problems:")
+        for problem in problems[:20]:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("\n✅ Every interaction completed and every match settled")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Concurrency stress test for lobby joins, match starts and settlement.
+
+    python benchmarks/lobby_stress.py --lobbies 20 --interactions 600
+
+Fires hundreds of interactions at once on one event loop, the way a burst of
+button clicks arrives, through the bot's real callbacks and the fakes in
+fakes.py: /join and Join-button clicks, /leave and Leave-button clicks,
+repeated Start Match clicks from the host and an admin, then several admins
+each running /reportwin and mashing its confirm buttons. Fake REST calls
+sleep --latency-ms, which is where handlers interleave.
+
+Afterwards it checks that no lobby ever held more than LOBBY_SIZE players,
+each match's category was created once, each match was settled once (one
+ledger record, and ten rating updates across its players), and no
+callback raised or answered an interaction twice. Exits nonzero if any
+check fails.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import traceback
+from collections import Counter
+
+from bench_suite import Scenario, bot
+from fakes import FakeInteraction
+from storage import LOBBY_SIZE
+
+class Harness:
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.guild = scenario.guild
+        self.rng = scenario.rng
+        self.views = {}              # {lobby: LobbyView}
+        self.hosts = {}              # {lobby: host}
+        self.max_seen = Counter()    # {lobby: most players ever seen}
+        self.counts = Counter()
+        self.errors = []
+
+    def interaction(self, user):
+        return FakeInteraction(self.guild, user, self.scenario.lobby_channel)
+
+    async def fire(self, kind, delay, callback, *args):
+        """Run a callback after `delay` seconds, recording any exception"""
+        await asyncio.sleep(delay)
+        self.counts[kind] += 1
+        try:
+            await callback(*args)
+        except Exception as e:
+            self.errors.append(f"{kind}: {type(e).__name__}: {e}")
+            if len(self.errors) == 1:
+                traceback.print_exc()
+
+    def observe(self, lobby):
+        record = self.scenario.store.get_lobby(self.guild.id, lobby)
+        if record:
+            self.max_seen[lobby] = max(self.max_seen[lobby], len(record["players"]))
+
+    async def create(self, lobby):
+        host = self.scenario.member()
+        host.roles.append(next(r for r in self.guild.roles if r.name == "Host"))
+        interaction = self.interaction(host)
+        await bot.startlobby.callback(interaction, lobby)
+        self.views[lobby] = interaction.response.sent[0]["view"]
+        self.hosts[lobby] = host
+
+    async def join(self, lobby, member, delay):
+        if self.rng.random() < 0.5:
+            await self.fire("join", delay, bot.join.callback, self.interaction(member), lobby)
+        else:
+            await self.fire("join_button", delay, self.views[lobby].join.callback, self.interaction(member))
+        self.observe(lobby)
+
+    async def leave(self, lobby, member, delay):
+        if self.rng.random() < 0.5:
+            await self.fire("leave", delay, bot.leave.callback, self.interaction(member), lobby)
+        else:
+            await self.fire("leave_button", delay, self.views[lobby].leave.callback, self.interaction(member))
+
+    async def start(self, lobby, user, delay):
+        await self.fire("start_button", delay, self.views[lobby].start.callback, self.interaction(user))
+
+    async def report(self, lobby, admin, delay, presses):
+        """/reportwin, then `presses` clicks on its confirm buttons"""
+        interaction = self.interaction(admin)
+        await self.fire("reportwin", delay, bot.reportwin.callback, interaction, lobby, self.rng.choice(["T", "CT"]))
+        sent = interaction.response.sent
+        view = sent[-1].get("view") if sent else None
+        if view is None:
+            return
+        await asyncio.gather(*(self.fire("confirm", self.rng.uniform(0, 0.01),
+                                         self.rng.choice([view.confirm_t, view.confirm_ct]).callback,
+                                         self.interaction(admin))
+                               for _ in range(presses)))
+
+def rating_updates(store, guild_id):
+    """Every player's version summed: apply_elo bumps it once per settled match"""
+    return sum(stats.version for stats in store._guild(guild_id).players.values())
+
+async def run(args):
+    scenario = Scenario(args.players, random.Random(args.seed), ".")
+    random.seed(args.seed)
+    scenario.guild.latency = args.latency_ms / 1000
+    harness = Harness(scenario)
+    rng = scenario.rng
+    guild_id = scenario.guild.id
+    lobbies = [f"lobby{i}" for i in range(args.lobbies)]
+    admins = [scenario.guild.add_member(scenario.admin.id - 1 - i, name=f"admin{i}", administrator=True)
+              for i in range(args.clicks)]
+    for lobby in lobbies:
+        await harness.create(lobby)
+    updates_before = rating_updates(scenario.store, guild_id)
+
+    # Phase 1: a burst of joins and leaves from a pool a bit bigger than the
+    # lobbies can hold, so joins contend for seats
+    pool = set()
+    while len(pool) < args.lobbies * LOBBY_SIZE * 2:
+        pool.add(scenario.member())
+    pool = sorted(pool - set(harness.hosts.values()), key=lambda member: member.id)
+    burst = []
+    for _ in range(args.interactions):
+        lobby, member, delay = rng.choice(lobbies), rng.choice(pool), rng.uniform(0, args.window)
+        if rng.random() < 0.8:
+            burst.append(harness.join(lobby, member, delay))
+        else:
+            burst.append(harness.leave(lobby, member, delay))
+    start = time.perf_counter()
+    await asyncio.gather(*burst)
+
+    # Fill any lobby left short so every lobby gets to start
+    for lobby in lobbies:
+        while len(scenario.store.get_lobby(guild_id, lobby)["players"]) < LOBBY_SIZE:
+            await harness.join(lobby, pool.pop(), 0)
+
+    # Phase 2: the host and an admin mash Start, then admins race to report
+    await asyncio.gather(*(harness.start(lobby, user, rng.uniform(0, args.window / 10))
+                           for lobby in lobbies for user in (harness.hosts[lobby], admins[0])
+                           for _ in range(args.clicks)))
+    await asyncio.gather(*(harness.report(lobby, admin, rng.uniform(0, args.window / 10), args.clicks)
+                           for lobby in lobbies for admin in admins))
+    elapsed = time.perf_counter() - start
+
+    print(f"🔀 {sum(harness.counts.values())} interactions in {elapsed:.2f}s "
+          f"({', '.join(f'{kind}={n}' for kind, n in sorted(harness.counts.items()))})")
+
+    problems = list(harness.errors)
+    categories = Counter(channel.name for channel in scenario.guild.channels.values() if channel.kind == "category")
+    settled = Counter(record["lobby_name"] for record in scenario.store.matches.values())
+    for lobby in lobbies:
+        if harness.max_seen[lobby] > LOBBY_SIZE:
+            problems.append(f"{lobby} reached {harness.max_seen[lobby]} players")
+        if categories[f"MATCH: {lobby}"] != 1:
+            problems.append(f"{lobby} created {categories[f'MATCH: {lobby}']} match categories")
+        if settled[lobby] != 1:
+            problems.append(f"{lobby} was settled {settled[lobby]} times")
+    updates = rating_updates(scenario.store, guild_id) - updates_before
+    if updates != LOBBY_SIZE * len(lobbies):
+        problems.append(f"{updates} rating updates for {len(lobbies)} matches of {LOBBY_SIZE}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress lobby joins, starts and reports through the bot's callbacks")
+    parser.add_argument("--players", type=int, default=5000, help="Size of the synthetic player base")
+    parser.add_argument("--lobbies", type=int, default=20)
+    parser.add_argument("--interactions", type=int, default=600, help="Join/leave clicks in the first burst")
+    parser.add_argument("--clicks", type=int, default=3, help="Start clicks per user, admins reporting, confirm clicks")
+    parser.add_argument("--window", type=float, default=0.5, help="Seconds the join/leave burst arrives in")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Fake Discord REST latency")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bot.profiling.SLOW_COMMAND_MS = float("inf")
+    problems = asyncio.run(run(args))
+    if problems:
+        print(f"❌ {len(problems)} problems:")
+        for problem in problems[:20]:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("✅ No lobby overfilled, every match started and settled exactly once")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Benchmark for the columnar match analytics in analytics.py.
+
+    python benchmarks/match_analytics.py --matches 500000
+
+Builds a synthetic ledger shaped like the store's (5v5 records with a map,
+winner and corrections), then times building one guild's columns and the
+queries behind /mapstats and /headtohead. The same questions answered by
+scanning the ledger's records are timed as a baseline, and both answers are
+compared so a speedup can't come from a wrong result.
+
+Then the same queries go through a LocalStore loaded with the ledger, once
+its table is built. A store query may add at most --store-budget-ms over
+the table's own time (it only takes the lock and looks the table up), so
+work that grows with the ledger creeping back onto the cached path fails
+the run with exit code 1.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+from analytics import GuildMatches, MatchColumns, record_sides
+from storage import LocalStore
+
+GUILD_ID = 1
+MAPS = ["MIRAGE", "CACHE", "VERTIGO", "INFERNO", "NUKE", "TRAIN"]
+
+def build_ledger(matches, players, rng):
+    ledger = {}
+    pool = [str(10**17 + i) for i in range(players)]
+    for i in range(matches):
+        ten = rng.sample(pool, 10)
+        winner = rng.choice(["T", "CT"])
+        record = {
+            "guild_id": GUILD_ID if rng.random() < 0.9 else 2,
+            "lobby_name": f"lobby{i % 50}",
+            "winner": winner,
+            "winning_side": ten[:5],
+            "losing_side": ten[5:],
+            "selected_map": rng.choice(MAPS) if rng.random() < 0.95 else None,
+        }
+        if rng.random() < 0.01:
+            record["corrected_at"] = "2025-01-01T00:00:00"
+        ledger[f"{record['guild_id']}:{record['lobby_name']}:{i}"] = record
+    return ledger, pool
+
+def scan_map_stats(ledger):
+    stats = {}
+    for record in ledger.values():
+        if record["guild_id"] != GUILD_ID:
+            continue
+        _, _, ct_won = record_sides(record)
+        entry = stats.setdefault(record["selected_map"] or "UNKNOWN", [0, 0, 0])
+        entry[0] += 1
+        entry[2 if ct_won else 1] += 1
+    return stats
+
+def scan_head_to_head(ledger, user_id, other_id):
+    result = {"against": [0, 0], "together": [0, 0]}
+    user_id, other_id = str(user_id), str(other_id)
+    for record in ledger.values():
+        if record["guild_id"] != GUILD_ID:
+            continue
+        t_side, ct_side, ct_won = record_sides(record)
+        sides = {uid: 0 for uid in t_side}
+        sides.update({uid: 1 for uid in ct_side})
+        if user_id in sides and other_id in sides:
+            entry = result["together" if sides[user_id] == sides[other_id] else "against"]
+            entry[0] += 1
+            entry[1] += sides[user_id] == ct_won
+    return result
+
+def per_query(func, calls):
+    """Average seconds per call of func(*args) over calls"""
+    start = time.perf_counter()
+    for args in calls:
+        func(*args)
+    return (time.perf_counter() - start) / len(calls)
+
+def store_overheads(ledger, table, players, pairs):
+    """{query: (table ms, store ms)} with the store's table already built"""
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "match_history.json"), "w") as f:
+            json.dump(ledger, f)
+        store = LocalStore(*(os.path.join(directory, name) for name in
+                             ("guilds", "blacklist.json", "match_history.json", "players.json")))
+        store.map_stats(GUILD_ID)  # Builds the table, as the first /mapstats does
+        queries = {
+            "mapstats": (table.map_stats, [()] * 10, store.map_stats, [(GUILD_ID,)] * 10),
+            "player": (table.player_stats, [(uid,) for uid in players],
+                       store.player_match_stats, [(GUILD_ID, uid) for uid in players]),
+            "h2h": (table.head_to_head, pairs, store.head_to_head, [(GUILD_ID,) + pair for pair in pairs]),
+        }
+        return {name: (per_query(bare, bare_calls) * 1000, per_query(locked, store_calls) * 1000)
+                for name, (bare, bare_calls, locked, store_calls) in queries.items()}
+
+def timed(func, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Time columnar match analytics against scanning the ledger")
+    parser.add_argument("--matches", type=int, default=200000)
+    parser.add_argument("--players", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200, help="Player and head-to-head queries to average over")
+    parser.add_argument("--store-budget-ms", type=float, default=1.0,
+                        help="Most a store query may add to the table's own time")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ledger, pool = build_ledger(args.matches, args.players, rng)
+    print(f"📚 {len(ledger):,} matches, {args.players:,} players")
+
+    columns = MatchColumns()
+    table, build = timed(columns.guild, GUILD_ID, lambda: ledger)
+    size = memory.deep_sizeof(table, follow=(GuildMatches,))
+    print(f"build   {build * 1000:>9.1f}ms  {len(table):,} rows, {memory.format_bytes(size)}")
+
+    stats, column_time = timed(table.map_stats, repeat=10)
+    expected, scan_time = timed(scan_map_stats, ledger)
+    assert {m: v for m, v in stats.items()} == expected, "map stats differ from the scan"
+    print(f"mapstats {column_time * 1000:>8.2f}ms  (scan {scan_time * 1000:.0f}ms)")
+
+    players = [int(rng.choice(pool)) for _ in range(args.queries)]
+    start = time.perf_counter()
+    for user_id in players:
+        table.player_stats(user_id)
+    print(f"player   {(time.perf_counter() - start) / args.queries * 1000:>8.2f}ms")
+
+    pairs = [(int(rng.choice(pool)), int(rng.choice(pool))) for _ in range(args.queries)]
+    start = time.perf_counter()
+    for user_id, other_id in pairs:
+        table.head_to_head(user_id, other_id)
+    column_time = (time.perf_counter() - start) / args.queries
+    user_id, other_id = pairs[0]
+    expected, scan_time = timed(scan_head_to_head, ledger, user_id, other_id)
+    assert table.head_to_head(user_id, other_id) == expected, "head-to-head differs from the scan"
+    print(f"h2h      {column_time * 1000:>8.2f}ms  (scan {scan_time * 1000:.0f}ms)")
+
+    problems = []
+    for name, (bare, locked) in store_overheads(ledger, table, players, pairs).items():
+        print(f"store {name:<8} {locked:>6.2f}ms  ({locked - bare:+.2f}ms over the table)")
+        if locked - bare > args.store_budget_ms:
+            problems.append(f"store {name} adds {locked - bare:.2f}ms, budget {args.store_budget_ms}ms")
+    if problems:
+        print(f"\n❌ {len(problems)} store queries over budget:")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print(f"\n✅ Cached store queries within +{args.store_budget_ms}ms of the table")
+
+if __name__ == "__main__":
+    main()
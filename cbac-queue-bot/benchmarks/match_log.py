@@ -0,0 +1,83 @@
+"""Benchmark for the segmented per-player match log in matchlog.py.
+
+    python benchmarks/match_log.py --matches 200000 --players 5000
+
+Logs `matches` 5v5 results (ten entries each) into a temporary directory a
+match per flush, the way the store writes them, then times reopening the
+log (loading the .idx files), fetching the newest and the deepest page of
+/history, and, as the baseline, reading one player's entries by scanning
+every segment.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+from matchlog import MatchLog
+
+def timed_pages(log, users, page_of):
+    start = time.perf_counter()
+    for user_id in users:
+        log.page(user_id, page_of(user_id), 10)
+    return (time.perf_counter() - start) / len(users)
+
+def scan_player(log, user_id):
+    entries = []
+    for segment in log.segments:
+        with open(log._path(segment, "log"), "rb") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["user_id"] == user_id:
+                    entries.append(entry)
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the segmented match log's writes, load and page reads")
+    parser.add_argument("--matches", type=int, default=200000)
+    parser.add_argument("--players", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pool = [10**17 + i for i in range(args.players)]
+    with tempfile.TemporaryDirectory() as directory:
+        log = MatchLog(directory)
+        start = time.perf_counter()
+        for i in range(args.matches):
+            for n, user_id in enumerate(rng.sample(pool, 10)):
+                change = rng.randint(30, 35) if n < 5 else -rng.randint(10, 18)
+                log.append(user_id, {"timestamp": "2026-01-01T00:00:00", "elo_change": change, "new_elo": 1000,
+                                     "result": "win" if change > 0 else "loss", "map": "MIRAGE",
+                                     "match_id": f"1:lobby:{i}"})
+            log.flush()
+        written = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"📚 {log.entry_count():,} entries in {len(log.segments)} segments, {memory.format_bytes(size)} on disk")
+        print(f"append   {written / args.matches * 1e6:>9.1f}µs per match (10 entries, one flush)")
+
+        start = time.perf_counter()
+        log = MatchLog(directory)
+        print(f"open     {(time.perf_counter() - start) * 1000:>9.1f}ms  index {memory.format_bytes(memory.deep_sizeof(log.index))}")
+
+        users = [rng.choice(pool) for _ in range(args.queries)]
+        newest = timed_pages(log, users, lambda user_id: 0)
+        deepest = timed_pages(log, users, lambda user_id: (log.count(user_id) - 1) // 10)
+        print(f"page 1   {newest * 1000:>9.3f}ms")
+        print(f"last     {deepest * 1000:>9.3f}ms")
+
+        user_id = users[0]
+        start = time.perf_counter()
+        scanned = scan_player(log, user_id)
+        scan_time = time.perf_counter() - start
+        assert scanned[::-1][:10] == log.page(user_id, 0, 10), "first page differs from the scan"
+        print(f"scan     {scan_time * 1000:>9.1f}ms  (one player's {len(scanned)} matches, reading every segment)")
+
+if __name__ == "__main__":
+    main()
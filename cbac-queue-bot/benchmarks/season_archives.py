@@ -0,0 +1,89 @@
+"""Benchmark for ending a season in storage.py and reading its archive.
+
+    python benchmarks/season_archives.py --players 50000 --matches 20000
+
+Fills one guild with `players` players carrying full recent_matches and a
+ledger of `matches` settled matches, then ends the season with the default
+soft reset. Prints what the live set costs in memory before and after, the
+archive's size next to the plain JSON, and how long an archived profile and
+leaderboard take on first use (gunzip and parse) and once cached.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+from seasons import archive_path
+from storage import LocalStore, PlayerStats
+
+GUILD_ID = 1
+MAPS = ["MIRAGE", "INFERNO", "NUKE", "ANCIENT", "ANUBIS", "DUST2", "VERTIGO"]
+
+def live_bytes(store):
+    partition = store._guild(GUILD_ID)
+    return memory.deep_sizeof([partition.players, partition.elo_index, store.matches], follow=(PlayerStats,))
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a season rollover and lazy archive lookups")
+    parser.add_argument("--players", type=int, default=50000)
+    parser.add_argument("--matches", type=int, default=20000)
+    parser.add_argument("--carryover", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalStore(os.path.join(directory, "guilds"), os.path.join(directory, "blacklist.json"),
+                           os.path.join(directory, "matches.json"), os.path.join(directory, "players.json"))
+        partition = store._guild(GUILD_ID)
+        ids = [str(10**17 + i) for i in range(args.players)]
+        for uid in ids:
+            recent = [{"timestamp": "2026-01-01T00:00:00", "elo_change": rng.choice((30, -12)), "new_elo": 1000,
+                       "map": rng.choice(MAPS), "match_id": "1:bench:0"} for _ in range(10)]
+            partition.players[uid] = PlayerStats({"elo": max(0, int(rng.gauss(700, 350))), "wins": rng.randint(0, 60),
+                                                  "losses": rng.randint(0, 60), "recent_matches": recent})
+        partition.elo_index = sorted((stats.elo, uid) for uid, stats in partition.players.items())
+        for i in range(args.matches):
+            players = rng.sample(ids, 10)
+            store.matches[f"{GUILD_ID}:bench:{i}"] = {"guild_id": GUILD_ID, "map": rng.choice(MAPS),
+                                                      "winner": rng.choice(("T", "CT")), "t_side": players[:5],
+                                                      "ct_side": players[5:], "timestamp": "2026-01-01T00:00:00"}
+            store.guild_match_ids.setdefault(GUILD_ID, {})[f"{GUILD_ID}:bench:{i}"] = None
+        before = live_bytes(store)
+        print(f"📚 {args.players:,} players, {args.matches:,} matches: {memory.format_bytes(before)} live")
+
+        start = time.perf_counter()
+        season, changes = store.end_season(GUILD_ID, args.carryover)
+        ended = (time.perf_counter() - start) * 1000
+        kept = sum(1 for _, _, new_elo in changes if new_elo)
+        print(f"end      {ended:>9.1f}ms  {kept:,} players kept at {args.carryover:.0%}, "
+              f"{memory.format_bytes(live_bytes(store))} live")
+
+        archived = archive_path(partition.seasons_dir, season)
+        gz_size = os.path.getsize(archived)
+        store.archives.archives.clear()
+        plain = store.archives.get(archived)
+        plain_size = len(json.dumps({"players": plain.players}))
+        print(f"archive  {memory.format_bytes(gz_size):>9}  (players alone as JSON: {memory.format_bytes(plain_size)})")
+
+        store.archives.archives.clear()
+        user_id = rng.choice(ids)
+        cold = timed(store.season_player, GUILD_ID, season, user_id)
+        warm = timed(store.season_player, GUILD_ID, season, user_id)
+        top = timed(store.season_top, GUILD_ID, season, 10)
+        print(f"profile  {cold:>9.1f}ms cold, {warm:.3f}ms cached")
+        print(f"top 10   {top:>9.3f}ms cached")
+
+if __name__ == "__main__":
+    main()
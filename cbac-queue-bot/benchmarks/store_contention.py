@@ -0,0 +1,192 @@
+"""Contention benchmark for the state store.
+
+    python benchmarks/store_contention.py --workers 8 --ops 2000
+
+Starts a store server on a temp directory and N worker processes that all
+hammer the same guild: joining and leaving a handful of lobbies with
+join_if_not_full, claiming party codes and settling matches with
+apply_match_deltas. Reports throughput and per-op latency, then checks the
+invariants the atomic operations are there to protect: no lobby over
+LOBBY_SIZE or with a duplicate player, no party left holding a code after
+its disband, and ELO totals that match the deltas applied. The same workload is run against an in-process LocalStore
+with threads as a baseline.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from storage import LOBBY_SIZE, LocalStore, connect_store
+
+GUILD_ID = 1
+LOBBY_NAMES = [f"lobby{i}" for i in range(4)]
+PLAYERS_PER_WORKER = 40
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run_worker(store, worker_id, ops, seed):
+    """Run a random op mix, returns ({op: [latency_ms]}, [claimed codes], elo_total_delta)"""
+    rng = random.Random(seed)
+    user_ids = [worker_id * 1000 + i for i in range(PLAYERS_PER_WORKER)]
+    latencies = {"join": [], "leave": [], "claim_code": [], "match": []}
+    claimed = []
+    elo_delta = 0
+
+    for n in range(ops):
+        roll = rng.random()
+        start = time.perf_counter()
+        if roll < 0.45:
+            store.join_if_not_full(GUILD_ID, rng.choice(LOBBY_NAMES), [rng.choice(user_ids)], LOBBY_SIZE)
+            op = "join"
+        elif roll < 0.85:
+            store.leave_lobby(GUILD_ID, rng.choice(LOBBY_NAMES), [rng.choice(user_ids)])
+            op = "leave"
+        elif roll < 0.95:
+            code = str(rng.randint(1000, 9999))
+            if store.claim_party_code(GUILD_ID, code, user_ids[n % len(user_ids)]):
+                claimed.append(code)
+                store.disband_party(GUILD_ID, user_ids[n % len(user_ids)])
+            op = "claim_code"
+        else:
+            players = rng.sample(user_ids, 10)
+            deltas = [(uid, 30, None) for uid in players[:5]] + [(uid, -10, None) for uid in players[5:]]
+            results = store.apply_match_deltas(GUILD_ID, f"w{worker_id}_{n}", deltas)
+            elo_delta += sum(change for _, _, change, _ in results)
+            op = "match"
+        latencies[op].append((time.perf_counter() - start) * 1000)
+    return latencies, claimed, elo_delta
+
+def process_worker(address, authkey, worker_id, ops, seed, results):
+    store = connect_store(address, authkey)
+    results.put(run_worker(store, worker_id, ops, seed))
+
+def serve_store(port, directory, authkey):
+    storage.serve("127.0.0.1", port,
+                  os.path.join(directory, "guilds"),
+                  os.path.join(directory, "blacklist.json"),
+                  os.path.join(directory, "match_history.json"),
+                  authkey=authkey, players_file=os.path.join(directory, "players.json"))
+
+def setup_lobbies(store):
+    for name in LOBBY_NAMES:
+        store.create_lobby(GUILD_ID, name, None)
+
+def check_invariants(store, results):
+    problems = []
+    for name, record in store.get_lobbies(GUILD_ID).items():
+        if len(record["players"]) > LOBBY_SIZE:
+            problems.append(f"{name} has {len(record['players'])} players")
+        if len(set(record["players"])) != len(record["players"]):
+            problems.append(f"{name} has duplicate players")
+
+    # Codes are released on disband, so only concurrently held codes must be
+    # unique; every claim is followed by a disband, so the store ends empty
+    if store.get_parties(GUILD_ID):
+        problems.append("parties left behind after disband")
+
+    expected = sum(delta for _, _, delta in results)
+    total = sum(store.get_player(GUILD_ID, uid).elo
+                for worker in range(len(results)) for uid in range(worker * 1000, worker * 1000 + PLAYERS_PER_WORKER)
+                if store.has_player(GUILD_ID, uid))
+    if total != expected:
+        problems.append(f"ELO total {total} != applied deltas {expected}")
+    return problems
+
+def report(label, results, elapsed):
+    merged = {}
+    for latencies, _, _ in results:
+        for op, values in latencies.items():
+            merged.setdefault(op, []).extend(values)
+    total_ops = sum(len(v) for v in merged.values())
+    print(f"\n{label}: {total_ops} ops in {elapsed:.2f}s ({total_ops / elapsed:,.0f} ops/s)")
+    for op, values in merged.items():
+        print(f"  {op:<11} n={len(values):<6} p50={percentile(values, 50):7.3f}ms  p99={percentile(values, 99):7.3f}ms")
+
+def bench_local(workers, ops, directory):
+    store = LocalStore(os.path.join(directory, "local_guilds"),
+                       os.path.join(directory, "local_blacklist.json"),
+                       os.path.join(directory, "local_matches.json"),
+                       os.path.join(directory, "local_players.json"))
+    setup_lobbies(store)
+    results = [None] * workers
+
+    def target(i):
+        results[i] = run_worker(store, i, ops, seed=i)
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    report(f"LocalStore, {workers} threads", results, elapsed)
+    return check_invariants(store, results)
+
+def bench_networked(workers, ops, directory, port):
+    authkey = secrets.token_hex(16)
+    server = multiprocessing.Process(target=serve_store, args=(port, directory, authkey), daemon=True)
+    server.start()
+    address = f"127.0.0.1:{port}"
+    deadline = time.time() + 15
+    while True:
+        try:
+            store = connect_store(address, authkey)
+            break
+        except OSError:
+            if time.time() > deadline:
+                server.terminate()
+                sys.exit(f"❌ Store server did not come up on {address}")
+            time.sleep(0.2)
+
+    try:
+        setup_lobbies(store)
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=process_worker, args=(address, authkey, i, ops, i, queue))
+                 for i in range(workers)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        elapsed = time.perf_counter() - start
+        for p in procs:
+            p.join()
+        report(f"Store server, {workers} processes", results, elapsed)
+        return check_invariants(store, results)
+    finally:
+        server.terminate()
+        server.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark store contention across processes")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=1000, help="Operations per worker")
+    parser.add_argument("--port", type=int, default=50123)
+    args = parser.parse_args()
+
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        problems += bench_local(args.workers, args.ops, directory)
+        problems += bench_networked(args.workers, args.ops, directory, args.port)
+
+    if problems:
+        print("\n❌ Invariant violations:")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("\n✅ Invariants held")
+
+if __name__ == "__main__":
+    main()
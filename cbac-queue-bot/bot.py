@@ -1,15 +1,32 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.utils import get
 import os
 import random
 import json
 import asyncio
+import hashlib
+import bisect
+import re
+import tempfile
+import time
+import traceback
+import aiohttp
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from collections import Counter, defaultdict
+from collections import Counter, OrderedDict, defaultdict
+from itertools import islice
 from typing import Optional, List
+from storage import LocalStore, connect_store, match_key
+from locks import lobby_lock, player_lock
+from backup import BACKUP_INTERVAL
+import export
+import memory
+import metrics
+import profiling
+import watchdog
+from profiling import profiled
 
 # Replace with your actual emoji IDs
 EMOJIS = {
@@ -24,14 +41,94 @@ EMOJIS = {
     "matches": "🎮"
 }
 
+STARTUP_TIME = time.perf_counter()
+
 load_dotenv()
 
-intents = discord.Intents.default()
-intents.members = True
-intents.voice_states = True
-intents.message_content = True
+# Lean gateway mode: no member chunking or presences, members are fetched on demand
+LEAN_MODE = os.getenv("LEAN_MODE", "0") == "1"
+
+# Who invite and substitute lists hold: without presences lean mode can't
+# tell who's online, only who the bot has seen
+LISTED_PLAYERS = "recently active players" if LEAN_MODE else "online players"
+
+# Max members kept by the on-demand member cache
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", "5000"))
+
+# Sharding: SHARD_COUNT shards in total, this process runs SHARD_IDS ("0,1,2").
+# launcher.py sets both when it splits shards over several processes.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS", "").split(",") if i.strip()] or None
+SHARDED = os.getenv("SHARDED", "0") == "1" or SHARD_COUNT is not None
+
+# Prometheus metrics and health/readiness probes (see metrics.py), port 0 turns them off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+REST_REQUESTS = metrics.counter("cbac_discord_requests_total", "Discord REST calls", ["method", "route", "status"])
+REST_RATE_LIMITED = metrics.counter("cbac_discord_rate_limited_total", "Discord REST calls answered with 429", ["method", "route"])
+REST_SECONDS = metrics.histogram("cbac_discord_request_seconds", "Discord REST call latency", ["method", "route"])
+
+SNOWFLAKE_SEGMENT = re.compile(r"/\d{15,20}(?=/|$)")
+
+def rest_route(url):
+    """/api/v10/channels/123/messages/456 -> /channels/{id}/messages/{id}, so routes stay few"""
+    path = re.sub(r"^/api/v\d+", "", url.path)
+    path = SNOWFLAKE_SEGMENT.sub("/{id}", path)
+    path = re.sub(r"/(interactions|webhooks)/\{id\}/[^/]+", r"/\1/{id}/{token}", path)
+    return re.sub(r"/reactions/[^/]+", "/reactions/{emoji}", path)
+
+async def on_rest_start(session, ctx, params):
+    ctx.start = time.perf_counter()
+
+async def on_rest_end(session, ctx, params):
+    route = rest_route(params.url)
+    status = params.response.status
+    REST_REQUESTS.inc(method=params.method, route=route, status=status)
+    elapsed = time.perf_counter() - ctx.start
+    REST_SECONDS.observe(elapsed, method=params.method, route=route)
+    profiling.discord_io(elapsed)
+    if status == 429:
+        REST_RATE_LIMITED.inc(method=params.method, route=route)
+
+async def on_rest_exception(session, ctx, params):
+    REST_REQUESTS.inc(method=params.method, route=rest_route(params.url), status="error")
+
+# Every REST call discord.py makes goes through this trace, including its own retries after a 429
+rest_trace = aiohttp.TraceConfig()
+rest_trace.on_request_start.append(on_rest_start)
+rest_trace.on_request_end.append(on_rest_end)
+rest_trace.on_request_exception.append(on_rest_exception)
+
+if SHARDED:
+    bot_class = commands.AutoShardedBot
+    shard_options = {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS}
+else:
+    bot_class = commands.Bot
+    shard_options = {}
+
+if LEAN_MODE:
+    # Slash commands and buttons only need guilds; voice states are for moving players
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.voice_states = True
+
+    bot = bot_class(
+        command_prefix=commands.when_mentioned,
+        intents=intents,
+        chunk_guilds_at_startup=False,
+        member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+        http_trace=rest_trace,
+        **shard_options
+    )
+else:
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.voice_states = True
+    intents.presences = True  # Keeps the online member index current
+    intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+    bot = bot_class(command_prefix="!", intents=intents, http_trace=rest_trace, **shard_options)
 
 # Multiple lobbies: {guild_id: {lobby_name: QueueData}}
 lobbies = {}
@@ -51,9 +148,47 @@ substitute_requests = {}
 # Match history for corrections and tracking
 MATCH_HISTORY_FILE = "match_history.json"
 
-# Player data file with enhanced tracking
+# Global player data file from before stats were split by guild, migrated on first start
 DATA_FILE = "players.json"
 
+# Per-guild player stats, ELO history and match logs (see storage.GuildPlayers)
+GUILDS_DIR = "guilds"
+
+# Blacklist data structure
+BLACKLIST_FILE = "blacklist.json"
+
+# Matches per /history page (full match lists are kept by matchlog.py)
+HISTORY_PAGE_SIZE = 10
+
+# Entries per /blacklistall page
+BLACKLIST_PAGE_SIZE = 5
+
+# Percent of each player's ELO carried into the next season by /endseason (0 = hard reset)
+SEASON_CARRYOVER = int(os.getenv("SEASON_CARRYOVER", "50"))
+# Players whose rank roles are moved at once after a season ends, and seconds between progress updates
+SEASON_ROLE_CONCURRENCY = int(os.getenv("SEASON_ROLE_CONCURRENCY", "4"))
+SEASON_PROGRESS_INTERVAL = 30
+
+# "host:port" of a store server shared by several bot processes (see launcher.py),
+# unset to keep player data and the blacklist in this process
+STORE_ADDRESS = os.getenv("STORE_ADDRESS")
+
+# Live lobbies, parties and votes, snapshotted so a restart doesn't drop them.
+# Each shard range keeps its own file, as it only ever holds its own guilds.
+STATE_SNAPSHOT_FILE = "state_snapshot.json"
+if SHARD_IDS:
+    STATE_SNAPSHOT_FILE = f"state_snapshot_shards_{SHARD_IDS[0]}-{SHARD_IDS[-1]}.json"
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "15"))  # seconds
+
+# Hash of the command manifest at the last sync, per application and scope
+COMMAND_SYNC_FILE = "command_sync.json"
+
+# Sync commands to this guild only (instant updates while developing)
+DEV_GUILD_ID = os.getenv("DEV_GUILD_ID")
+
+# Sync even if the command manifest hash hasn't changed
+FORCE_SYNC = os.getenv("FORCE_SYNC", "0") == "1"
+
 # Orange Theme
 ORANGE_COLOR = discord.Color.from_rgb(255, 102, 0)
 
@@ -88,120 +223,25 @@ class QueueData:
         self.t_side = []           # Store T-side players
         self.ct_side = []          # Store CT-side players
         self.replacements = {}     # Track replacements: {original_player: replacement_player}
+        self.lobby_id = None       # Unique per lobby, even when a name is reused
+        self.match_id = None       # Settlement key, set when the match starts
+        self.version = 0           # Store record version this was filled from
 
 # ==================== ENHANCED PLAYER DATA SYSTEM ====================
 
-class PlayerStats:
-    def __init__(self, data=None):
-        data = data or {}
-        self.elo = data.get("elo", 0)
-        self.wins = data.get("wins", 0)
-        self.losses = data.get("losses", 0)
-        self.recent_matches = data.get("recent_matches", [])  # Store last 10 matches
-        self.total_elo_gained = data.get("total_elo_gained", 0)
-        self.total_elo_lost = data.get("total_elo_lost", 0)
-    
-    def to_dict(self):
-        return {
-            "elo": self.elo,
-            "wins": self.wins,
-            "losses": self.losses,
-            "recent_matches": self.recent_matches[-10:],  # Keep last 10 matches
-            "total_elo_gained": self.total_elo_gained,
-            "total_elo_lost": self.total_elo_lost
-        }
-    
-    def add_match_result(self, elo_change, opponent_elo=None, map_played=None, result="win"):
-        match_data = {
-            "timestamp": datetime.now().isoformat(),
-            "elo_change": elo_change,
-            "new_elo": self.elo,
-            "result": result,
-            "map": map_played
-        }
-        if opponent_elo:
-            match_data["opponent_elo"] = opponent_elo
-        
-        self.recent_matches.append(match_data)
-        if len(self.recent_matches) > 10:
-            self.recent_matches.pop(0)
-        
-        if elo_change > 0:
-            self.total_elo_gained += elo_change
-        else:
-            self.total_elo_lost += abs(elo_change)
+# Shared player stats and blacklist (see storage.py)
+store = connect_store(STORE_ADDRESS) if STORE_ADDRESS else LocalStore(GUILDS_DIR, BLACKLIST_FILE, MATCH_HISTORY_FILE, DATA_FILE)
 
-def load_players():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
-            return {uid: PlayerStats(stats) for uid, stats in data.items()}
-    return {}
-
-def save_players(players):
-    data = {uid: stats.to_dict() for uid, stats in players.items()}
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
-
-players_data = load_players()
-
-def get_player_stats(user_id):
-    str_id = str(user_id)
-    if str_id not in players_data:
-        players_data[str_id] = PlayerStats()
-        save_players(players_data)
-    return players_data[str_id]
+def get_player_stats(guild_id, user_id):
+    return store.get_player(guild_id, user_id)
 
 # ==================== UPDATED ELO SYSTEM ====================
 
-def update_elo_with_protection(user_id, change, match_info=None):
+def update_elo_with_protection(guild_id, user_id, change, match_info=None):
     """Update ELO with protection for 0 ELO players"""
-    stats = get_player_stats(user_id)
-    
-    # If player has 0 ELO and change is negative, don't deduct
-    if stats.elo == 0 and change < 0:
-        change = 0  # No deduction for 0 ELO players
-    
-    old_elo = stats.elo
-    stats.elo += change
-    
-    # Update win/loss counts
-    if change > 0:
-        stats.wins += 1
-        result = "win"
-    elif change < 0:
-        stats.losses += 1
-        result = "loss"
-    else:
-        result = "draw"
-    
-    # Store match in history
-    if match_info:
-        stats.add_match_result(change, match_info.get("opponent_elo"), 
-                              match_info.get("map"), result)
-    
-    save_players(players_data)
-    return old_elo, change
-
-# Blacklist data structure
-BLACKLIST_FILE = "blacklist.json"
-blacklist_data = {}
-
-def load_blacklist():
-    """Load blacklist from file"""
-    global blacklist_data
-    if os.path.exists(BLACKLIST_FILE):
-        with open(BLACKLIST_FILE, "r") as f:
-            blacklist_data = json.load(f)
-    return blacklist_data
-
-def save_blacklist():
-    """Save blacklist to file"""
-    with open(BLACKLIST_FILE, "w") as f:
-        json.dump(blacklist_data, f, indent=4)
-
-# Load blacklist on startup
-load_blacklist()
+    result = store.update_elo(guild_id, user_id, change, match_info)
+    invalidate_profile(guild_id, user_id)
+    return result
 
 # ==================== USER-FRIENDLY PARTY SYSTEM ====================
 
@@ -214,8 +254,10 @@ class PartyData:
         self.guild_id = None  # Store guild ID
         self.created_at = datetime.now()
         self.party_code = self.generate_code()  # Simple 4-digit code
+        self.version = 0  # Store record version this was filled from
     
-    def generate_code(self):
+    @staticmethod
+    def generate_code():
         return f"{random.randint(1000, 9999)}"
     
     def is_full(self):
@@ -233,34 +275,84 @@ class PartyData:
             return True
         return False
 
+def party_from_record(guild, record, party=None):
+    """Fill a PartyData from a store record, updating `party` in place if given"""
+    members = [m for m in (get_cached_member(guild, i) for i in record["members"]) if m]
+    leader = next((m for m in members if m.id == record["leader"]), None)
+    if leader is None:
+        return None
+    party = party or PartyData(leader)
+    party.leader = leader
+    party.members = members
+    party.invites = set(record["invites"])
+    party.lobby_name = record["lobby_name"]
+    party.guild_id = guild.id
+    party.created_at = datetime.fromisoformat(record["created_at"])
+    party.party_code = record["party_code"]
+    party.version = record["version"]
+    return party
+
 def get_parties(guild_id):
+    """This guild's parties as PartyData, refreshed from the store's records"""
+    records = store.get_parties(guild_id)
     if guild_id not in parties:
         parties[guild_id] = {}
-    return parties[guild_id]
+    guild_parties = parties[guild_id]
+    for leader_id in [l for l in guild_parties if l not in records]:
+        del guild_parties[leader_id]
+    
+    guild = bot.get_guild(guild_id)
+    if guild is None:
+        return guild_parties
+    for leader_id, record in records.items():
+        party = guild_parties.get(leader_id)
+        if party is None or party.version != record["version"]:
+            party = party_from_record(guild, record, party)
+            if party:
+                guild_parties[leader_id] = party
+    return guild_parties
+
+def get_party(guild_id, leader_id):
+    """One party as PartyData, refreshed from its store record only"""
+    guild_parties = parties.setdefault(guild_id, {})
+    record = store.get_party(guild_id, leader_id)
+    guild = bot.get_guild(guild_id)
+    if record is None or guild is None:
+        guild_parties.pop(leader_id, None)
+        return None
+    party = guild_parties.get(leader_id)
+    if party is None or party.version != record["version"]:
+        party = party_from_record(guild, record, party)
+        if party:
+            guild_parties[leader_id] = party
+    return party
 
 def get_user_party(guild_id, user_id):
-    guild_parties = get_parties(guild_id)
-    for party_leader, party in guild_parties.items():
-        if user_id == party_leader or user_id in [m.id for m in party.members]:
-            return party_leader, party
-    return None, None
+    leader_id = get_busy_members(guild_id)["party"].get(user_id)
+    party = get_party(guild_id, leader_id) if leader_id is not None else None
+    return (leader_id, party) if party else (None, None)
 
 def create_party(guild_id, leader):
-    guild_parties = get_parties(guild_id)
-    
     # Check if user already in a party
     existing_leader, existing_party = get_user_party(guild_id, leader.id)
     if existing_party:
         return None, "❌ You're already in a party!"
     
-    party = PartyData(leader)
-    party.guild_id = guild_id
-    guild_parties[leader.id] = party
-    return party, "✅ Party created!"
+    # Claiming the code is atomic, retry on the rare collision
+    for _ in range(20):
+        if store.claim_party_code(guild_id, PartyData.generate_code(), leader.id):
+            break
+    else:
+        return None, "❌ Couldn't create the party, try again!"
+    
+    set_busy(guild_id, "party", [leader.id], leader_id=leader.id)
+    return get_party(guild_id, leader.id), "✅ Party created!"
 
 def disband_party(guild_id, leader_id):
-    if guild_id in parties and leader_id in parties[guild_id]:
-        del parties[guild_id][leader_id]
+    record = store.disband_party(guild_id, leader_id)
+    if record:
+        get_parties(guild_id).pop(leader_id, None)
+        set_busy(guild_id, "party", record["members"], False)
         return True
     return False
 
@@ -269,60 +361,237 @@ def leave_party(guild_id, user_id):
     if not party:
         return False, "❌ You're not in a party"
     
-    if user_id == leader_id:
+    members = list(party.members)
+    leader_id, disbanded = store.leave_party(guild_id, user_id)
+    if leader_id is None:
+        return False, "❌ You're not in a party"
+    
+    get_parties(guild_id)
+    if disbanded:
         # Leader leaving - disband party
-        disband_party(guild_id, leader_id)
+        set_busy(guild_id, "party", member_ids(members), False)
         return True, " Party disbanded (leader left)"
     else:
         # Member leaving
-        party.remove_member(party.guild_id.get_member(user_id))
+        set_busy(guild_id, "party", [user_id], False)
         return True, "👋 Left the party"
 
-def get_online_players_for_invite(guild, party):
-    """Get online players who can be invited"""
-    online_members = []
-    for member in guild.members:
-        if (member.bot or 
-            member in party.members or 
-            member.id in party.invites or
-            member.status == discord.Status.offline):
-            continue
-        
-        existing_leader, existing_party = get_user_party(guild.id, member.id)
-        if existing_party:
-            continue
-        
-        online_members.append(member)
-    
-    return online_members
+def join_party_by_code(guild_id, member, party_code):
+    """Returns (party, error message)"""
+    cache_member(member)
+    ok, reason, leader_id = store.join_party(guild_id, party_code, member.id)
+    if not ok:
+        errors = {
+            "invalid_code": "❌ Invalid party code!",
+            "already_in_party": "❌ You're already in a party!",
+            "full": "❌ Party is full! (Max 5 players)"
+        }
+        return None, errors.get(reason, "❌ Failed to join party!")
+    set_busy(guild_id, "party", [member.id], leader_id=leader_id)
+    return get_party(guild_id, leader_id), None
+
+def set_party_lobby(guild_id, party, lobby_name):
+    store.set_party_lobby(guild_id, party.leader.id, lobby_name)
+    party.lobby_name = lobby_name
+
+def get_online_players_for_invite(guild, party, limit=25):
+    """Up to `limit` available players who can be invited (a select menu holds 25)"""
+    candidates = (member for member in get_available_members(guild.id).values()
+                  if member.id not in party.invites)
+    return list(islice(candidates, limit))
+
+# ==================== MEMBER INDEX ====================
+
+# Members who can be invited or subbed in: {guild_id: {member_id: discord.Member}}
+# Only online (in lean mode: cached), non-bot members that are not in a party
+# and not in a running match.
+available_members = {}
+
+# Available members' ELO, ordered for substitute searches: {guild_id: [(elo, member_id)]}
+# and {guild_id: {member_id: elo}}. Members are looked up the first time a
+# search needs them (waiting in pending_elos until then) and leave when they
+# stop being available or their ELO changes.
+available_elo_index = {}
+available_elos = {}
+pending_elos = {}
+
+# Members in a party or playing a started match, kept up to date as parties
+# and matches change so checking one member doesn't read the store, and
+# finding a member's party reads only that party:
+# {guild_id: {"party": {member_id: leader_id}, "playing": {member_id: None}}}
+busy_members = {}
+
+def get_available_members(guild_id):
+    if guild_id not in available_members:
+        available_members[guild_id] = {}
+    return available_members[guild_id]
+
+def load_busy_members(guild_id):
+    """Read a guild's busy members from the store, only when its cache is (re)loaded"""
+    busy = {"party": {}, "playing": {}}
+    for leader_id, record in store.get_parties(guild_id).items():
+        busy["party"].update(dict.fromkeys(record["members"], leader_id))
+    for record in store.get_lobbies(guild_id).values():
+        if record["match_started"]:
+            busy["playing"].update(dict.fromkeys(record["players"]))
+    busy_members[guild_id] = busy
+    return busy
+
+def get_busy_members(guild_id):
+    if guild_id not in busy_members:
+        return load_busy_members(guild_id)
+    return busy_members[guild_id]
+
+def set_busy(guild_id, kind, member_ids, busy=True, leader_id=None):
+    """Mark members as in leader_id's party (kind "party") or playing a match
+    ("playing"), or as no longer so, and update the index to match"""
+    ids = get_busy_members(guild_id)[kind]
+    guild = bot.get_guild(guild_id)
+    for member_id in member_ids:
+        if busy:
+            ids[member_id] = leader_id
+            drop_from_member_index(guild_id, member_id)
+        else:
+            ids.pop(member_id, None)
+            member = get_cached_member(guild, member_id) if guild else None
+            if member:
+                refresh_member_index(member)
+
+def is_member_available(member):
+    if member.bot:
+        return False
+    # Without presences (lean mode) status is always offline, so skip that
+    # check; the lists say LISTED_PLAYERS rather than claim they're online
+    if bot.intents.presences and member.status == discord.Status.offline:
+        return False
+    busy = get_busy_members(member.guild.id)
+    return member.id not in busy["party"] and member.id not in busy["playing"]
+
+def refresh_member_index(member):
+    """Re-check a single member after a presence, party or match change"""
+    guild_members = get_available_members(member.guild.id)
+    if is_member_available(member):
+        if member.id not in guild_members:
+            pending_elos.setdefault(member.guild.id, set()).add(member.id)
+        guild_members[member.id] = member
+    else:
+        drop_from_member_index(member.guild.id, member.id)
+
+def drop_from_member_index(guild_id, member_id):
+    if get_available_members(guild_id).pop(member_id, None):
+        forget_available_elo(guild_id, member_id)
+
+def forget_available_elo(guild_id, member_id):
+    pending_elos.get(guild_id, set()).discard(member_id)
+    elo = available_elos.get(guild_id, {}).pop(member_id, None)
+    if elo is not None:
+        index = available_elo_index[guild_id]
+        pos = bisect.bisect_left(index, (elo, member_id))
+        if pos < len(index) and index[pos] == (elo, member_id):
+            del index[pos]
+
+def available_elo_changed(guild_id, member_id):
+    """Look the member's ELO up again on the next substitute search"""
+    if member_id in get_available_members(guild_id):
+        forget_available_elo(guild_id, member_id)
+        pending_elos.setdefault(guild_id, set()).add(member_id)
+
+def reset_available_elos(guild_id):
+    available_elo_index[guild_id] = []
+    available_elos[guild_id] = {}
+    pending_elos[guild_id] = set(get_available_members(guild_id))
+
+def rebuild_member_index(guild):
+    """Full scan, only used when the guild cache is (re)loaded. Lean mode has
+    next to no member list, so the members cached on demand are added back"""
+    load_busy_members(guild.id)
+    members = guild.members
+    if LEAN_MODE:
+        members = list(members) + [m for (guild_id, _), m in member_cache.items() if guild_id == guild.id]
+    available_members[guild.id] = {
+        m.id: m for m in members if is_member_available(m)
+    }
+    reset_available_elos(guild.id)
+
+# ==================== ON-DEMAND MEMBERS ====================
+
+# Members seen or fetched outside the gateway cache: {(guild_id, user_id): discord.Member}
+member_cache = OrderedDict()
+
+def cache_member(member):
+    key = (member.guild.id, member.id)
+    member_cache[key] = member
+    member_cache.move_to_end(key)
+    while len(member_cache) > MEMBER_CACHE_SIZE:
+        (guild_id, user_id), _ = member_cache.popitem(last=False)
+        drop_from_member_index(guild_id, user_id)
+
+def get_cached_member(guild, user_id):
+    """Member from the gateway cache or the on-demand cache, never hits the API"""
+    user_id = int(user_id)
+    member = guild.get_member(user_id)
+    if member:
+        return member
+    member = member_cache.get((guild.id, user_id))
+    if member:
+        member_cache.move_to_end((guild.id, user_id))
+    return member
+
+async def resolve_member(guild, user_id):
+    """Like guild.get_member but fetches (and caches) members that aren't loaded"""
+    member = get_cached_member(guild, user_id)
+    if member:
+        return member
+    try:
+        member = await guild.fetch_member(int(user_id))
+    except (discord.NotFound, discord.HTTPException):
+        return None
+    cache_member(member)
+    return member
+
+def nearest_by_elo(index, target_elo):
+    """(elo, member_id) from an ELO-ordered index, nearest to target_elo first"""
+    hi = bisect.bisect_left(index, (target_elo, 0))
+    lo = hi - 1
+    while lo >= 0 or hi < len(index):
+        if hi >= len(index) or (lo >= 0 and target_elo - index[lo][0] <= index[hi][0] - target_elo):
+            yield index[lo]
+            lo -= 1
+        else:
+            yield index[hi]
+            hi += 1
+
+def find_substitutes_by_elo(guild_id, target_elo, exclude_ids=(), limit=25):
+    """Closest-rated available players as (member, elo) pairs, nearest first.
+
+    Walks outwards from target_elo in the available members' ELO index, so
+    only members who became available since the last search are looked up
+    in the store, and only the picks are checked against the blacklist."""
+    available = get_available_members(guild_id)
+    index = available_elo_index.setdefault(guild_id, [])
+    elos = available_elos.setdefault(guild_id, {})
+    pending = pending_elos.pop(guild_id, None)
+    if pending:
+        elos.update(store.player_elos(guild_id, list(pending)))
+        index.extend((elos[member_id], member_id) for member_id in pending)
+        index.sort()
+    
+    nearest = ((elo, member_id) for elo, member_id in nearest_by_elo(index, target_elo)
+               if member_id not in exclude_ids)
+    results = []
+    while len(results) < limit:
+        picks = list(islice(nearest, limit - len(results)))
+        if not picks:
+            break
+        banned = store.blacklisted_ids([member_id for _, member_id in picks])
+        results.extend((available[member_id], elo) for elo, member_id in picks if member_id not in banned)
+    return results
 
 # ==================== ESSENTIAL FUNCTIONS ====================
 
 def is_blacklisted(user_id):
     """Check if a user is blacklisted"""
-    str_id = str(user_id)
-    if str_id not in blacklist_data:
-        return False
-    
-    blacklist_info = blacklist_data[str_id]
-    expires_at = blacklist_info.get("expires_at")
-    
-    # Check if permanent ban
-    if expires_at == "permanent":
-        return True
-    
-    # Check if temporary ban has expired
-    if expires_at:
-        try:
-            expire_time = datetime.fromisoformat(expires_at)
-            if datetime.now() > expire_time:
-                # Ban expired, remove from blacklist
-                remove_from_blacklist(user_id)
-                return False
-        except:
-            pass
-    
-    return True
+    return store.is_blacklisted(user_id)
 
 def add_to_blacklist(user_id, reason="No reason provided", duration_hours=24, admin_id=None, admin_name="System"):
     """Add user to blacklist"""
@@ -335,7 +604,7 @@ def add_to_blacklist(user_id, reason="No reason provided", duration_hours=24, ad
         expires_at = (datetime.now() + timedelta(hours=duration_hours)).isoformat()
         duration_text = f"{duration_hours} hours"
     
-    blacklist_data[str_id] = {
+    store.add_to_blacklist(str_id, {
         "user_id": str_id,
         "reason": reason,
         "added_at": datetime.now().isoformat(),
@@ -343,31 +612,76 @@ def add_to_blacklist(user_id, reason="No reason provided", duration_hours=24, ad
         "admin_id": str(admin_id) if admin_id else None,
         "admin_name": admin_name,
         "duration_hours": duration_hours
-    }
-    
-    save_blacklist()
+    })
     return True
 
 def remove_from_blacklist(user_id):
     """Remove user from blacklist"""
-    str_id = str(user_id)
-    if str_id in blacklist_data:
-        del blacklist_data[str_id]
-        save_blacklist()
-        return True
-    return False
+    return store.remove_from_blacklist(user_id)
 
 def get_blacklist_info(user_id):
     """Get blacklist information for a user"""
-    str_id = str(user_id)
-    if str_id not in blacklist_data:
-        return None
-    return blacklist_data[str_id]
+    return store.get_blacklist_info(user_id)
+
+def queue_from_record(guild, record, queue=None):
+    """Fill a QueueData from a store record, updating `queue` in place if given
+    so views and matches holding on to it see the change"""
+    queue = queue or QueueData()
+    queue.players = [m for m in (get_cached_member(guild, i) for i in record["players"]) if m]
+    queue.host = get_cached_member(guild, record["host"]) if record["host"] else None
+    queue.is_open = record["is_open"]
+    queue.match_started = record["match_started"]
+    queue.channel_id = record["channel_id"]
+    queue.message_id = record["message_id"]
+    queue.match_category_id = record["match_category_id"]
+    queue.match_lobby_channel_id = record["match_lobby_channel_id"]
+    queue.selected_map = record["selected_map"]
+    by_id = {p.id: p for p in queue.players}
+    queue.t_side = [by_id[i] for i in record["t_side"] if i in by_id]
+    queue.ct_side = [by_id[i] for i in record["ct_side"] if i in by_id]
+    queue.replacements = record["replacements"]
+    queue.lobby_id = record["lobby_id"]
+    queue.match_id = record["match_id"]
+    queue.version = record["version"]
+    return queue
 
 def get_lobbies(guild_id):
+    """This guild's lobbies as QueueData, refreshed from the store's records"""
+    records = store.get_lobbies(guild_id)
     if guild_id not in lobbies:
         lobbies[guild_id] = {}
-    return lobbies[guild_id]
+    guild_lobbies = lobbies[guild_id]
+    for name in [n for n in guild_lobbies if n not in records]:
+        del guild_lobbies[name]
+    
+    guild = bot.get_guild(guild_id)
+    if guild is None:
+        return guild_lobbies
+    for name, record in records.items():
+        queue = guild_lobbies.get(name)
+        if queue is None or queue.version != record["version"]:
+            guild_lobbies[name] = queue_from_record(guild, record, queue)
+    return guild_lobbies
+
+def update_lobby(guild_id, lobby_name, **fields):
+    """Write lobby fields (ids, not members) to the store, returns the refreshed queue"""
+    store.update_lobby(guild_id, lobby_name, fields)
+    return get_lobbies(guild_id).get(lobby_name)
+
+def join_lobby(guild_id, lobby_name, members):
+    """Atomically add members to a lobby if there's room. Returns (ok, reason)"""
+    for member in members:
+        cache_member(member)  # So the lobby can show members the gateway hasn't sent us
+    ok, reason = store.join_if_not_full(guild_id, lobby_name, [m.id for m in members])
+    get_lobbies(guild_id)
+    return ok, reason
+
+def leave_lobby(guild_id, lobby_name, members):
+    """Remove members from a lobby. Returns how many were in it"""
+    removed = store.leave_lobby(guild_id, lobby_name, [m.id for m in members])
+    get_lobbies(guild_id)
+    set_busy(guild_id, "playing", member_ids(members), False)
+    return removed
 
 def store_lobby_message(guild_id, lobby_name, channel_id, message_id):
     if guild_id not in lobby_messages:
@@ -381,22 +695,24 @@ def remove_lobby_message(guild_id, lobby_name):
     if guild_id in lobby_messages and lobby_name in lobby_messages[guild_id]:
         del lobby_messages[guild_id][lobby_name]
 
+# Tier floors, lowest first: TIER_MINS[i] is the min ELO of TIER_NAMES[i]
+TIER_MINS = sorted(data["min_elo"] for data in RANK_CONFIG.values())
+TIER_NAMES = [rank for rank, data in sorted(RANK_CONFIG.items(), key=lambda item: item[1]["min_elo"])]
+
+def tier_index(elo: int) -> int:
+    return max(bisect.bisect_right(TIER_MINS, elo) - 1, 0)
+
 def get_rank_role_name(elo: int) -> str:
-    for rank, data in RANK_CONFIG.items():
-        if elo >= data["min_elo"]:
-            return rank
-    return "[ Tier 10 | (0 – 149) ]"
+    return TIER_NAMES[tier_index(elo)]
 
 def get_progress_to_next(elo: int) -> str:
-    current_rank = get_rank_role_name(elo)
-    if current_rank == "[ Tier 1 1350+ ]":
+    idx = tier_index(elo)
+    if idx == len(TIER_NAMES) - 1:
         return "🏆 MAX RANK ACHIEVED"
     
-    ranks = list(RANK_CONFIG.keys())
-    current_idx = ranks.index(current_rank)
-    next_rank = ranks[current_idx - 1]
-    next_min = RANK_CONFIG[next_rank]["min_elo"]
-    current_min = RANK_CONFIG[current_rank]["min_elo"]
+    next_rank = TIER_NAMES[idx + 1]
+    next_min = TIER_MINS[idx + 1]
+    current_min = TIER_MINS[idx]
     
     progress = elo - current_min
     needed = next_min - current_min
@@ -407,7 +723,7 @@ def get_progress_to_next(elo: int) -> str:
     
     return f"`{bar}` {percentage:.1f}% to {next_rank}"
 
-async def update_player_rank(guild: discord.Guild, member: discord.Member, new_elo: int, old_elo: int):
+async def update_player_rank(guild: discord.Guild, member: discord.Member, new_elo: int, old_elo: int, announce=True):
     new_rank = get_rank_role_name(new_elo)
     old_rank = get_rank_role_name(old_elo)
     
@@ -417,10 +733,12 @@ async def update_player_rank(guild: discord.Guild, member: discord.Member, new_e
         return
     
     tier_roles = [r for r in guild.roles if r.name.startswith("Tier ")]
-    await member.remove_roles(*tier_roles, reason="Rank update")
-    await member.add_roles(new_role, reason="Rank update")
+    # Two rank updates for one player (e.g. a report and an /addelo) mustn't interleave
+    async with player_lock(guild.id, member.id):
+        await member.remove_roles(*tier_roles, reason="Rank update")
+        await member.add_roles(new_role, reason="Rank update")
     
-    rank_channel = get(guild.text_channels, name="⌏rank-up⌌")
+    rank_channel = get(guild.text_channels, name="⌏rank-up⌌") if announce else None
     if rank_channel and new_elo > 0:
         if old_elo == 0:
             await rank_channel.send(f"🎉 {member.mention} has entered the ranks as **{new_rank}**! ({new_elo} ELO)")
@@ -432,15 +750,17 @@ async def update_player_rank(guild: discord.Guild, member: discord.Member, new_e
 
 # ==================== ENHANCED EMBEDS ====================
 
-def profile_embed(member):
-    stats = get_player_stats(member.id)
+def profile_embed(member, stats=None, season=None):
+    """A player's profile card; pass an archived season's stats and number to show that season's"""
+    if stats is None:
+        stats = get_player_stats(member.guild.id, member.id)
     total = stats.wins + stats.losses
     winrate = (stats.wins / total * 100) if total > 0 else 0
     rank = get_rank_role_name(stats.elo)
     progress = get_progress_to_next(stats.elo)
     
     embed = discord.Embed(
-        title=f" {member.display_name.upper()}'S PROFILE",
+        title=f" {member.display_name.upper()}'S {f'SEASON {season} ' if season else ''}PROFILE",
         color=ORANGE_COLOR
     )
     embed.set_thumbnail(url=member.display_avatar.url)
@@ -457,7 +777,7 @@ def profile_embed(member):
                    value=f"+{stats.total_elo_gained}", inline=True)
     embed.add_field(name=f"{EMOJIS['down']} TOTAL ELO LOST", 
                    value=f"-{stats.total_elo_lost}", inline=True)
-    embed.add_field("MATCHES PLAYED", value=total, inline=True)
+    embed.add_field(name="MATCHES PLAYED", value=total, inline=True)
     
     if stats.recent_matches:
         recent_text = []
@@ -470,7 +790,38 @@ def profile_embed(member):
         if recent_text:
             embed.add_field(name=" RECENT MATCHES", value="\n".join(recent_text), inline=False)
     
-    embed.set_footer(text=f"Party Code: Use /party to create or join")
+    if season:
+        embed.set_footer(text=f"Final stats of season {season}")
+    else:
+        embed.set_footer(text=f"Party Code: Use /party to create or join")
+    return embed
+
+# Rendered profile cards: {(guild_id, user_id): ((stats version, display name, avatar url), discord.Embed)}
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1000"))
+profile_cards = OrderedDict()
+
+def invalidate_profile(guild_id, user_id):
+    profile_cards.pop((guild_id, int(user_id)), None)
+    available_elo_changed(guild_id, int(user_id))
+
+def invalidate_guild_profiles(guild_id):
+    for card_id in [card_id for card_id in profile_cards if card_id[0] == guild_id]:
+        del profile_cards[card_id]
+    reset_available_elos(guild_id)
+
+def get_profile_card(member):
+    """profile_embed(member), reused until the player's stats, name or avatar change.
+    The version check also catches changes made by other bot processes"""
+    card_id = (member.guild.id, member.id)
+    key = (store.player_version(member.guild.id, member.id), member.display_name, member.display_avatar.url)
+    cached = profile_cards.get(card_id)
+    if cached and cached[0] == key:
+        profile_cards.move_to_end(card_id)
+        return cached[1]
+    embed = profile_embed(member)
+    profile_cards[card_id] = (key, embed)
+    while len(profile_cards) > PROFILE_CACHE_SIZE:
+        profile_cards.popitem(last=False)
     return embed
 
 def party_embed(party, show_code=True):
@@ -551,14 +902,14 @@ def queue_embed(lobby_name, queue):
         
         lines = []
         for i, player in enumerate(solo_players, 1):
-            elo = get_player_stats(player.id).elo
+            elo = get_player_stats(player.guild.id, player.id).elo
             lines.append(f"{i}. 👤 {player.mention} ({elo} ELO)")
         
         party_num = len(solo_players) + 1
         for leader_id, members in player_groups.items():
             if members:
                 members_str = ", ".join(m.mention for m in members)
-                avg_elo = sum(get_player_stats(m.id).elo for m in members) // len(members)
+                avg_elo = sum(get_player_stats(m.guild.id, m.id).elo for m in members) // len(members)
                 lines.append(f"{party_num}. 🎉 **PARTY:** {members_str} (Avg: {avg_elo} ELO)")
                 party_num += 1
         
@@ -576,37 +927,43 @@ class LobbyView(discord.ui.View):
         super().__init__(timeout=None)
         self.lobby_name = lobby_name
         self.queue = queue
+        
+        # Stable custom ids so the buttons keep working after a restart
+        for action, button in (("join", self.join), ("leave", self.leave),
+                               ("refresh", self.refresh), ("start", self.start)):
+            button.custom_id = f"lobby:{action}:{lobby_name}"[:100]
 
     async def update(self, interaction):
-        await interaction.response.edit_message(embed=queue_embed(self.lobby_name, self.queue), view=self)
+        # Restored views have no queue of their own, and one serves every guild
+        queue = get_lobbies(interaction.guild.id).get(self.lobby_name)
+        if not queue:
+            return await interaction.response.send_message("Lobby closed!", ephemeral=True)
+        await interaction.response.edit_message(embed=queue_embed(self.lobby_name, queue), view=self)
 
     @discord.ui.button(label="Join", style=discord.ButtonStyle.success)
+    @profiled
     async def join(self, interaction: discord.Interaction, button):
-        queue = get_lobbies(interaction.guild.id).get(self.lobby_name)
-        if not queue or not queue.is_open:
-            return await interaction.response.send_message("Lobby closed!", ephemeral=True)
-        if interaction.user in queue.players:
-            return await interaction.response.send_message("Already in!", ephemeral=True)
-        if len(queue.players) >= 10:
-            return await interaction.response.send_message("Full!", ephemeral=True)
-        queue.players.append(interaction.user)
+        ok, reason = join_lobby(interaction.guild.id, self.lobby_name, [interaction.user])
+        if not ok:
+            errors = {"closed": "Lobby closed!", "already_in": "Already in!", "full": "Full!"}
+            return await interaction.response.send_message(errors[reason], ephemeral=True)
         await self.update(interaction)
 
     @discord.ui.button(label="Leave", style=discord.ButtonStyle.danger)
+    @profiled
     async def leave(self, interaction: discord.Interaction, button):
-        queue = get_lobbies(interaction.guild.id).get(self.lobby_name)
-        if not queue or interaction.user not in queue.players:
+        removed = leave_lobby(interaction.guild.id, self.lobby_name, [interaction.user])
+        if not removed:
             return await interaction.response.send_message("Not in lobby!", ephemeral=True)
-        queue.players.remove(interaction.user)
-        if queue.host == interaction.user:
-            queue.host = None
         await self.update(interaction)
 
     @discord.ui.button(label="Refresh", style=discord.ButtonStyle.grey)
+    @profiled
     async def refresh(self, interaction: discord.Interaction, button):
         await self.update(interaction)
 
     @discord.ui.button(label="Start Match", style=discord.ButtonStyle.success)
+    @profiled
     async def start(self, interaction: discord.Interaction, button):
         queue = get_lobbies(interaction.guild.id).get(self.lobby_name)
         if not queue:
@@ -618,9 +975,17 @@ class LobbyView(discord.ui.View):
         if interaction.user != queue.host and not interaction.user.guild_permissions.administrator:
             return await interaction.response.send_message("Only host or admin!", ephemeral=True)
 
-        queue.match_started = True
+        # begin_match lets only the first of several clicks through, so the
+        # others are answered straight away instead of waiting for the setup.
+        # The lobby lock then keeps reports and removals out while channels are made
+        match_id, reason = store.begin_match(interaction.guild.id, self.lobby_name)
+        if reason != "ok":
+            errors = {"missing": "Lobby gone!", "started": "Match already started!", "not_full": "Need 10 players!"}
+            return await interaction.response.send_message(errors[reason], ephemeral=True)
         await interaction.response.defer()
-        await start_match(interaction, self.lobby_name, queue)
+        async with lobby_lock(interaction.guild.id, self.lobby_name):
+            queue = get_lobbies(interaction.guild.id)[self.lobby_name]
+            await start_match(interaction, self.lobby_name, queue)
 
 # ==================== USER-FRIENDLY PARTY VIEWS ====================
 
@@ -631,6 +996,7 @@ class PartyManageView(discord.ui.View):
         self.party = party
     
     @discord.ui.button(label="📨 Invite Players", style=discord.ButtonStyle.primary, emoji="👥")
+    @profiled
     async def invite_players(self, interaction: discord.Interaction, button):
         if interaction.user.id != self.party_leader_id:
             await interaction.response.send_message("❌ Only the party leader can invite players!", ephemeral=True)
@@ -638,12 +1004,13 @@ class PartyManageView(discord.ui.View):
         
         view = PartyInviteView(interaction.guild, self.party)
         await interaction.response.send_message(
-            "**👥 Select a player to invite:**\n*Only online players not in parties are shown*",
+            f"**👥 Select a player to invite:**\n*Only {LISTED_PLAYERS} not in parties are shown*",
             view=view,
             ephemeral=True
         )
     
     @discord.ui.button(label="🚪 Leave Party", style=discord.ButtonStyle.danger)
+    @profiled
     async def leave_party(self, interaction: discord.Interaction, button):
         success, message = leave_party(interaction.guild.id, interaction.user.id)
         
@@ -666,6 +1033,7 @@ class PartyManageView(discord.ui.View):
             await interaction.response.send_message(message, ephemeral=True)
     
     @discord.ui.button(label="🎮 Queue for Lobby", style=discord.ButtonStyle.success)
+    @profiled
     async def queue_for_lobby(self, interaction: discord.Interaction, button):
         if interaction.user.id != self.party_leader_id:
             await interaction.response.send_message("❌ Only the party leader can queue!", ephemeral=True)
@@ -684,6 +1052,7 @@ class PartyManageView(discord.ui.View):
                 required=True
             )
             
+            @profiled
             async def on_submit(self, interaction: discord.Interaction):
                 lobby_name = self.lobby_name.value.strip()
                 queue = get_lobbies(interaction.guild.id).get(lobby_name)
@@ -716,11 +1085,17 @@ class PartyManageView(discord.ui.View):
                     await interaction.response.send_message(f"**Cannot queue party:**\n{error_msg}", ephemeral=True)
                     return
                 
-                for member in self.view.party.members:
-                    if member not in queue.players:
-                        queue.players.append(member)
-                
-                self.view.party.lobby_name = lobby_name
+                ok, reason = join_lobby(interaction.guild.id, lobby_name, self.view.party.members)
+                if ok:
+                    set_party_lobby(interaction.guild.id, self.view.party, lobby_name)
+                if not ok:
+                    errors = {
+                        "closed": f"❌ No open lobby named '{lobby_name}'",
+                        "already_in": "❌ A party member is already in this lobby",
+                        "full": "❌ Lobby doesn't have enough space for the whole party"
+                    }
+                    await interaction.response.send_message(errors[reason], ephemeral=True)
+                    return
                 
                 try:
                     if queue.channel_id and queue.message_id:
@@ -743,12 +1118,14 @@ class PartyManageView(discord.ui.View):
         await interaction.response.send_modal(modal)
     
     @discord.ui.button(label="📋 Party Info", style=discord.ButtonStyle.gray)
+    @profiled
     async def party_info(self, interaction: discord.Interaction, button):
         embed = party_embed(self.party)
         await interaction.response.send_message(embed=embed, ephemeral=True)
     
     # ADD THIS NEW REFRESH BUTTON
     @discord.ui.button(label="🔄 Refresh", style=discord.ButtonStyle.gray)
+    @profiled
     async def refresh_party(self, interaction: discord.Interaction, button):
         """Refresh the party view with updated information"""
         
@@ -799,6 +1176,7 @@ class SubstituteView(discord.ui.View):
         self.player_to_replace = player_to_replace
     
     @discord.ui.button(label="🔍 Find Replacement", style=discord.ButtonStyle.primary)
+    @profiled
     async def find_replacement(self, interaction: discord.Interaction, button):
         queue = get_lobbies(interaction.guild.id).get(self.lobby_name)
         
@@ -806,32 +1184,32 @@ class SubstituteView(discord.ui.View):
             await interaction.response.send_message("❌ Match not found!", ephemeral=True)
             return
         
-        online_players = []
-        for member in interaction.guild.members:
-            if (not member.bot and 
-                member.status != discord.Status.offline and
-                member not in queue.players):
-                online_players.append(member)
+        target_elo = get_player_stats(interaction.guild.id, self.player_to_replace.id).elo
+        candidates = find_substitutes_by_elo(
+            interaction.guild.id,
+            target_elo,
+            exclude_ids={p.id for p in queue.players}
+        )
         
-        if not online_players:
-            await interaction.response.send_message("❌ No available online players!", ephemeral=True)
+        if not candidates:
+            await interaction.response.send_message(f"❌ No available {LISTED_PLAYERS}!", ephemeral=True)
             return
         
         options = []
-        for player in online_players[:25]:
-            elo = get_player_stats(player.id).elo
+        for player, elo in candidates:
             options.append(
                 discord.SelectOption(
                     label=player.display_name,
                     value=str(player.id),
-                    description=f"ELO: {elo}"
+                    description=f"ELO: {elo} ({elo - target_elo:+d} vs {target_elo})"
                 )
             )
         
         class ReplacementSelect(discord.ui.Select):
+            @profiled
             async def callback(self, interaction: discord.Interaction):
                 replacement_id = int(self.values[0])
-                replacement = interaction.guild.get_member(replacement_id)
+                replacement = await resolve_member(interaction.guild, replacement_id)
                 
                 if not replacement:
                     await interaction.response.send_message("❌ Player not found!", ephemeral=True)
@@ -845,6 +1223,7 @@ class SubstituteView(discord.ui.View):
                 
                 confirm_view = discord.ui.View(timeout=60)
                 
+                @profiled
                 async def confirm_callback(interaction: discord.Interaction):
                     success = await replace_player(
                         interaction.guild,
@@ -863,6 +1242,7 @@ class SubstituteView(discord.ui.View):
                     else:
                         await interaction.response.send_message("❌ Replacement failed!", ephemeral=True)
                 
+                @profiled
                 async def cancel_callback(interaction: discord.Interaction):
                     await interaction.response.edit_message(
                         content="❌ Replacement cancelled.",
@@ -886,51 +1266,36 @@ class SubstituteView(discord.ui.View):
         temp_view.add_item(select)
         temp_view.view = self
         
-        await interaction.response.send_message("**Select a replacement player:**", view=temp_view, ephemeral=True)
+        await interaction.response.send_message("**Select a replacement player:**\n*Closest ELO first*", view=temp_view, ephemeral=True)
     
     @discord.ui.button(label="❌ Cancel", style=discord.ButtonStyle.danger)
+    @profiled
     async def cancel(self, interaction: discord.Interaction, button):
         await interaction.response.edit_message(content="❌ Replacement request cancelled.", embed=None, view=None)
 
 async def replace_player(guild, lobby_name, old_player, new_player):
-    queue = get_lobbies(guild.id).get(lobby_name)
-    if not queue or not queue.match_started:
+    cache_member(new_player)
+    team = store.replace_in_lobby(guild.id, lobby_name, old_player.id, new_player.id)
+    if not team:
         return False
     
-    if new_player in queue.players:
-        return False
+    queue = get_lobbies(guild.id).get(lobby_name)
+    set_busy(guild.id, "playing", [new_player.id])
+    set_busy(guild.id, "playing", [old_player.id], False)
     
-    if old_player in queue.players:
-        queue.players.remove(old_player)
-        queue.players.append(new_player)
-        
-        if old_player in queue.t_side:
-            queue.t_side.remove(old_player)
-            queue.t_side.append(new_player)
-            team = "T-SIDE"
-        elif old_player in queue.ct_side:
-            queue.ct_side.remove(old_player)
-            queue.ct_side.append(new_player)
-            team = "CT-SIDE"
-        else:
-            return False
-        
-        queue.replacements[str(old_player.id)] = str(new_player.id)
-        
-        match_channel = guild.get_channel(queue.match_lobby_channel_id)
-        if match_channel:
-            await match_channel.send(
-                f"🔄 **PLAYER REPLACEMENT**\n"
-                f"**{old_player.mention}** has been replaced by **{new_player.mention}**\n"
-                f"**Team:** {team}"
-            )
-        
-        return True
+    match_channel = guild.get_channel(queue.match_lobby_channel_id)
+    if match_channel:
+        await match_channel.send(
+            f"🔄 **PLAYER REPLACEMENT**\n"
+            f"**{old_player.mention}** has been replaced by **{new_player.mention}**\n"
+            f"**Team:** {team}"
+        )
     
-    return False
+    return True
 
 # ==================== MATCH FUNCTIONS ====================
 
+@profiled
 async def start_match(interaction, lobby_name, queue):
     party_groups = {}
     solo_players = []
@@ -989,8 +1354,8 @@ async def start_match(interaction, lobby_name, queue):
         t_side = queue.players[:5]
         ct_side = queue.players[5:]
     
-    queue.t_side = t_side
-    queue.ct_side = ct_side
+    update_lobby(interaction.guild.id, lobby_name, t_side=member_ids(t_side), ct_side=member_ids(ct_side))
+    set_busy(interaction.guild.id, "playing", member_ids(queue.players))
 
     overwrites = {
         interaction.guild.default_role: discord.PermissionOverwrite(view_channel=False),
@@ -1022,8 +1387,8 @@ async def start_match(interaction, lobby_name, queue):
     t_voice = await category.create_voice_channel("T-SIDE", user_limit=5)
     ct_voice = await category.create_voice_channel("CT-SIDE", user_limit=5)
 
-    queue.match_category_id = category.id
-    queue.match_lobby_channel_id = lobby_text.id
+    update_lobby(interaction.guild.id, lobby_name,
+                 match_category_id=category.id, match_lobby_channel_id=lobby_text.id)
 
     lobby_link = f"https://discord.com/channels/{interaction.guild.id}/{lobby_text.id}"
     t_voice_link = f"https://discord.com/channels/{interaction.guild.id}/{t_voice.id}"
@@ -1112,7 +1477,12 @@ async def start_map_voting(interaction, lobby_name, queue, lobby_channel):
     if guild_id not in map_votes:
         map_votes[guild_id] = {}
     
-    map_votes[guild_id][lobby_name] = {"votes": {}, "message_id": None}
+    map_votes[guild_id][lobby_name] = {
+        "votes": {},
+        "message_id": None,
+        "channel_id": lobby_channel.id,
+        "ends_at": (datetime.now() + timedelta(seconds=120)).isoformat()
+    }
     
     view = MapVoteView(lobby_name, queue.players)
     
@@ -1145,8 +1515,8 @@ def map_vote_embed(lobby_name, votes_data):
     return embed
 
 class MapVoteView(discord.ui.View):
-    def __init__(self, lobby_name, players):
-        super().__init__(timeout=120)
+    def __init__(self, lobby_name, players, timeout=120):
+        super().__init__(timeout=timeout)
         self.lobby_name = lobby_name
         self.players = players
         self.votes = {}
@@ -1154,15 +1524,20 @@ class MapVoteView(discord.ui.View):
         self.vote_ended = False
         
         for map_name in MAP_POOL:
-            self.add_item(MapVoteButton(map_name))
+            self.add_item(MapVoteButton(map_name, custom_id=f"mapvote:{map_name}:{lobby_name}"[:100]))
     
     async def on_timeout(self):
-        if self.vote_ended:
-            return
-        self.vote_ended = True
+        await self.end_voting()
+    
+    async def end_after(self, delay):
+        """Timer for restored (persistent) votes, which can't use the view timeout"""
+        await asyncio.sleep(max(delay, 0))
         await self.end_voting()
     
     async def end_voting(self):
+        if self.vote_ended:
+            return
+        self.vote_ended = True
         guild_id = self.message.guild.id
         vote_counts = Counter(self.votes.values())
         
@@ -1175,7 +1550,7 @@ class MapVoteView(discord.ui.View):
         
         queue = get_lobbies(guild_id).get(self.lobby_name)
         if queue:
-            queue.selected_map = winner
+            queue = update_lobby(guild_id, self.lobby_name, selected_map=winner)
         
         if guild_id in map_votes and self.lobby_name in map_votes[guild_id]:
             del map_votes[guild_id][self.lobby_name]
@@ -1216,10 +1591,11 @@ class MapVoteView(discord.ui.View):
         return voted_players == player_ids
 
 class MapVoteButton(discord.ui.Button):
-    def __init__(self, map_name):
-        super().__init__(label=map_name, style=discord.ButtonStyle.primary)
+    def __init__(self, map_name, custom_id=None):
+        super().__init__(label=map_name, style=discord.ButtonStyle.primary, custom_id=custom_id)
         self.map_name = map_name
     
+    @profiled
     async def callback(self, interaction: discord.Interaction):
         view = self.view
         
@@ -1242,6 +1618,7 @@ class MapVoteButton(discord.ui.Button):
 
 # ==================== WIN REPORT ====================
 
+@profiled
 async def process_win_report(interaction, lobby_name, queue, winner, t_side, ct_side):
     guild_lobbies = get_lobbies(interaction.guild.id)
     if lobby_name not in guild_lobbies:
@@ -1255,41 +1632,54 @@ async def process_win_report(interaction, lobby_name, queue, winner, t_side, ct_
     elo_gain = random.randint(30, 35)
     elo_loss = random.randint(10, 18)
     
-    winner_changes = []
+    # Both sides are rated against the other side's pre-match average
+    def average_elo(side):
+        elos = [get_player_stats(interaction.guild.id, p.id).elo for p in side]
+        return sum(elos) // len(elos) if elos else 0
+    
+    winner_opponent_elo = average_elo(losing_side)
+    loser_opponent_elo = average_elo(winning_side)
+    
+    deltas = []
     for player in winning_side:
-        opponent_elos = [get_player_stats(p.id).elo for p in losing_side]
-        avg_opponent_elo = sum(opponent_elos) // len(opponent_elos) if opponent_elos else 0
-        
-        old_elo, change = update_elo_with_protection(
-            player.id, 
-            elo_gain,
-            match_info={"opponent_elo": avg_opponent_elo, "map": queue.selected_map}
-        )
-        
-        winner_changes.append(f"✅ {player.mention}: +{change} ELO ({old_elo} → {get_player_stats(player.id).elo})")
-        member = interaction.guild.get_member(player.id)
-        if member:
-            await update_player_rank(interaction.guild, member, get_player_stats(player.id).elo, old_elo)
+        deltas.append((player.id, elo_gain, {"opponent_elo": winner_opponent_elo, "map": queue.selected_map}))
+    for player in losing_side:
+        deltas.append((player.id, -elo_loss, {"opponent_elo": loser_opponent_elo, "map": queue.selected_map}))
+    
+    # Settling is keyed by the match: a second report of it is refused below
+    match_id = queue.match_id or match_key(interaction.guild.id, lobby_name, queue.lobby_id)
+    match_record = {
+        "guild_id": interaction.guild.id,
+        "lobby_name": lobby_name,
+        "winner": winner,
+        "winning_side": [str(p.id) for p in winning_side],
+        "losing_side": [str(p.id) for p in losing_side],
+        "timestamp": datetime.now().isoformat(),
+        "elo_gain": elo_gain,
+        "elo_loss": elo_loss,
+        "selected_map": queue.selected_map,
+        "reported_by": str(interaction.user.id)
+    }
+    results = store.apply_match_deltas(interaction.guild.id, match_id, deltas, match_record)
+    if results is None:
+        return await interaction.followup.send(f"❌ {lobby_name} was already reported", ephemeral=True)
     
+    winner_ids = {str(p.id) for p in winning_side}
+    winner_changes = []
     loser_changes = []
-    for player in losing_side:
-        opponent_elos = [get_player_stats(p.id).elo for p in winning_side]
-        avg_opponent_elo = sum(opponent_elos) // len(opponent_elos) if opponent_elos else 0
-        
-        old_elo, change = update_elo_with_protection(
-            player.id, 
-            -elo_loss,
-            match_info={"opponent_elo": avg_opponent_elo, "map": queue.selected_map}
-        )
-        
-        if change == 0 and old_elo == 0:
-            loser_changes.append(f"🛡️ {player.mention}: No change (Protected at 0 ELO)")
+    for user_id, old_elo, change, new_elo in results:
+        invalidate_profile(interaction.guild.id, user_id)
+        mention = f"<@{user_id}>"
+        if user_id in winner_ids:
+            winner_changes.append(f"✅ {mention}: +{change} ELO ({old_elo} → {new_elo})")
+        elif change == 0 and old_elo == 0:
+            loser_changes.append(f"🛡️ {mention}: No change (Protected at 0 ELO)")
         else:
-            loser_changes.append(f"❌ {player.mention}: {change} ELO ({old_elo} → {get_player_stats(player.id).elo})")
+            loser_changes.append(f"❌ {mention}: {change} ELO ({old_elo} → {new_elo})")
         
-        member = interaction.guild.get_member(player.id)
+        member = await resolve_member(interaction.guild, int(user_id))
         if member:
-            await update_player_rank(interaction.guild, member, get_player_stats(player.id).elo, old_elo)
+            await update_player_rank(interaction.guild, member, new_elo, old_elo)
     
     embed = discord.Embed(
         title=f"🏁 MATCH RESULTS: {lobby_name.upper()}",
@@ -1306,8 +1696,8 @@ async def process_win_report(interaction, lobby_name, queue, winner, t_side, ct_
     if queue.replacements:
         replacements_text = []
         for old_id, new_id in queue.replacements.items():
-            old_member = interaction.guild.get_member(int(old_id))
-            new_member = interaction.guild.get_member(int(new_id))
+            old_member = await resolve_member(interaction.guild, old_id)
+            new_member = await resolve_member(interaction.guild, new_id)
             if old_member and new_member:
                 replacements_text.append(f"{old_member.mention} → {new_member.mention}")
         
@@ -1321,16 +1711,15 @@ async def process_win_report(interaction, lobby_name, queue, winner, t_side, ct_
     cleanup_lobby(interaction.guild.id, lobby_name)
 
 def cleanup_lobby(guild_id, lobby_name):
-    if guild_id in lobbies and lobby_name in lobbies[guild_id]:
-        del lobbies[guild_id][lobby_name]
+    get_lobbies(guild_id).pop(lobby_name, None)
+    record = store.delete_lobby(guild_id, lobby_name)
+    if record and record["match_started"]:
+        set_busy(guild_id, "playing", record["players"], False)
     
     if guild_id in lobby_messages and lobby_name in lobby_messages[guild_id]:
         del lobby_messages[guild_id][lobby_name]
     
-    for guild_parties in parties.values():
-        for party in guild_parties.values():
-            if party.lobby_name == lobby_name:
-                party.lobby_name = None
+    get_parties(guild_id)
 
 # ==================== REPORT WIN VIEW ====================
 
@@ -1351,6 +1740,7 @@ class ReportWinView(discord.ui.View):
             await interaction.response.edit_message(view=self)
     
     @discord.ui.button(label="Confirm T Win", style=discord.ButtonStyle.danger)
+    @profiled
     async def confirm_t(self, interaction: discord.Interaction, button):
         if interaction.user != self.queue.host and not interaction.user.guild_permissions.administrator:
             return await interaction.response.send_message("Only host or admin!", ephemeral=True)
@@ -1361,10 +1751,12 @@ class ReportWinView(discord.ui.View):
         self.processing = True
         await self.disable_all_buttons(interaction)
         await interaction.delete_original_response()
-        await process_win_report(interaction, self.lobby_name, self.queue, "T", self.t_side, self.ct_side)
+        async with lobby_lock(interaction.guild.id, self.lobby_name):
+            await process_win_report(interaction, self.lobby_name, self.queue, "T", self.t_side, self.ct_side)
         self.stop()
     
     @discord.ui.button(label="Confirm CT Win", style=discord.ButtonStyle.primary)
+    @profiled
     async def confirm_ct(self, interaction: discord.Interaction, button):
         if interaction.user != self.queue.host and not interaction.user.guild_permissions.administrator:
             return await interaction.response.send_message("Only host or admin!", ephemeral=True)
@@ -1375,10 +1767,12 @@ class ReportWinView(discord.ui.View):
         self.processing = True
         await self.disable_all_buttons(interaction)
         await interaction.delete_original_response()
-        await process_win_report(interaction, self.lobby_name, self.queue, "CT", self.t_side, self.ct_side)
+        async with lobby_lock(interaction.guild.id, self.lobby_name):
+            await process_win_report(interaction, self.lobby_name, self.queue, "CT", self.t_side, self.ct_side)
         self.stop()
     
     @discord.ui.button(label="Cancel", style=discord.ButtonStyle.grey)
+    @profiled
     async def cancel(self, interaction: discord.Interaction, button):
         if interaction.user != self.queue.host and not interaction.user.guild_permissions.administrator:
             return await interaction.response.send_message("Only host or admin!", ephemeral=True)
@@ -1394,29 +1788,13 @@ class ReportWinView(discord.ui.View):
 # ==================== ALL SLASH COMMANDS ====================
 
 @app_commands.command(name="view", description="View all active lobbies")
+@profiled
 async def view(interaction: discord.Interaction):
     await interaction.response.send_message(embed=lobby_list_embed(get_lobbies(interaction.guild.id)))
 
-    @discord.ui.button(label="Start Match", style=discord.ButtonStyle.success)
-    async def start(self, interaction: discord.Interaction, button):
-        queue = get_lobbies(interaction.guild.id).get(self.lobby_name)
-        if not queue:
-            return await interaction.response.send_message("Lobby gone!", ephemeral=True)
-        
-        # Check if enough players
-        if len(queue.players) < 10:
-            return await interaction.response.send_message("❌ Need 10 players to start match!", ephemeral=True)
-        
-        # Check permissions - Only host or admin
-        if interaction.user != queue.host and not interaction.user.guild_permissions.administrator:
-            return await interaction.response.send_message("❌ Only host or admin can start match!", ephemeral=True)
-
-        queue.match_started = True
-        await interaction.response.defer()
-        await start_match(interaction, self.lobby_name, queue)
-
 @app_commands.command(name="startlobby", description="Create a lobby (Host role only)")
 @app_commands.describe(name="Lobby name")
+@profiled
 async def startlobby(interaction: discord.Interaction, name: str):
     # BLACKLIST CHECK
     if is_blacklisted(interaction.user.id):
@@ -1434,27 +1812,28 @@ async def startlobby(interaction: discord.Interaction, name: str):
     if name in guild_lobbies:
         return await interaction.response.send_message(f"Lobby '{name}' already exists", ephemeral=True)
 
-    queue = QueueData()
-    queue.is_open = True
-    queue.host = interaction.user
-    guild_lobbies[name] = queue
+    cache_member(interaction.user)
+    if not store.create_lobby(interaction.guild.id, name, interaction.user.id):
+        return await interaction.response.send_message(f"Lobby '{name}' already exists", ephemeral=True)
+    queue = get_lobbies(interaction.guild.id)[name]
 
     players_role = get(interaction.guild.roles, name="[ Players ]")
     ping_text = f"{players_role.mention} " if players_role else ""
 
     view_obj = LobbyView(name, queue)
-    sent_message = await interaction.response.send_message(
+    await interaction.response.send_message(
         f"{ping_text}Lobby {name} created by {interaction.user.mention}\nJoin with /join {name} or use buttons below",
         embed=queue_embed(name, queue),
         view=view_obj
     )
     
-    queue.channel_id = interaction.channel.id
-    queue.message_id = sent_message.id
+    sent_message = await interaction.original_response()
+    update_lobby(interaction.guild.id, name, channel_id=interaction.channel.id, message_id=sent_message.id)
     store_lobby_message(interaction.guild.id, name, interaction.channel.id, sent_message.id)
 
 @app_commands.command(name="join", description="Join a lobby")
 @app_commands.describe(name="Lobby name", as_party="Join with your whole party (leader only)")
+@profiled
 async def join(interaction: discord.Interaction, name: str, as_party: bool = False):
     # BLACKLIST CHECK
     if is_blacklisted(interaction.user.id):
@@ -1517,11 +1896,16 @@ async def join(interaction: discord.Interaction, name: str, as_party: bool = Fal
             error_msg = "\n".join(errors)
             return await interaction.response.send_message(f"Cannot queue party:\n{error_msg}", ephemeral=True)
         
-        for member in party.members:
-            if member not in queue.players:
-                queue.players.append(member)
-        
-        party.lobby_name = name
+        ok, reason = join_lobby(interaction.guild.id, name, party.members)
+        if ok:
+            set_party_lobby(interaction.guild.id, party, name)
+        if not ok:
+            errors = {
+                "closed": f"No open lobby '{name}'",
+                "already_in": "A party member is already in this lobby",
+                "full": "Not enough space for the whole party"
+            }
+            return await interaction.response.send_message(f"Cannot queue party:\n{errors[reason]}", ephemeral=True)
         
         await interaction.response.send_message(
             f"✅ Party of {len(party.members)} players queued for **{name}**!\n"
@@ -1530,101 +1914,16 @@ async def join(interaction: discord.Interaction, name: str, as_party: bool = Fal
             view=LobbyView(name, queue)
         )
     else:
-        if interaction.user in queue.players:
-            return await interaction.response.send_message("Already in lobby", ephemeral=True)
-        if len(queue.players) >= 10:
-            return await interaction.response.send_message("Lobby full", ephemeral=True)
+        ok, reason = join_lobby(interaction.guild.id, name, [interaction.user])
+        if not ok:
+            errors = {"closed": f"No open lobby '{name}'", "already_in": "Already in lobby", "full": "Lobby full"}
+            return await interaction.response.send_message(errors[reason], ephemeral=True)
         
-        queue.players.append(interaction.user)
-        await interaction.response.send_message(f"Joined {name}", embed=queue_embed(name, queue), view=LobbyView(name, queue))
-
-@app_commands.command(name="join", description="Join a lobby")
-@app_commands.describe(name="Lobby name", as_party="Join with your whole party (leader only)")
-async def join(interaction: discord.Interaction, name: str, as_party: bool = False):
-    # BLACKLIST CHECK
-    if is_blacklisted(interaction.user.id):
-        info = get_blacklist_info(interaction.user.id)
-        reason = info.get("reason", "No reason provided") if info else "No reason provided"
-        
-        embed = discord.Embed(
-            title="🚫 YOU ARE BLACKLISTED",
-            description="You cannot join lobbies while blacklisted",
-            color=discord.Color.red()
-        )
-        embed.add_field(name="Reason", value=reason)
-        
-        expires_at = info.get("expires_at") if info else None
-        if expires_at == "permanent":
-            embed.add_field(name="Duration", value="PERMANENT")
-        elif expires_at:
-            try:
-                expire_time = datetime.fromisoformat(expires_at)
-                time_left = expire_time - datetime.now()
-                if time_left.total_seconds() > 0:
-                    hours_left = int(time_left.total_seconds() / 3600)
-                    minutes_left = int((time_left.total_seconds() % 3600) / 60)
-                    embed.add_field(name="Time Left", value=f"{hours_left}h {minutes_left}m")
-            except:
-                pass
-        
-        embed.set_footer(text="Contact admins for appeal")
-        return await interaction.response.send_message(embed=embed, ephemeral=True)
-    
-    queue = get_lobbies(interaction.guild.id).get(name)
-    if not queue or not queue.is_open:
-        return await interaction.response.send_message(f"No open lobby '{name}'", ephemeral=True)
-    
-    if as_party:
-        leader_id, party = get_user_party(interaction.guild.id, interaction.user.id)
-        
-        if not party:
-            return await interaction.response.send_message("You're not in a party!", ephemeral=True)
-        
-        if interaction.user.id != leader_id:
-            return await interaction.response.send_message("Only the party leader can queue the whole party!", ephemeral=True)
-        
-        if party.lobby_name:
-            return await interaction.response.send_message(f"Party is already queued for {party.lobby_name}. Leave that queue first.", ephemeral=True)
-        
-        can_join_all = True
-        errors = []
-        
-        for member in party.members:
-            if member in queue.players:
-                errors.append(f"{member.mention} is already in this lobby")
-                can_join_all = False
-            elif len(queue.players) + len(party.members) > 10:
-                errors.append("Not enough space for the whole party")
-                can_join_all = False
-                break
-        
-        if not can_join_all:
-            error_msg = "\n".join(errors)
-            return await interaction.response.send_message(f"Cannot queue party:\n{error_msg}", ephemeral=True)
-        
-        for member in party.members:
-            if member not in queue.players:
-                queue.players.append(member)
-        
-        party.lobby_name = name
-        
-        await interaction.response.send_message(
-            f"✅ Party of {len(party.members)} players queued for **{name}**!\n"
-            f"All party members have been added to the lobby.",
-            embed=queue_embed(name, queue),
-            view=LobbyView(name, queue)
-        )
-    else:
-        if interaction.user in queue.players:
-            return await interaction.response.send_message("Already in lobby", ephemeral=True)
-        if len(queue.players) >= 10:
-            return await interaction.response.send_message("Lobby full", ephemeral=True)
-        
-        queue.players.append(interaction.user)
         await interaction.response.send_message(f"Joined {name}", embed=queue_embed(name, queue), view=LobbyView(name, queue))
 
 @app_commands.command(name="leave", description="Leave a lobby")
 @app_commands.describe(name="Lobby name", party_leave="Leave with your whole party (leader only)")
+@profiled
 async def leave(interaction: discord.Interaction, name: str, party_leave: bool = False):
     queue = get_lobbies(interaction.guild.id).get(name)
     if not queue or interaction.user not in queue.players:
@@ -1642,13 +1941,8 @@ async def leave(interaction: discord.Interaction, name: str, party_leave: bool =
         if party.lobby_name != name:
             return await interaction.response.send_message(f"Your party is not queued for {name}!", ephemeral=True)
         
-        removed_count = 0
-        for member in party.members:
-            if member in queue.players:
-                queue.players.remove(member)
-                removed_count += 1
-        
-        party.lobby_name = None
+        removed_count = leave_lobby(interaction.guild.id, name, party.members)
+        set_party_lobby(interaction.guild.id, party, None)
         
         await interaction.response.send_message(
             f"✅ Party of {removed_count} players left **{name}**!\n"
@@ -1657,20 +1951,19 @@ async def leave(interaction: discord.Interaction, name: str, party_leave: bool =
             view=LobbyView(name, queue)
         )
     else:
-        queue.players.remove(interaction.user)
-        if queue.host == interaction.user:
-            queue.host = None
+        leave_lobby(interaction.guild.id, name, [interaction.user])
         
         leader_id, party = get_user_party(interaction.guild.id, interaction.user.id)
         if party and party.lobby_name == name:
             party_still_in_queue = any(m in queue.players for m in party.members if m != interaction.user)
             if not party_still_in_queue:
-                party.lobby_name = None
+                set_party_lobby(interaction.guild.id, party, None)
         
         await interaction.response.send_message(f"Left {name}", embed=queue_embed(name, queue), view=LobbyView(name, queue))
 
 @app_commands.command(name="removelobby", description="Delete a lobby (Admin only after match starts)")
 @app_commands.describe(name="Lobby name")
+@profiled
 async def removelobby(interaction: discord.Interaction, name: str):
     host_role = get(interaction.guild.roles, name="Host")
     queue = get_lobbies(interaction.guild.id).get(name)
@@ -1690,6 +1983,10 @@ async def removelobby(interaction: discord.Interaction, name: str):
         if host_role not in interaction.user.roles and not interaction.user.guild_permissions.administrator:
             return await interaction.response.send_message("Host role or Admin required", ephemeral=True)
     
+    # Removing waits for a start or report still running on this lobby, which
+    # can outlast the interaction's response window
+    await interaction.response.defer()
+    
     # Try to delete the lobby message if it exists
     try:
         if queue.channel_id and queue.message_id:
@@ -1712,22 +2009,22 @@ async def removelobby(interaction: discord.Interaction, name: str):
     except:
         pass
 
-    # Clear party lobby tracking for this lobby
-    for player in queue.players:
-        leader_id, party = get_user_party(interaction.guild.id, player.id)
-        if party and party.lobby_name == name:
-            party.lobby_name = None
-
-    # Remove lobby from data
-    del get_lobbies(interaction.guild.id)[name]
+    # Remove lobby from data, this also clears party lobby tracking for it
+    async with lobby_lock(interaction.guild.id, name):
+        record = store.delete_lobby(interaction.guild.id, name)
+    get_lobbies(interaction.guild.id)
+    get_parties(interaction.guild.id)
+    if record and record["match_started"]:
+        set_busy(interaction.guild.id, "playing", record["players"], False)
     
     if queue.match_started:
-        await interaction.response.send_message(f"✅ Admin removed started lobby: {name}")
+        await interaction.followup.send(f"✅ Admin removed started lobby: {name}")
     else:
-        await interaction.response.send_message(f"Lobby {name} removed")
+        await interaction.followup.send(f"Lobby {name} removed")
 
 @app_commands.command(name="reportwin", description="Report match winner (Admin only)")
 @app_commands.describe(name="Lobby name", winner="T or CT")
+@profiled
 async def reportwin(interaction: discord.Interaction, name: str, winner: str):
     winner = winner.upper()
     if winner not in ["T", "CT"]:
@@ -1755,8 +2052,7 @@ async def reportwin(interaction: discord.Interaction, name: str, winner: str):
         random.shuffle(queue.players)
         t_side = queue.players[:5]
         ct_side = queue.players[5:]
-        queue.t_side = t_side
-        queue.ct_side = ct_side
+        update_lobby(interaction.guild.id, name, t_side=member_ids(t_side), ct_side=member_ids(ct_side))
     
     # Create confirmation embed
     embed = discord.Embed(
@@ -1777,6 +2073,7 @@ async def reportwin(interaction: discord.Interaction, name: str, winner: str):
 
 @app_commands.command(name="addelo", description="Add ELO to a player (Admin only)")
 @app_commands.describe(player="Player to add ELO to", amount="Amount of ELO to add")
+@profiled
 async def addelo(interaction: discord.Interaction, player: discord.Member, amount: int):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("Admin only", ephemeral=True)
@@ -1785,11 +2082,11 @@ async def addelo(interaction: discord.Interaction, player: discord.Member, amoun
         return await interaction.response.send_message("Amount must be positive", ephemeral=True)
     
     try:
-        stats = get_player_stats(player.id)
+        stats = get_player_stats(interaction.guild.id, player.id)
         old_elo = stats.elo
         
-        update_elo_with_protection(player.id, amount)
-        new_stats = get_player_stats(player.id)
+        update_elo_with_protection(interaction.guild.id, player.id, amount)
+        new_stats = get_player_stats(interaction.guild.id, player.id)
         new_elo = new_stats.elo
         
         await update_player_rank(interaction.guild, player, new_elo, old_elo)
@@ -1804,6 +2101,7 @@ async def addelo(interaction: discord.Interaction, player: discord.Member, amoun
 
 @app_commands.command(name="removeelo", description="Remove ELO from a player (Admin only)")
 @app_commands.describe(player="Player to remove ELO from", amount="Amount of ELO to remove")
+@profiled
 async def removeelo(interaction: discord.Interaction, player: discord.Member, amount: int):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("Admin only", ephemeral=True)
@@ -1812,11 +2110,11 @@ async def removeelo(interaction: discord.Interaction, player: discord.Member, am
         return await interaction.response.send_message("Amount must be positive", ephemeral=True)
     
     try:
-        stats = get_player_stats(player.id)
+        stats = get_player_stats(interaction.guild.id, player.id)
         old_elo = stats.elo
         
-        update_elo_with_protection(player.id, -amount)
-        new_stats = get_player_stats(player.id)
+        update_elo_with_protection(interaction.guild.id, player.id, -amount)
+        new_stats = get_player_stats(interaction.guild.id, player.id)
         new_elo = new_stats.elo
         
         await update_player_rank(interaction.guild, player, new_elo, old_elo)
@@ -1829,18 +2127,9 @@ async def removeelo(interaction: discord.Interaction, player: discord.Member, am
         print(f"Error in removeelo: {e}")
         await interaction.response.send_message(f"❌ Error: {str(e)}", ephemeral=True)
 
-def load_match_history():
-    if os.path.exists(MATCH_HISTORY_FILE):
-        with open(MATCH_HISTORY_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_match_history(history):
-    with open(MATCH_HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=4)
-
 @app_commands.command(name="correctwin", description="Correct a wrongly reported match (Admin only)")
 @app_commands.describe(lobby_name="Original lobby name", correct_winner="Correct winner: T or CT")
+@profiled
 async def correctwin(interaction: discord.Interaction, lobby_name: str, correct_winner: str):
     correct_winner = correct_winner.upper()
     
@@ -1850,56 +2139,53 @@ async def correctwin(interaction: discord.Interaction, lobby_name: str, correct_
     if correct_winner not in ["T", "CT"]:
         return await interaction.response.send_message("Winner must be T or CT", ephemeral=True)
     
-    match_history = load_match_history()
-    match_key = None
-    for key, match in match_history.items():
-        if match.get("lobby_name") == lobby_name:
-            match_key = key
-            break
-    
-    if not match_key:
+    match_id, match_data = store.find_match(interaction.guild.id, lobby_name)
+    if not match_id:
         return await interaction.response.send_message(f"No match history found for '{lobby_name}'", ephemeral=True)
     
-    match_data = match_history[match_key]
     if match_data.get("winner") == correct_winner:
         return await interaction.response.send_message(f"Match already reported as {correct_winner}-SIDE win", ephemeral=True)
     
+    # Claiming the correction first means a double-submitted /correctwin can't apply it twice
+    if not store.mark_match_corrected(match_id):
+        return await interaction.response.send_message(f"Match in '{lobby_name}' is already being corrected", ephemeral=True)
+    
     changes = []
     
     for player_id in match_data.get("winning_side", []):
-        player = interaction.guild.get_member(int(player_id))
+        player = await resolve_member(interaction.guild, int(player_id))
         if player:
             wrong_gain = match_data.get("elo_gain", 32)
-            old_elo = update_elo_with_protection(player.id, -wrong_gain)
+            old_elo, _ = update_elo_with_protection(interaction.guild.id, player.id, -wrong_gain)
             changes.append(f"{player.mention} -{wrong_gain} (wrong gain removed)")
-            await update_player_rank(interaction.guild, player, get_player_stats(player.id).elo, old_elo)
+            await update_player_rank(interaction.guild, player, get_player_stats(interaction.guild.id, player.id).elo, old_elo)
     
     for player_id in match_data.get("losing_side", []):
-        player = interaction.guild.get_member(int(player_id))
+        player = await resolve_member(interaction.guild, int(player_id))
         if player:
             wrong_loss = match_data.get("elo_loss", 14)
-            old_elo = update_elo_with_protection(player.id, wrong_loss)
+            old_elo, _ = update_elo_with_protection(interaction.guild.id, player.id, wrong_loss)
             changes.append(f"{player.mention} +{wrong_loss} (wrong loss refunded)")
-            await update_player_rank(interaction.guild, player, get_player_stats(player.id).elo, old_elo)
+            await update_player_rank(interaction.guild, player, get_player_stats(interaction.guild.id, player.id).elo, old_elo)
     
     new_winning_side = match_data["losing_side"]
     new_losing_side = match_data["winning_side"]
     
     for player_id in new_winning_side:
-        player = interaction.guild.get_member(int(player_id))
+        player = await resolve_member(interaction.guild, int(player_id))
         if player:
             gain = match_data.get("elo_gain", 32)
-            old_elo = update_elo_with_protection(player.id, gain)
+            old_elo, _ = update_elo_with_protection(interaction.guild.id, player.id, gain)
             changes.append(f"{player.mention} +{gain} (correct win)")
-            await update_player_rank(interaction.guild, player, get_player_stats(player.id).elo, old_elo)
+            await update_player_rank(interaction.guild, player, get_player_stats(interaction.guild.id, player.id).elo, old_elo)
     
     for player_id in new_losing_side:
-        player = interaction.guild.get_member(int(player_id))
+        player = await resolve_member(interaction.guild, int(player_id))
         if player:
             loss = match_data.get("elo_loss", 14)
-            old_elo = update_elo_with_protection(player.id, -loss)
+            old_elo, _ = update_elo_with_protection(interaction.guild.id, player.id, -loss)
             changes.append(f"{player.mention} -{loss} (correct loss)")
-            await update_player_rank(interaction.guild, player, get_player_stats(player.id).elo, old_elo)
+            await update_player_rank(interaction.guild, player, get_player_stats(interaction.guild.id, player.id).elo, old_elo)
     
     embed = discord.Embed(
         title=f"Match Correction: {lobby_name.upper()}",
@@ -1913,23 +2199,51 @@ async def correctwin(interaction: discord.Interaction, lobby_name: str, correct_
     embed.add_field(name="ELO Adjustments", value="\n".join(changes), inline=False)
     embed.set_footer(text="Match result corrected by admin")
     
-    del match_history[match_key]
-    save_match_history(match_history)
     await interaction.response.send_message(embed=embed)
 
+def archived_season(guild_id, season):
+    """None for the current season, "" for one that has ended, else why it's neither"""
+    current, archived = store.seasons(guild_id)
+    if season == current:
+        return None
+    if not any(summary["season"] == season for summary in archived):
+        return f"Season {season} hasn't ended yet" if season > current else f"There's no season {season}"
+    return ""
+
 @app_commands.command(name="profile", description="View your or another's profile")
-@app_commands.describe(player="Player (default: you)")
-async def profile(interaction: discord.Interaction, player: discord.Member = None):
+@app_commands.describe(player="Player (default: you)", season="An ended season to look back at (default: this one)")
+@profiled
+async def profile(interaction: discord.Interaction, player: discord.Member = None, season: int = None):
     target = player or interaction.user
-    await interaction.response.send_message(embed=profile_embed(target))
-
-@app_commands.command(name="leaderboard", description="Top 10 players by ELO")
-async def leaderboard(interaction: discord.Interaction):
-    sorted_players = sorted(players_data.items(), key=lambda x: x[1].elo, reverse=True)[:10]
+    error = archived_season(interaction.guild.id, season) if season is not None else None
+    if error:
+        return await interaction.response.send_message(error, ephemeral=True)
+    if error is None:
+        return await interaction.response.send_message(embed=get_profile_card(target))
+    stats = store.season_player(interaction.guild.id, season, target.id)
+    if stats is None:
+        return await interaction.response.send_message(f"{target.display_name} didn't play in season {season}", ephemeral=True)
+    await interaction.response.send_message(embed=profile_embed(target, stats, season))
+
+@app_commands.command(name="leaderboard", description="Top 10 players in this server by ELO")
+@app_commands.describe(season="An ended season's final standings (default: this one)")
+@profiled
+async def leaderboard(interaction: discord.Interaction, season: int = None):
+    error = archived_season(interaction.guild.id, season) if season is not None else None
+    if error:
+        return await interaction.response.send_message(error, ephemeral=True)
+    if LEAN_MODE:
+        # Members may have to be fetched, which can outlast the 3s response window
+        await interaction.response.defer()
     embed = discord.Embed(title="LEADERBOARD", color=ORANGE_COLOR)
-    embed.description = "Top players by ELO"
+    if error is None:
+        sorted_players = store.top_players(interaction.guild.id, 10)
+        embed.description = "Top players by ELO"
+    else:
+        sorted_players = store.season_top(interaction.guild.id, season, 10)
+        embed.description = f"Final standings of season {season}"
     for i, (uid, stats) in enumerate(sorted_players, 1):
-        member = interaction.guild.get_member(int(uid))
+        member = await resolve_member(interaction.guild, uid)
         name = member.display_name.upper() if member else "UNKNOWN"
         rank = get_rank_role_name(stats.elo)
         total = stats.wins + stats.losses
@@ -1939,9 +2253,342 @@ async def leaderboard(interaction: discord.Interaction):
             value=f"ELO: {stats.elo} | WR: {winrate:.1f}% | Rank: {rank}",
             inline=False
         )
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed)
+    else:
+        await interaction.response.send_message(embed=embed)
+
+def format_record(played, wins):
+    return f"{wins}-{played - wins} ({wins / played * 100:.0f}%)" if played else "no matches"
+
+@app_commands.command(name="mapstats", description="Map winrates and T/CT side balance")
+@app_commands.describe(player="Show this player's record per map and side instead of the server's")
+@profiled
+async def mapstats(interaction: discord.Interaction, player: discord.Member = None):
+    if player is None:
+        stats = store.map_stats(interaction.guild.id)
+        if not stats:
+            return await interaction.response.send_message("No matches recorded yet", ephemeral=True)
+        total = sum(n for n, _, _ in stats.values())
+        t_wins = sum(t for _, t, _ in stats.values())
+        embed = discord.Embed(
+            title="🗺️ MAP STATS",
+            description=f"{total} matches · T side wins {t_wins / total * 100:.1f}% · CT side wins {(total - t_wins) / total * 100:.1f}%",
+            color=ORANGE_COLOR
+        )
+        lines = [f"{'MAP':<9} {'PLAYED':>6} {'T WIN':>6} {'CT WIN':>6}"]
+        for map_name, (n, t, ct) in list(stats.items())[:15]:
+            lines.append(f"{map_name[:9]:<9} {n:>6} {t / n * 100:>5.0f}% {ct / n * 100:>5.0f}%")
+        embed.add_field(name="Per map", value="```\n" + "\n".join(lines) + "\n```", inline=False)
+        return await interaction.response.send_message(embed=embed)
+    
+    by_map, by_side = store.player_match_stats(interaction.guild.id, player.id)
+    if not by_map:
+        return await interaction.response.send_message(f"No matches recorded for {player.display_name}", ephemeral=True)
+    embed = discord.Embed(title=f"🗺️ {player.display_name.upper()}'S MAP STATS", color=ORANGE_COLOR)
+    embed.add_field(name="T SIDE", value=format_record(*by_side["T"]), inline=True)
+    embed.add_field(name="CT SIDE", value=format_record(*by_side["CT"]), inline=True)
+    lines = [f"{map_name[:9]:<9} {format_record(played, wins)}" for map_name, (played, wins) in list(by_map.items())[:15]]
+    embed.add_field(name="Per map (W-L)", value="```\n" + "\n".join(lines) + "\n```", inline=False)
+    await interaction.response.send_message(embed=embed)
+
+@app_commands.command(name="headtohead", description="Record against and alongside another player")
+@app_commands.describe(opponent="Player to compare with", player="Player to show the record for (default: you)")
+@profiled
+async def headtohead(interaction: discord.Interaction, opponent: discord.Member, player: discord.Member = None):
+    target = player or interaction.user
+    if target.id == opponent.id:
+        return await interaction.response.send_message("Pick two different players", ephemeral=True)
+    
+    record = store.head_to_head(interaction.guild.id, target.id, opponent.id)
+    embed = discord.Embed(
+        title=f"⚔️ {target.display_name.upper()} vs {opponent.display_name.upper()}",
+        color=ORANGE_COLOR
+    )
+    embed.add_field(name="AGAINST", value=format_record(*record["against"]), inline=True)
+    embed.add_field(name="TOGETHER", value=format_record(*record["together"]), inline=True)
+    embed.set_footer(text=f"Wins and losses are {target.display_name}'s")
+    await interaction.response.send_message(embed=embed)
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values, width=30):
+    """Values squeezed into at most `width` block characters, one per equal slice"""
+    if len(values) > width:
+        values = [values[(i + 1) * len(values) // width - 1] for i in range(width)]
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return "".join(SPARK_CHARS[(v - low) * (len(SPARK_CHARS) - 1) // span] for v in values)
+
+@app_commands.command(name="elohistory", description="A player's ELO over time")
+@app_commands.describe(player="Player to show (default: you)", days="How far back to look (default: 30, 0 for all time)")
+@profiled
+async def elohistory(interaction: discord.Interaction, player: discord.Member = None, days: int = 30):
+    target = player or interaction.user
+    since = time.time() - days * 86400 if days > 0 else None
+    points = store.elo_history_range(interaction.guild.id, target.id, since)
+    if not points:
+        return await interaction.response.send_message(f"No rating changes recorded for {target.display_name}", ephemeral=True)
+    
+    closes = [close for _, _, _, close in points]
+    first = datetime.fromtimestamp(points[0][0])
+    embed = discord.Embed(
+        title=f"📈 {target.display_name.upper()}'S ELO",
+        description=f"```\n{sparkline(closes)}\n```",
+        color=ORANGE_COLOR
+    )
+    embed.add_field(name="NOW", value=str(closes[-1]), inline=True)
+    embed.add_field(name="CHANGE", value=f"{closes[-1] - closes[0]:+d}", inline=True)
+    embed.add_field(name="PEAK", value=str(max(high for _, _, high, _ in points)), inline=True)
+    embed.add_field(name="LOW", value=str(min(low for _, low, _, _ in points)), inline=True)
+    embed.set_footer(text=f"Since {first.strftime('%Y-%m-%d')} · {len(points)} points, older ones as daily/weekly closes")
+    await interaction.response.send_message(embed=embed)
+
+def match_history_embed(member, entries, page, total):
+    pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+    embed = discord.Embed(title=f"📜 {member.display_name.upper()}'S MATCH HISTORY", color=ORANGE_COLOR)
+    lines = []
+    for entry in entries:
+        change = entry["elo_change"]
+        icon = "✅" if change > 0 else "❌" if change < 0 else "➖"
+        played = datetime.fromisoformat(entry["timestamp"]).strftime("%Y-%m-%d %H:%M")
+        line = f"{icon} **{entry.get('map') or 'Unknown'}** {change:+d} ELO ({entry['new_elo']}) · {played}"
+        if entry.get("corrected"):
+            line += " · *corrected*"
+        lines.append(line)
+    embed.description = "\n".join(lines) or "No matches on this page"
+    embed.set_footer(text=f"Page {page + 1}/{pages} · {total} matches")
+    return embed
+
+class MatchHistoryView(discord.ui.View):
+    """Pages through a player's match log, reading one page from the store per click"""
+    def __init__(self, viewer_id, member, page, total):
+        super().__init__(timeout=120)
+        self.viewer_id = viewer_id
+        self.member = member
+        self.page = page
+        self.total = total
+        self.update_buttons()
+    
+    def update_buttons(self):
+        self.previous.disabled = self.page == 0
+        self.next.disabled = (self.page + 1) * HISTORY_PAGE_SIZE >= self.total
+    
+    async def show(self, interaction, page):
+        if interaction.user.id != self.viewer_id:
+            return await interaction.response.send_message("Run /history to page through it yourself", ephemeral=True)
+        entries, self.total = store.match_history_page(self.member.guild.id, self.member.id, page, HISTORY_PAGE_SIZE)
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(embed=match_history_embed(self.member, entries, page, self.total), view=self)
+    
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.gray)
+    @profiled
+    async def previous(self, interaction: discord.Interaction, button):
+        await self.show(interaction, self.page - 1)
+    
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.gray)
+    @profiled
+    async def next(self, interaction: discord.Interaction, button):
+        await self.show(interaction, self.page + 1)
+    
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+
+@app_commands.command(name="history", description="A player's full match history")
+@app_commands.describe(player="Player to show (default: you)", page="Page to open, 1 is the newest matches")
+@profiled
+async def history(interaction: discord.Interaction, player: discord.Member = None, page: int = 1):
+    target = player or interaction.user
+    page = max(page, 1) - 1
+    entries, total = store.match_history_page(interaction.guild.id, target.id, page, HISTORY_PAGE_SIZE)
+    if not total:
+        return await interaction.response.send_message(f"No matches recorded for {target.display_name}", ephemeral=True)
+    if not entries:
+        page = (total - 1) // HISTORY_PAGE_SIZE
+        entries, total = store.match_history_page(interaction.guild.id, target.id, page, HISTORY_PAGE_SIZE)
+    
+    view = MatchHistoryView(interaction.user.id, target, page, total)
+    await interaction.response.send_message(embed=match_history_embed(target, entries, page, total), view=view)
+
+@app_commands.command(name="seasons", description="This server's current and past seasons")
+@profiled
+async def seasons_command(interaction: discord.Interaction):
+    current, archived = store.seasons(interaction.guild.id)
+    embed = discord.Embed(title="🗓️ SEASONS", color=ORANGE_COLOR)
+    embed.description = f"Season **{current}** is in progress"
+    # An embed holds at most 25 fields
+    for summary in archived[::-1][:24]:
+        started = summary["started_at"][:10] if summary["started_at"] else "the start"
+        embed.add_field(
+            name=f"Season {summary['season']}",
+            value=f"{started} → {summary['ended_at'][:10]} · {summary['players']} players · {summary['matches']} matches",
+            inline=False
+        )
+    if archived:
+        embed.set_footer(text="Look back with /profile season:<n> or /leaderboard season:<n>")
     await interaction.response.send_message(embed=embed)
 
+# Running rank role moves, referenced so they aren't garbage collected mid-run
+season_role_tasks = set()
+
+async def move_season_roles(guild, season, moves, message, embed):
+    """Move rank roles for [(user_id, old_elo, new_elo)] after a season reset,
+    SEASON_ROLE_CONCURRENCY players at a time, keeping the summary's count current"""
+    pending = iter(moves)
+    done = moved = 0
+    
+    async def worker():
+        nonlocal done, moved
+        for user_id, old_elo, new_elo in pending:
+            member = await resolve_member(guild, user_id)
+            if member:
+                try:
+                    await update_player_rank(guild, member, new_elo, old_elo, announce=False)
+                    moved += 1
+                except discord.HTTPException as e:
+                    print(f"Error updating rank for {user_id} after season {season}: {e}")
+            done += 1
+    
+    async def show(value):
+        embed.set_field_at(2, name="RANKS UPDATED", value=value, inline=True)
+        try:
+            await message.edit(embed=embed)
+        except discord.HTTPException:
+            pass
+    
+    workers = asyncio.gather(*(worker() for _ in range(SEASON_ROLE_CONCURRENCY)))
+    while not workers.done():
+        await asyncio.wait([workers], timeout=SEASON_PROGRESS_INTERVAL)
+        if not workers.done():
+            await show(f"{done}/{len(moves)} ⏳")
+    await show(str(moved))
+    print(f"🏁 Season {season} in {guild.name}: moved rank roles for {moved} of {len(moves)} players")
+
+async def end_season(interaction: discord.Interaction, carryover: int):
+    """Archive the season, announce it, then move rank roles in the background"""
+    guild = interaction.guild
+    # The archive is compressed and written off the event loop
+    season, changes = await asyncio.to_thread(store.end_season, guild.id, carryover / 100)
+    if season is None:
+        return await interaction.edit_original_response(content="❌ This season is already being ended", view=None)
+    invalidate_guild_profiles(guild.id)
+    moves = [change for change in changes if tier_index(change[1]) != tier_index(change[2])]
+    
+    embed = discord.Embed(title=f"🏁 SEASON {season} HAS ENDED", color=ORANGE_COLOR)
+    embed.description = f"Season **{season + 1}** starts now. Good luck!"
+    embed.add_field(name="PLAYERS", value=str(len(changes)), inline=True)
+    embed.add_field(name="ELO KEPT", value=f"{carryover}%", inline=True)
+    embed.add_field(name="RANKS UPDATED", value=f"0/{len(moves)} ⏳" if moves else "0", inline=True)
+    embed.set_footer(text=f"Final standings: /leaderboard season:{season}")
+    # A big guild's roles take longer to move than the interaction's token
+    # lasts, so the summary goes to the channel and is updated from there
+    message = await interaction.channel.send(embed=embed)
+    await interaction.edit_original_response(content=f"✅ Season {season} archived", view=None)
+    if moves:
+        task = asyncio.create_task(move_season_roles(guild, season, moves, message, embed))
+        season_role_tasks.add(task)
+        task.add_done_callback(season_role_tasks.discard)
+
+class EndSeasonView(discord.ui.View):
+    def __init__(self, admin_id, carryover):
+        super().__init__(timeout=60)
+        self.admin_id = admin_id
+        self.carryover = carryover
+        self.processing = False
+    
+    @discord.ui.button(label="End Season", style=discord.ButtonStyle.danger)
+    @profiled
+    async def confirm(self, interaction: discord.Interaction, button):
+        if interaction.user.id != self.admin_id:
+            return await interaction.response.send_message("Only the admin who ran /endseason can confirm", ephemeral=True)
+        if self.processing:
+            return await interaction.response.send_message("Already ending the season!", ephemeral=True)
+        
+        self.processing = True
+        for child in self.children:
+            child.disabled = True
+        await interaction.response.edit_message(content="⏳ Archiving the season...", view=self)
+        await end_season(interaction, self.carryover)
+        self.stop()
+    
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.grey)
+    @profiled
+    async def cancel(self, interaction: discord.Interaction, button):
+        if interaction.user.id != self.admin_id:
+            return await interaction.response.send_message("Only the admin who ran /endseason can cancel", ephemeral=True)
+        await interaction.response.edit_message(content="Season end cancelled.", view=None)
+        self.stop()
+    
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+
+@app_commands.command(name="endseason", description="Archive this season's stats and start a new one (Admin only)")
+@app_commands.describe(carryover=f"Percent of each player's ELO kept (default {SEASON_CARRYOVER}, 0 resets everyone)")
+@profiled
+async def endseason(interaction: discord.Interaction, carryover: int = SEASON_CARRYOVER):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("Admin only", ephemeral=True)
+    if not 0 <= carryover <= 100:
+        return await interaction.response.send_message("Carryover must be between 0 and 100", ephemeral=True)
+    
+    current, _ = store.seasons(interaction.guild.id)
+    await interaction.response.send_message(
+        f"⚠️ End season **{current}**? Every player's stats and this season's matches are archived, "
+        f"and everyone starts season {current + 1} with {carryover}% of their ELO.",
+        view=EndSeasonView(interaction.user.id, carryover)
+    )
+
+@app_commands.command(name="export", description="Download this server's players or matches, or the blacklist (Admin only)")
+@app_commands.describe(
+    data="What to export",
+    file_format="CSV for spreadsheets (default), JSONL for scripts",
+    since="First day to include, YYYY-MM-DD (players: last played)",
+    until="Last day to include, YYYY-MM-DD",
+    season="An ended season's players or matches (default: this one)"
+)
+@app_commands.choices(
+    data=[app_commands.Choice(name=kind, value=kind) for kind in export.COLUMNS],
+    file_format=[app_commands.Choice(name=fmt, value=fmt) for fmt in export.FORMATS]
+)
+@profiled
+async def export_command(interaction: discord.Interaction, data: app_commands.Choice[str],
+                         file_format: Optional[app_commands.Choice[str]] = None,
+                         since: str = None, until: str = None, season: int = None):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("Admin only", ephemeral=True)
+    try:
+        since_at, until_at = export.parse_day(since), export.parse_day(until, end=True)
+    except ValueError:
+        return await interaction.response.send_message("Dates are YYYY-MM-DD", ephemeral=True)
+    error = archived_season(interaction.guild.id, season) if season is not None else None
+    if error:
+        return await interaction.response.send_message(error, ephemeral=True)
+    
+    fmt = file_format.value if file_format else "csv"
+    await interaction.response.defer(ephemeral=True)
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}.gz")
+    os.close(fd)
+    try:
+        # A big export is written from a thread so it doesn't hold up the event loop
+        count = await asyncio.to_thread(export.export, store, data.value, path, fmt,
+                                        interaction.guild.id, season, since_at, until_at)
+        size = os.path.getsize(path)
+        if size > interaction.guild.filesize_limit:
+            return await interaction.followup.send(
+                f"❌ The export is {memory.format_bytes(size)}, over this server's upload limit. "
+                f"Run `python export.py {data.value} --guild {interaction.guild.id}` on the bot's host instead",
+                ephemeral=True
+            )
+        name = f"{data.value}-{interaction.guild.id}{f'-season-{season}' if season else ''}.{fmt}.gz"
+        await interaction.followup.send(f"📦 {count} rows", file=discord.File(path, filename=name), ephemeral=True)
+    finally:
+        os.remove(path)
+
 @app_commands.command(name="end", description="Delete match channels (Admin only)")
+@profiled
 async def end_match(interaction: discord.Interaction):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("Admin only", ephemeral=True)
@@ -1955,6 +2602,7 @@ async def end_match(interaction: discord.Interaction):
     await interaction.channel.category.delete()
 
 @app_commands.command(name="party", description="Create or manage your party")
+@profiled
 async def party_command(interaction: discord.Interaction):
     leader_id, existing_party = get_user_party(interaction.guild.id, interaction.user.id)
     
@@ -1964,7 +2612,7 @@ async def party_command(interaction: discord.Interaction):
         await interaction.response.send_message(
             "**🎉 YOUR PARTY**\n"
             "**Commands:**\n"
-            "• **Invite Players** - Invite online players\n"
+            f"• **Invite Players** - Invite {LISTED_PLAYERS}\n"
             "• **Queue for Lobby** - Join a lobby as a party\n"
             "• **Refresh** - Update party status\n"
             "• **Party Info** - View party details\n"
@@ -1994,31 +2642,14 @@ async def party_command(interaction: discord.Interaction):
 
 @app_commands.command(name="partyjoin", description="Join a party using code")
 @app_commands.describe(party_code="4-digit party code")
+@profiled
 async def partyjoin(interaction: discord.Interaction, party_code: str):
-    party_code = party_code.strip()
-    target_party = None
-    target_leader = None
-    
-    for leader_id, party in get_parties(interaction.guild.id).items():
-        if party.party_code == party_code:
-            target_party = party
-            target_leader = leader_id
-            break
-    
-    if not target_party:
-        await interaction.response.send_message("❌ Invalid party code!", ephemeral=True)
-        return
-    
-    existing_leader, existing_party = get_user_party(interaction.guild.id, interaction.user.id)
-    if existing_party:
-        await interaction.response.send_message("❌ You're already in a party!", ephemeral=True)
+    target_party, error = join_party_by_code(interaction.guild.id, interaction.user, party_code.strip())
+    if error:
+        await interaction.response.send_message(error, ephemeral=True)
         return
     
-    if target_party.is_full():
-        await interaction.response.send_message("❌ Party is full! (Max 5 players)", ephemeral=True)
-        return
-    
-    if target_party.add_member(interaction.user):
+    if target_party:
         embed = party_embed(target_party)
         await interaction.response.send_message(f"✅ **Joined party!**\nYou're now in {target_party.leader.mention}'s party.", embed=embed)
         for member in target_party.members:
@@ -2031,6 +2662,7 @@ async def partyjoin(interaction: discord.Interaction, party_code: str):
         await interaction.response.send_message("❌ Failed to join party!", ephemeral=True)
 
 @app_commands.command(name="partyleave", description="Leave your current party")
+@profiled
 async def partyleave(interaction: discord.Interaction):
     success, message = leave_party(interaction.guild.id, interaction.user.id)
     if success:
@@ -2041,6 +2673,7 @@ async def partyleave(interaction: discord.Interaction):
 
 @app_commands.command(name="partyinfo", description="View party information")
 @app_commands.describe(member="Check another player's party")
+@profiled
 async def partyinfo(interaction: discord.Interaction, member: discord.Member = None):
     target = member or interaction.user
     leader_id, party = get_user_party(interaction.guild.id, target.id)
@@ -2060,6 +2693,7 @@ async def partyinfo(interaction: discord.Interaction, member: discord.Member = N
 
 @app_commands.command(name="kickplayer", description="Kick a player from your lobby (Host only)")
 @app_commands.describe(player="Player to kick", lobby_name="Lobby name (optional if you're host)")
+@profiled
 async def kickplayer(interaction: discord.Interaction, player: discord.Member, lobby_name: str = None):
     """Kick a player from a lobby - Host only"""
     
@@ -2105,7 +2739,7 @@ async def kickplayer(interaction: discord.Interaction, player: discord.Member, l
         return await interaction.response.send_message("❌ You can't kick the host!", ephemeral=True)
     
     # Remove player from lobby
-    target_queue.players.remove(player)
+    leave_lobby(interaction.guild.id, target_lobby_name, [player])
     
     # Check if player was in a party
     leader_id, party = get_user_party(interaction.guild.id, player.id)
@@ -2113,7 +2747,7 @@ async def kickplayer(interaction: discord.Interaction, player: discord.Member, l
         # Check if this was the last party member in the lobby
         party_still_in_lobby = any(m in target_queue.players for m in party.members)
         if not party_still_in_lobby:
-            party.lobby_name = None
+            set_party_lobby(interaction.guild.id, party, None)
     
     # Update lobby message
     try:
@@ -2163,6 +2797,7 @@ async def kickplayer(interaction: discord.Interaction, player: discord.Member, l
     reason="Reason for blacklist",
     duration_hours="Duration in hours (0 = permanent, default: 24)"
 )
+@profiled
 async def blacklist(interaction: discord.Interaction, player: discord.Member, reason: str = "No reason provided", duration_hours: int = 24):
     """Blacklist a player from using the queue system"""
     
@@ -2231,9 +2866,9 @@ async def blacklist(interaction: discord.Interaction, player: discord.Member, re
     
     # Remove from any active lobbies
     removed_from = []
-    for lobby_name, queue in get_lobbies(interaction.guild.id).items():
+    for lobby_name, queue in list(get_lobbies(interaction.guild.id).items()):
         if player in queue.players:
-            queue.players.remove(player)
+            leave_lobby(interaction.guild.id, lobby_name, [player])
             removed_from.append(lobby_name)
             
             # Update lobby message
@@ -2278,6 +2913,7 @@ async def blacklist(interaction: discord.Interaction, player: discord.Member, re
 
 @app_commands.command(name="unblacklist", description="Remove player from blacklist (Admin only)")
 @app_commands.describe(player="Player to unblacklist")
+@profiled
 async def unblacklist(interaction: discord.Interaction, player: discord.Member):
     """Remove a player from blacklist"""
     
@@ -2331,6 +2967,7 @@ async def unblacklist(interaction: discord.Interaction, player: discord.Member):
 
 @app_commands.command(name="blacklistinfo", description="Check blacklist status")
 @app_commands.describe(player="Player to check")
+@profiled
 async def blacklistinfo(interaction: discord.Interaction, player: discord.Member = None):
     """Check if a player is blacklisted"""
     
@@ -2395,98 +3032,121 @@ async def blacklistinfo(interaction: discord.Interaction, player: discord.Member
     
     await interaction.response.send_message(embed=embed, ephemeral=(player is None))
 
+def blacklist_status(info):
+    expires_at = info.get("expires_at", "Unknown")
+    if expires_at == "permanent":
+        return "🔴 PERMANENT"
+    try:
+        time_left = datetime.fromisoformat(expires_at) - datetime.now()
+    except (TypeError, ValueError):
+        return "Unknown"
+    if time_left.total_seconds() > 0:
+        return f"⏳ {int(time_left.total_seconds() / 3600)}h"
+    return "EXPIRED"
+
+def blacklist_embed(guild, entries, page, total, filters):
+    """One page of /blacklistall. Only this page's entries are looked up and parsed"""
+    lines = []
+    for i, (user_id, info) in enumerate(entries, page * BLACKLIST_PAGE_SIZE + 1):
+        member = get_cached_member(guild, user_id)
+        username = member.mention if member else f"ID: {user_id}"
+        issued = f" | by {info['admin_name']}" if info.get("admin_name") else ""
+        lines.append(f"**{i}. {username}**\n└ {info.get('reason', 'Unknown')} | {blacklist_status(info)}{issued}")
+    embed = discord.Embed(
+        title="🚫 BLACKLISTED PLAYERS",
+        description="\n\n".join(lines) or "No entries on this page",
+        color=discord.Color.red(),
+        timestamp=datetime.now()
+    )
+    pages = max(1, -(-total // BLACKLIST_PAGE_SIZE))
+    embed.set_footer(text=f"Page {page + 1}/{pages} | {total} players{filters} | Soonest expiry first")
+    return embed
+
+class BlacklistPaginator(discord.ui.View):
+    """Pages through the blacklist, fetching and rendering one page per click"""
+    def __init__(self, viewer_id, guild, status, admin_id, filters, page, total):
+        super().__init__(timeout=60)
+        self.viewer_id = viewer_id
+        self.guild = guild
+        self.status = status
+        self.admin_id = admin_id
+        self.filters = filters
+        self.page = page
+        self.total = total
+        self.update_buttons()
+    
+    def update_buttons(self):
+        self.previous.disabled = self.page == 0
+        self.next.disabled = (self.page + 1) * BLACKLIST_PAGE_SIZE >= self.total
+    
+    async def show(self, interaction, page):
+        if interaction.user.id != self.viewer_id:
+            return await interaction.response.send_message("Run /blacklistall to page through it yourself", ephemeral=True)
+        entries, self.total = store.blacklist_page(self.status, self.admin_id, page, BLACKLIST_PAGE_SIZE)
+        self.page = page
+        self.update_buttons()
+        embed = blacklist_embed(self.guild, entries, page, self.total, self.filters)
+        await interaction.response.edit_message(embed=embed, view=self)
+    
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.gray)
+    @profiled
+    async def previous(self, interaction: discord.Interaction, button):
+        await self.show(interaction, self.page - 1)
+    
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.gray)
+    @profiled
+    async def next(self, interaction: discord.Interaction, button):
+        await self.show(interaction, self.page + 1)
+    
+    @discord.ui.button(label="Close", style=discord.ButtonStyle.danger)
+    @profiled
+    async def close(self, interaction: discord.Interaction, button):
+        for child in self.children:
+            child.disabled = True
+        await interaction.response.edit_message(view=self)
+        self.stop()
+    
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+
 @app_commands.command(name="blacklistall", description="View all blacklisted players (Admin only)")
-async def blacklistall(interaction: discord.Interaction):
+@app_commands.describe(
+    status="Only bans still in force, past their expiry, or permanent",
+    admin="Only bans issued by this admin",
+    page="Page to open"
+)
+@app_commands.choices(status=[
+    app_commands.Choice(name="active", value="active"),
+    app_commands.Choice(name="expired", value="expired"),
+    app_commands.Choice(name="permanent", value="permanent"),
+])
+@profiled
+async def blacklistall(interaction: discord.Interaction, status: Optional[app_commands.Choice[str]] = None,
+                       admin: discord.Member = None, page: int = 1):
     """View all blacklisted players"""
     
     # Admin check
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Admin only!", ephemeral=True)
     
-    if not blacklist_data:
-        return await interaction.response.send_message("No players are currently blacklisted.", ephemeral=True)
-    
-    # Create paginated view
-    pages = []
-    current_page = []
-    
-    for i, (user_id, info) in enumerate(blacklist_data.items(), 1):
-        try:
-            member = interaction.guild.get_member(int(user_id))
-            username = member.mention if member else f"ID: {user_id}"
-        except:
-            username = f"ID: {user_id}"
-        
-        reason = info.get("reason", "Unknown")
-        expires_at = info.get("expires_at", "Unknown")
-        
-        if expires_at == "permanent":
-            status = "🔴 PERMANENT"
-        else:
-            try:
-                expire_time = datetime.fromisoformat(expires_at)
-                time_left = expire_time - datetime.now()
-                if time_left.total_seconds() > 0:
-                    hours_left = int(time_left.total_seconds() / 3600)
-                    status = f"⏳ {hours_left}h"
-                else:
-                    status = "EXPIRED"
-            except:
-                status = "Unknown"
-        
-        current_page.append(f"**{i}. {username}**\n└ {reason} | {status}")
-        
-        # 5 entries per page
-        if len(current_page) >= 5 or i == len(blacklist_data):
-            embed = discord.Embed(
-                title="🚫 BLACKLISTED PLAYERS",
-                description="\n\n".join(current_page),
-                color=discord.Color.red(),
-                timestamp=datetime.now()
-            )
-            embed.set_footer(text=f"Page {len(pages) + 1} | Total: {len(blacklist_data)} players")
-            pages.append(embed)
-            current_page = []
-    
-    if not pages:
+    status_value = status.value if status else None
+    admin_id = admin.id if admin else None
+    page = max(page, 1) - 1
+    entries, total = store.blacklist_page(status_value, admin_id, page, BLACKLIST_PAGE_SIZE)
+    if not total:
         return await interaction.response.send_message("No blacklisted players found.", ephemeral=True)
+    if not entries:
+        page = (total - 1) // BLACKLIST_PAGE_SIZE
+        entries, total = store.blacklist_page(status_value, admin_id, page, BLACKLIST_PAGE_SIZE)
     
-    # Create paginated view
-    class BlacklistPaginator(discord.ui.View):
-        def __init__(self, pages):
-            super().__init__(timeout=60)
-            self.pages = pages
-            self.current_page = 0
-        
-        @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.gray, disabled=True)
-        async def previous(self, interaction: discord.Interaction, button):
-            self.current_page -= 1
-            button.disabled = self.current_page == 0
-            self.next.disabled = self.current_page == len(self.pages) - 1
-            await interaction.response.edit_message(embed=self.pages[self.current_page], view=self)
-        
-        @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.gray)
-        async def next(self, interaction: discord.Interaction, button):
-            self.current_page += 1
-            self.previous.disabled = self.current_page == 0
-            button.disabled = self.current_page == len(self.pages) - 1
-            await interaction.response.edit_message(embed=self.pages[self.current_page], view=self)
-        
-        @discord.ui.button(label="Close", style=discord.ButtonStyle.danger)
-        async def close(self, interaction: discord.Interaction, button):
-            for child in self.children:
-                child.disabled = True
-            await interaction.response.edit_message(view=self)
-            self.stop()
-        
-        async def on_timeout(self):
-            for child in self.children:
-                child.disabled = True
-    
-    view = BlacklistPaginator(pages)
-    await interaction.response.send_message(embed=pages[0], view=view, ephemeral=True)
+    filters = (f" | {status_value}" if status_value else "") + (f" | by {admin.display_name}" if admin else "")
+    view = BlacklistPaginator(interaction.user.id, interaction.guild, status_value, admin_id, filters, page, total)
+    embed = blacklist_embed(interaction.guild, entries, page, total, filters)
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
 @app_commands.command(name="needreplace", description="Request a replacement in current match")
+@profiled
 async def needreplace(interaction: discord.Interaction):
     user_lobby = None
     queue = None
@@ -2523,16 +3183,536 @@ async def needreplace(interaction: discord.Interaction):
     else:
         await interaction.response.send_message(embed=embed, view=view)
 
+@app_commands.command(name="cprofile", description="Profile the next N commands with cProfile (Admin only)")
+@app_commands.describe(count="Invocations to profile (0 stops and dumps now)",
+                       command="Only profile this command or callback, e.g. leaderboard or LobbyView.start")
+@profiled
+async def cprofile(interaction: discord.Interaction, count: int = 20, command: Optional[str] = None):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Admin only command!", ephemeral=True)
+    
+    if count <= 0:
+        path = profiling.stop_capture()
+        if path:
+            message = f"⏹️ Capture stopped, stats in `{path}`"
+        elif profiling.last_dump:
+            message = f"No capture was running, the last stats are in `{profiling.last_dump}`"
+        else:
+            message = "No capture was running"
+        return await interaction.response.send_message(message, ephemeral=True)
+    
+    path = profiling.start_capture(min(count, 500), command)
+    await interaction.response.send_message(
+        f"📊 Profiling the next {min(count, 500)} invocations of {f'`{command}`' if command else 'any command'}.\n"
+        f"Stats will be written to `{path}` (open with `python -m pstats`).",
+        ephemeral=True
+    )
+
+@app_commands.command(name="slowcommands", description="Recent slow commands with a time breakdown (Admin only)")
+@profiled
+async def slowcommands(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Admin only command!", ephemeral=True)
+    
+    embed = discord.Embed(
+        title="🐢 SLOW COMMANDS",
+        description=f"Invocations over {profiling.SLOW_COMMAND_MS:.0f}ms, newest first",
+        color=ORANGE_COLOR
+    )
+    for invocation in list(reversed(profiling.slow_log))[:10]:
+        parts = " | ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in invocation.breakdown().items())
+        embed.add_field(
+            name=f"{invocation.name}: {invocation.wall * 1000:.0f}ms",
+            value=f"{parts}\n{invocation.started_at.strftime('%H:%M:%S')}",
+            inline=False
+        )
+    if not profiling.slow_log:
+        embed.add_field(name="Nothing yet", value="No command has been slow since startup", inline=False)
+    
+    status = profiling.capture_status()
+    if status:
+        embed.set_footer(text=f"cProfile capture: {status['done']} done, {status['remaining']} to go → {status['path']}")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def bot_memory_stats():
+    """{structure: (entries, approx bytes)} for this process's own state"""
+    def nested_count(d):
+        return sum(len(v) for v in d.values())
+    
+    structures = {
+        "lobbies": (lobbies, nested_count(lobbies)),
+        "parties": (parties, nested_count(parties)),
+        "map_votes": (map_votes, nested_count(map_votes)),
+        "substitute_requests": (substitute_requests, nested_count(substitute_requests)),
+        "lobby_messages": (lobby_messages, nested_count(lobby_messages)),
+        "available_members": (available_members, nested_count(available_members)),
+        "member_cache": (member_cache, len(member_cache)),
+        "profile_cards": (profile_cards, len(profile_cards)),
+        "command_started": (command_started, len(command_started)),
+        "slow_log": (profiling.slow_log, len(profiling.slow_log)),
+    }
+    return {name: (count, memory.deep_sizeof(obj, follow=(QueueData, PartyData)))
+            for name, (obj, count) in structures.items()}
+
+def format_memory_table(stats):
+    width = max(len(name) for name in stats)
+    lines = [f"{name:<{width}} {count:>7} {memory.format_bytes(size):>9}"
+             for name, (count, size) in sorted(stats.items(), key=lambda item: -item[1][1])]
+    return "```\n" + "\n".join(lines) + "\n```"
+
+@app_commands.command(name="memstats", description="Memory used by the bot's data structures (Admin only)")
+@app_commands.describe(snapshot="tracemalloc: mark the heap now, diff against the mark, or stop tracing")
+@app_commands.choices(snapshot=[
+    app_commands.Choice(name="mark", value="mark"),
+    app_commands.Choice(name="diff", value="diff"),
+    app_commands.Choice(name="stop", value="stop"),
+])
+@profiled
+async def memstats(interaction: discord.Interaction, snapshot: Optional[app_commands.Choice[str]] = None):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Admin only command!", ephemeral=True)
+    
+    # Walking the heap can take a moment on a big bot
+    await interaction.response.defer(ephemeral=True)
+    
+    rss = get_rss_mb()
+    embed = discord.Embed(
+        title="🧠 MEMORY",
+        description=f"RSS: {f'{rss:.0f} MB' if rss else 'n/a'} · sizes are approximate, discord objects count as references",
+        color=ORANGE_COLOR
+    )
+    embed.add_field(name="Bot state", value=format_memory_table(bot_memory_stats()), inline=False)
+    embed.add_field(name="Store", value=format_memory_table(store.memory_stats()), inline=False)
+    
+    # Views nobody can click anymore but that are still referenced are the usual leak
+    views = memory.live_instances(discord.ui.View)
+    finished = sum(1 for v in views if v.is_finished())
+    by_class = Counter(type(v).__qualname__ for v in views)
+    view_lines = [f"{name}: {n}" for name, n in by_class.most_common(8)]
+    embed.add_field(
+        name=f"Live views: {len(views)} ({finished} finished, {len(bot.persistent_views)} persistent)",
+        value="\n".join(view_lines) or "None",
+        inline=False
+    )
+    
+    stale_cutoff = datetime.now() - timedelta(hours=1)
+    stale_requests = sum(1 for requests in substitute_requests.values() for req in requests.values()
+                         if req["timestamp"] < stale_cutoff)
+    if stale_requests:
+        embed.add_field(name="⚠️ Stale substitute requests", value=f"{stale_requests} older than an hour", inline=False)
+    
+    if snapshot and snapshot.value == "mark":
+        current, peak = memory.mark(datetime.now())
+        embed.add_field(name="tracemalloc", value=f"Marked. Traced: {memory.format_bytes(current)} (peak {memory.format_bytes(peak)})", inline=False)
+    elif snapshot and snapshot.value == "diff":
+        stats = memory.diff()
+        if stats is None:
+            embed.add_field(name="tracemalloc", value="No mark yet, run with `snapshot: mark` first", inline=False)
+        else:
+            since = memory.marked[0].strftime("%H:%M:%S")
+            lines = []
+            for stat in stats:
+                frame = stat.traceback[0]
+                lines.append(f"{memory.format_bytes(stat.size_diff):>9} {stat.count_diff:+7} "
+                             f"{os.path.basename(frame.filename)}:{frame.lineno}")
+            embed.add_field(name=f"Growth since {since}", value="```\n" + "\n".join(lines or ["No change"]) + "\n```", inline=False)
+    elif snapshot and snapshot.value == "stop":
+        memory.stop()
+        embed.add_field(name="tracemalloc", value="Stopped", inline=False)
+    
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@app_commands.command(name="looplag", description="Code that blocked the event loop (Admin only)")
+@app_commands.describe(reset="Clear the collected offenders after showing them")
+@profiled
+async def looplag(interaction: discord.Interaction, reset: bool = False):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Admin only command!", ephemeral=True)
+    
+    embed = discord.Embed(
+        title="🧊 EVENT LOOP STALLS",
+        description=f"Blocking calls over {watchdog.LAG_THRESHOLD_MS:.0f}ms, by total time · "
+                    f"worst lag since reset: {watchdog.max_lag * 1000:.0f}ms",
+        color=ORANGE_COLOR
+    )
+    for offender in watchdog.report(limit=5):
+        stack = "\n".join(offender.stack[-5:]) or "no stack sampled"
+        embed.add_field(
+            name=f"{offender.site}"[:256],
+            value=(f"{offender.stalls} stalls · {offender.seconds:.2f}s total · worst {offender.worst * 1000:.0f}ms · "
+                   f"last {offender.last_seen.strftime('%H:%M:%S')}\n```\n{stack}\n```")[:1024],
+            inline=False
+        )
+    if not watchdog.offenders:
+        embed.add_field(name="Nothing yet", value="The event loop hasn't been blocked since the last reset", inline=False)
+    
+    if watchdog.recent_stalls:
+        recent = [f"{at.strftime('%H:%M:%S')} {seconds * 1000:>6.0f}ms {site}"
+                  for at, seconds, site in list(watchdog.recent_stalls)[-5:]]
+        embed.add_field(name="Latest stalls", value=("```\n" + "\n".join(recent) + "\n```")[:1024], inline=False)
+    
+    if reset:
+        watchdog.reset()
+        embed.set_footer(text="Offenders cleared")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# ==================== STATE SNAPSHOTS ====================
+
+def member_ids(members):
+    return [m.id for m in members]
+
+def build_state_snapshot():
+    """All live state as plain ids, safe to json.dump"""
+    return {
+        "version": 1,
+        **store.dump_guild_state([guild.id for guild in bot.guilds]),
+        "lobby_messages": {str(gid): msgs for gid, msgs in lobby_messages.items() if msgs},
+        "map_votes": {str(gid): votes for gid, votes in map_votes.items() if votes},
+        "substitute_requests": {
+            str(gid): {name: {"player": req["player"].id, "timestamp": req["timestamp"].isoformat()}
+                       for name, req in requests.items()}
+            for gid, requests in substitute_requests.items() if requests
+        }
+    }
+
+last_snapshot = None
+
+def save_state_snapshot():
+    """Write the snapshot atomically, and only if something changed"""
+    global last_snapshot
+    data = json.dumps(build_state_snapshot(), separators=(",", ":"))
+    if data == last_snapshot:
+        return False
+    tmp_file = STATE_SNAPSHOT_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, STATE_SNAPSHOT_FILE)
+    last_snapshot = data
+    return True
+
+def load_state_snapshot():
+    if os.path.exists(STATE_SNAPSHOT_FILE):
+        try:
+            with open(STATE_SNAPSHOT_FILE, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Could not read state snapshot: {e}")
+    return None
+
+@tasks.loop(seconds=SNAPSHOT_INTERVAL)
+async def snapshot_state_task():
+    try:
+        save_state_snapshot()
+    except Exception as e:
+        print(f"[WARN] State snapshot failed: {e}")
+
+# With a store server, backups are its job (see storage.serve)
+@tasks.loop(minutes=max(BACKUP_INTERVAL, 1))
+async def backup_task():
+    try:
+        # The store is only locked while the files are pinned, the copying runs off the event loop
+        await asyncio.to_thread(store.backup)
+    except Exception as e:
+        print(f"[WARN] Backup failed: {e}")
+
+async def resolve_members(guild, member_ids):
+    members = []
+    for member_id in member_ids:
+        member = await resolve_member(guild, member_id)
+        if member:
+            members.append(member)
+    return members
+
+async def restore_map_vote(guild, lobby_name, vote, queue):
+    channel = guild.get_channel(vote.get("channel_id"))
+    if not channel or not vote.get("message_id"):
+        return
+    try:
+        message = await channel.fetch_message(vote["message_id"])
+    except discord.HTTPException:
+        return
+    
+    view = MapVoteView(lobby_name, queue.players, timeout=None)
+    view.votes = dict(vote["votes"])
+    view.message = message
+    bot.add_view(view, message_id=message.id)
+    
+    ends_at = vote.get("ends_at")
+    remaining = (datetime.fromisoformat(ends_at) - datetime.now()).total_seconds() if ends_at else 0
+    bot.loop.create_task(view.end_after(remaining))
+
+async def restore_state():
+    """Rebuild live state from the last snapshot and re-attach persistent views"""
+    snapshot = load_state_snapshot()
+    if not snapshot:
+        return
+    
+    # The store keeps whatever it already has, e.g. records another
+    # process (or a still-running store server) holds for these guilds
+    store.load_guild_state(snapshot)
+    
+    restored_lobbies = 0
+    for guild in bot.guilds:
+        guild_lobbies = store.get_lobbies(guild.id)
+        guild_parties = store.get_parties(guild.id)
+        # Warm the member cache so the records can be turned back into members
+        user_ids = set()
+        for record in guild_lobbies.values():
+            user_ids.update(record["players"])
+            if record.get("host"):
+                user_ids.add(record["host"])
+        for record in guild_parties.values():
+            user_ids.update(record["members"])
+        await resolve_members(guild, user_ids)
+        get_lobbies(guild.id)
+        get_parties(guild.id)
+        restored_lobbies += len(guild_lobbies)
+    
+    for gid, msgs in snapshot.get("lobby_messages", {}).items():
+        if bot.get_guild(int(gid)):
+            lobby_messages[int(gid)] = msgs
+    
+    for gid, requests in snapshot.get("substitute_requests", {}).items():
+        guild = bot.get_guild(int(gid))
+        if not guild:
+            continue
+        for name, req in requests.items():
+            player = await resolve_member(guild, req["player"])
+            if player:
+                if guild.id not in substitute_requests:
+                    substitute_requests[guild.id] = {}
+                substitute_requests[guild.id][name] = {
+                    "player": player,
+                    "timestamp": datetime.fromisoformat(req["timestamp"])
+                }
+    
+    # One persistent LobbyView per lobby name serves every message for it,
+    # the callbacks look the queue up from the clicking guild
+    for name in {name for guild_lobbies in lobbies.values() for name in guild_lobbies}:
+        bot.add_view(LobbyView(name, None))
+    
+    for gid, votes in snapshot.get("map_votes", {}).items():
+        guild = bot.get_guild(int(gid))
+        if not guild:
+            continue
+        for name, vote in votes.items():
+            queue = get_lobbies(guild.id).get(name)
+            if queue:
+                if guild.id not in map_votes:
+                    map_votes[guild.id] = {}
+                map_votes[guild.id][name] = vote
+                await restore_map_vote(guild, name, vote, queue)
+    
+    print(f"♻️ Restored {restored_lobbies} lobbies from snapshot")
+
+# ==================== METRICS ====================
+
+COMMAND_SECONDS = metrics.histogram("cbac_command_seconds", "Slash command latency from receipt to completion",
+                                    ["command", "status"])
+
+# {interaction id: perf_counter when it arrived}, for commands still running
+command_started = OrderedDict()
+
+def record_command(interaction, status):
+    start = command_started.pop(interaction.id, None)
+    if start is None:
+        return
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    COMMAND_SECONDS.observe(time.perf_counter() - start, command=name, status=status)
+
+def lobby_stats():
+    return store.lobby_stats([guild.id for guild in bot.guilds])
+
+metrics.gauge("cbac_lobbies", "Lobbies by state", ["state"],
+              callback=lambda: {(state,): n for state, n in lobby_stats().items() if state in ("open", "started")})
+metrics.gauge("cbac_queued_players", "Players queued in lobbies that haven't started",
+              callback=lambda: lobby_stats()["queued_players"])
+metrics.gauge("cbac_parties", "Active parties", callback=lambda: lobby_stats()["parties"])
+metrics.gauge("cbac_guilds", "Guilds this process serves", callback=lambda: len(bot.guilds))
+metrics.gauge("cbac_member_cache_size", "Members in the on-demand member cache", callback=lambda: len(member_cache))
+metrics.gauge("cbac_gateway_latency_seconds", "Gateway heartbeat latency", callback=lambda: bot.latency)
+
+# Bumped by heartbeat_task, /healthz fails when the event loop stops running it
+loop_heartbeat = time.monotonic()
+HEARTBEAT_TIMEOUT = 30  # seconds
+
+@tasks.loop(seconds=5)
+async def heartbeat_task():
+    global loop_heartbeat
+    loop_heartbeat = time.monotonic()
+
+def health_check():
+    age = time.monotonic() - loop_heartbeat
+    if age > HEARTBEAT_TIMEOUT:
+        return False, f"event loop stalled for {age:.0f}s"
+    return True, "ok"
+
+def ready_check():
+    if bot.is_closed():
+        return False, "closed"
+    if not bot.is_ready() or not state_restored:
+        return False, "starting"  # Stays here if the restore failed
+    store.player_count()  # Raises if the store server is unreachable
+    return True, "ok"
+
+def start_metrics():
+    if METRICS_PORT:
+        try:
+            metrics.start_http_server(METRICS_HOST, METRICS_PORT, health=health_check, ready=ready_check)
+        except OSError as e:
+            print(f"[WARN] Metrics endpoint not started: {e}")
+    heartbeat_task.start()
+    watchdog.start()
+
 # ==================== BOT SETUP ====================
 
-@bot.event
-async def on_ready():
-    print(f"✅ {bot.user} is online")
+# ==================== COMMAND SYNC ====================
+
+def command_manifest_hash(guild=None):
+    """SHA-256 of the command payloads Discord would receive for this scope"""
+    manifest = []
+    for cmd in bot.tree.get_commands(guild=guild):
+        try:
+            manifest.append(cmd.to_dict(bot.tree))
+        except TypeError:  # discord.py < 2.4 takes no tree argument
+            manifest.append(cmd.to_dict())
+    manifest.sort(key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+def load_sync_state():
+    if os.path.exists(COMMAND_SYNC_FILE):
+        try:
+            with open(COMMAND_SYNC_FILE, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+def save_sync_state(state):
+    with open(COMMAND_SYNC_FILE, "w") as f:
+        json.dump(state, f, indent=4)
+
+async def sync_commands():
+    """Sync the command tree only when the manifest changed since the last sync"""
+    if SHARD_IDS and 0 not in SHARD_IDS:
+        return  # Commands are global, the process running shard 0 syncs them
+    
+    guild = discord.Object(id=int(DEV_GUILD_ID)) if DEV_GUILD_ID else None
+    if guild:
+        bot.tree.copy_global_to(guild=guild)
+    
+    scope = f"{bot.application_id}:{guild.id if guild else 'global'}"
+    digest = command_manifest_hash(guild)
+    state = load_sync_state()
+    
+    if state.get(scope) == digest and not FORCE_SYNC:
+        print(f"✅ Commands unchanged ({scope}), skipping sync")
+        return
+    
     try:
-        synced = await bot.tree.sync()
-        print(f"✅ Synced {len(synced)} commands")
+        synced = await bot.tree.sync(guild=guild)
+        print(f"✅ Synced {len(synced)} commands ({scope})")
     except Exception as e:
         print(f"❌ Error syncing commands: {e}")
+        return
+    
+    state[scope] = digest
+    save_sync_state(state)
+
+@bot.event
+async def setup_hook():
+    # Runs once per process, unlike on_ready which fires again after reconnects
+    start_metrics()
+    await sync_commands()
+
+def get_rss_mb():
+    """Current resident set size in MB, None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+startup_reported = False
+restore_started = False  # on_ready runs again on every reconnect, the restore only once
+state_restored = False   # Set once the restore succeeded, /readyz waits for it
+
+@bot.event
+async def on_ready():
+    global startup_reported, restore_started, state_restored
+    print(f"✅ {bot.user} is online")
+    
+    if not restore_started:
+        restore_started = True
+        try:
+            await restore_state()
+            state_restored = True
+        except Exception as e:
+            print(f"❌ Error restoring state: {e}")
+        # Only start snapshotting once the old snapshot has been read back
+        if not snapshot_state_task.is_running():
+            snapshot_state_task.start()
+        if BACKUP_INTERVAL and not STORE_ADDRESS and not backup_task.is_running():
+            backup_task.start()
+    
+    for guild in bot.guilds:
+        rebuild_member_index(guild)
+    
+    if not startup_reported:
+        startup_reported = True
+        elapsed = time.perf_counter() - STARTUP_TIME
+        rss = get_rss_mb()
+        cached = sum(len(g.members) for g in bot.guilds)
+        print(f"⏱️ Ready in {elapsed:.1f}s | RSS: {f'{rss:.0f} MB' if rss else 'n/a'} | "
+              f"{cached} members cached in {len(bot.guilds)} guilds | Lean mode: {'ON' if LEAN_MODE else 'OFF'}")
+
+@bot.event
+async def on_interaction(interaction):
+    if interaction.type == discord.InteractionType.application_command:
+        command_started[interaction.id] = time.perf_counter()
+        while len(command_started) > 1000:  # Drop commands that never finished
+            command_started.popitem(last=False)
+    
+    # Lean mode has no member list, so index the members we actually see
+    if LEAN_MODE and isinstance(interaction.user, discord.Member):
+        cache_member(interaction.user)
+        refresh_member_index(interaction.user)
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    record_command(interaction, "ok")
+
+@bot.tree.error
+async def on_app_command_error(interaction, error):
+    record_command(interaction, "error")
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    print(f"❌ Error in /{name}: {error}")
+    traceback.print_exception(type(error), error, error.__traceback__)
+
+@bot.event
+async def on_guild_join(guild):
+    rebuild_member_index(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    for state in (available_members, busy_members, available_elo_index, available_elos, pending_elos):
+        state.pop(guild.id, None)
+
+@bot.event
+async def on_presence_update(before, after):
+    if before.status != after.status:
+        refresh_member_index(after)
+
+@bot.event
+async def on_member_join(member):
+    refresh_member_index(member)
+
+@bot.event
+async def on_member_remove(member):
+    drop_from_member_index(member.guild.id, member.id)
 
 # Add to the bot tree at the bottom
 bot.tree.add_command(kickplayer)  
@@ -2547,6 +3727,13 @@ bot.tree.add_command(removeelo)
 bot.tree.add_command(correctwin)
 bot.tree.add_command(profile)
 bot.tree.add_command(leaderboard)
+bot.tree.add_command(mapstats)
+bot.tree.add_command(headtohead)
+bot.tree.add_command(elohistory)
+bot.tree.add_command(history)
+bot.tree.add_command(seasons_command)
+bot.tree.add_command(endseason)
+bot.tree.add_command(export_command)
 bot.tree.add_command(end_match)
 bot.tree.add_command(party_command)
 bot.tree.add_command(partyjoin)
@@ -2557,4 +3744,9 @@ bot.tree.add_command(blacklist)
 bot.tree.add_command(unblacklist)
 bot.tree.add_command(blacklistinfo)
 bot.tree.add_command(blacklistall)
-bot.run(os.getenv("TOKEN"))
\ No newline at end of file
+bot.tree.add_command(cprofile)
+bot.tree.add_command(slowcommands)
+bot.tree.add_command(memstats)
+bot.tree.add_command(looplag)
+if __name__ == "__main__":
+    bot.run(os.getenv("TOKEN"))
\ No newline at end of file
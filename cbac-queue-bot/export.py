@@ -0,0 +1,192 @@
+"""Streaming exports of player stats, the match ledger and the blacklist.
+
+    rows = export(store, "matches", "matches.csv.gz", "csv", guild_id=..., since=..., until=...)
+
+    python export.py players --guild 1234 --season 2 -o players.csv.gz
+    python export.py matches --guild 1234 --since 2026-01-01 --format jsonl -o - | zcat | head
+    python export.py blacklist --store 127.0.0.1:50000
+
+Rows come from the store a page at a time (LocalStore.export_page, which
+works the same through a store server) and go straight into a gzip stream,
+so an export holds one page of EXPORT_PAGE_SIZE rows however much data
+there is. Players and matches are exported per guild, from the live season
+or an ended one's archive; the blacklist is bot-wide. since/until keep
+matches played, blacklist entries added and players last seen in that
+range of days.
+"""
+import argparse
+import bisect
+import csv
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from itertools import chain
+
+from analytics import record_sides
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+COLUMNS = {
+    "players": ["guild_id", "season", "user_id", "elo", "wins", "losses",
+                "total_elo_gained", "total_elo_lost", "last_played"],
+    "matches": ["match_id", "guild_id", "season", "timestamp", "lobby_name", "map", "winner",
+                "t_side", "ct_side", "elo_gain", "elo_loss", "reported_by", "corrected_at"],
+    "blacklist": ["user_id", "reason", "added_at", "expires_at", "admin_id", "admin_name", "duration_hours"],
+}
+# Column the time range applies to
+TIME_COLUMNS = {"players": "last_played", "matches": "timestamp", "blacklist": "added_at"}
+FORMATS = ("csv", "jsonl")
+
+def player_row(guild_id, season, user_id, stats):
+    """stats is a player's stats dict, or vars() of a live PlayerStats"""
+    recent = stats.get("recent_matches")
+    return {
+        "guild_id": guild_id,
+        "season": season,
+        "user_id": user_id,
+        "elo": stats.get("elo", 0),
+        "wins": stats.get("wins", 0),
+        "losses": stats.get("losses", 0),
+        "total_elo_gained": stats.get("total_elo_gained", 0),
+        "total_elo_lost": stats.get("total_elo_lost", 0),
+        "last_played": recent[-1].get("timestamp") if recent else None
+    }
+
+def match_row(guild_id, season, match_id, record):
+    """A ledger record with its correction applied: winner is the side that ended up winning"""
+    sides = record_sides(record)
+    t_side, ct_side, ct_won = sides if sides else (None, None, None)
+    return {
+        "match_id": match_id,
+        "guild_id": guild_id,
+        "season": season,
+        "timestamp": record.get("timestamp"),
+        "lobby_name": record.get("lobby_name"),
+        "map": record.get("selected_map"),
+        "winner": None if sides is None else "CT" if ct_won else "T",
+        "t_side": t_side,
+        "ct_side": ct_side,
+        "elo_gain": record.get("elo_gain"),
+        "elo_loss": record.get("elo_loss"),
+        # Records settled before ids were stored as strings hold an int
+        "reported_by": None if record.get("reported_by") is None else str(record["reported_by"]),
+        "corrected_at": record.get("corrected_at")
+    }
+
+def blacklist_row(user_id, entry):
+    row = {column: entry.get(column) for column in COLUMNS["blacklist"]}
+    row["user_id"] = user_id
+    return row
+
+def page_rows(keys, get, make_row, kind, cursor, limit, since=None, until=None):
+    """One page of rows: (up to `limit` rows in the time range, next cursor or None).
+
+    keys are the items' keys, sorted, and the cursor is the key the last
+    page ended on (None for the first), so finding where a page starts is a
+    bisect. get(key) is the item, or None if it's gone since the keys were
+    sorted; make_row(key, item) makes it a row."""
+    column = TIME_COLUMNS[kind]
+    page = []
+    start = 0 if cursor is None else bisect.bisect_right(keys, cursor)
+    for position in range(start, len(keys)):
+        key = keys[position]
+        item = get(key)
+        if item is None:
+            continue
+        row = make_row(key, item)
+        value = row[column]
+        if since and (value is None or value < since):
+            continue
+        if until and (value is None or value >= until):
+            continue
+        page.append(row)
+        if len(page) == limit:
+            return page, key
+    return page, None
+
+def parse_day(text, end=False):
+    """"YYYY-MM-DD" as an ISO timestamp to compare with; end=True is the day after, so the day is included"""
+    if not text:
+        return None
+    day = datetime.strptime(text, "%Y-%m-%d")
+    return (day + timedelta(days=1) if end else day).isoformat()
+
+def csv_value(value):
+    if isinstance(value, list):
+        return " ".join(str(item) for item in value)
+    return "" if value is None else value
+
+def pages(store, kind, guild_id=None, season=None, since=None, until=None):
+    cursor = None
+    while True:
+        page = store.export_page(kind, guild_id, season, since, until, cursor, EXPORT_PAGE_SIZE)
+        if page is None:
+            raise ValueError(f"There's no ended season {season}")
+        rows, cursor = page
+        yield rows
+        if cursor is None:
+            return
+
+def export(store, kind, target, fmt="csv", guild_id=None, season=None, since=None, until=None):
+    """Stream one export as gzipped CSV or JSONL into target, a path or binary file.
+    Nothing is written if the season doesn't exist. Returns the rows written"""
+    if kind not in COLUMNS or fmt not in FORMATS:
+        raise ValueError(f"Can't export {kind} as {fmt}")
+    if kind != "blacklist" and guild_id is None:
+        raise ValueError(f"{kind} are exported per guild")
+    columns = COLUMNS[kind]
+    stream = pages(store, kind, guild_id, season, since, until)
+    first = next(stream)
+    count = 0
+    with gzip.open(target, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        for rows in chain([first], stream):
+            for row in rows:
+                if writer:
+                    writer.writerow([csv_value(row[column]) for column in columns])
+                else:
+                    f.write(json.dumps(row, separators=(",", ":")) + "\n")
+            count += len(rows)
+    return count
+
+def open_store(args):
+    # Imported here so the row helpers above stay usable from inside storage.py
+    import storage
+    if args.store:
+        return storage.connect_store(args.store)
+    return storage.LocalStore(args.guilds_dir, args.blacklist_file, args.matches_file, args.players_file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export players, matches or the blacklist as gzipped CSV or JSONL")
+    parser.add_argument("kind", choices=list(COLUMNS))
+    parser.add_argument("--guild", type=int, help="Guild to export players or matches of")
+    parser.add_argument("--season", type=int, help="An ended season (default: the live one)")
+    parser.add_argument("--since", help="First day, YYYY-MM-DD")
+    parser.add_argument("--until", help="Last day, YYYY-MM-DD")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("-o", "--output", help="File to write, - for stdout (default: <kind>.<format>.gz)")
+    parser.add_argument("--store", help="host:port of a running store server, instead of reading the files below")
+    parser.add_argument("--guilds-dir", default="guilds")
+    parser.add_argument("--blacklist-file", default="blacklist.json")
+    parser.add_argument("--matches-file", default="match_history.json")
+    parser.add_argument("--players-file", default="players.json")
+    args = parser.parse_args()
+    if args.kind != "blacklist" and args.guild is None:
+        parser.error(f"--guild is needed to export {args.kind}")
+
+    output = args.output or f"{args.kind}.{args.format}.gz"
+    target = sys.stdout.buffer if output == "-" else output
+    try:
+        count = export(open_store(args), args.kind, target, args.format, args.guild, args.season,
+                       parse_day(args.since), parse_day(args.until, end=True))
+    except ValueError as e:
+        parser.exit(1, f"❌ {e}\n")
+    if output != "-":
+        print(f"✅ Exported {count} {args.kind} rows to {output}")
+
+if __name__ == "__main__":
+    main()
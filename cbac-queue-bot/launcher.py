@@ -0,0 +1,119 @@
+"""Run the bot as several processes, each connected with its own range of shards.
+
+    python launcher.py --shards 8 --processes 4
+
+Starts a store server (storage.py) for the data every process shares, i.e.
+player stats, the blacklist, matches, lobbies and parties, then one bot.py
+per shard range with SHARD_COUNT, SHARD_IDS and STORE_ADDRESS set. Map votes
+and views stay inside the process whose shards own the guild. A bot process
+that exits is restarted after a short delay.
+
+The store server and the bots share STORE_AUTHKEY; if it isn't set, a
+random one is generated for this run.
+
+Each process serves its own metrics: the store server on --metrics-port,
+bot process i on --metrics-port + 1 + i (0 turns metrics off).
+
+Everything runs on this machine, so it also works as a local stand-in for a
+multi-host deployment: --dry-run prints the layout without starting anything.
+"""
+import argparse
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESTART_DELAY = 5  # seconds
+
+def shard_ranges(shard_count, processes):
+    """Split shard ids 0..shard_count-1 into `processes` contiguous ranges"""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        size = base + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+def wait_for_port(host, port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def start_bot(shard_ids, shard_count, store_address, metrics_port=0):
+    env = dict(os.environ)
+    env["METRICS_PORT"] = str(metrics_port)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(str(i) for i in shard_ids)
+    env["STORE_ADDRESS"] = store_address
+    return subprocess.Popen([sys.executable, "bot.py"], cwd=HERE, env=env)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as several sharded processes")
+    parser.add_argument("--shards", type=int, required=True, help="Total shard count")
+    parser.add_argument("--processes", type=int, default=1, help="Bot processes to split the shards over")
+    parser.add_argument("--store-host", default="127.0.0.1")
+    parser.add_argument("--store-port", type=int, default=50000)
+    parser.add_argument("--metrics-port", type=int, default=9108, help="First metrics port, 0 for none")
+    parser.add_argument("--dry-run", action="store_true", help="Print the shard layout and exit")
+    args = parser.parse_args()
+
+    ranges = shard_ranges(args.shards, args.processes)
+    store_address = f"{args.store_host}:{args.store_port}"
+
+    def bot_metrics_port(i):
+        return args.metrics_port + 1 + i if args.metrics_port else 0
+
+    for i, shard_ids in enumerate(ranges):
+        metrics_note = f", metrics on :{bot_metrics_port(i)}" if args.metrics_port else ""
+        print(f"Process {i}: shards {shard_ids[0]}-{shard_ids[-1]} of {args.shards}{metrics_note}")
+    if args.dry_run:
+        return
+
+    # The store server unpickles what its clients send, so it never runs on a known key
+    os.environ.setdefault("STORE_AUTHKEY", secrets.token_hex(32))
+
+    store_cmd = [sys.executable, "storage.py", "--host", args.store_host, "--port", str(args.store_port)]
+    if args.metrics_port:
+        store_cmd += ["--metrics-port", str(args.metrics_port)]
+    store_proc = subprocess.Popen(store_cmd, cwd=HERE)
+    if not wait_for_port(args.store_host, args.store_port):
+        store_proc.terminate()
+        sys.exit(f"❌ Store server did not come up on {store_address}")
+
+    bots = {i: start_bot(shard_ids, args.shards, store_address, bot_metrics_port(i))
+            for i, shard_ids in enumerate(ranges)}
+
+    try:
+        while True:
+            time.sleep(1)
+            if store_proc.poll() is not None:
+                print("❌ Store server exited, stopping bots")
+                break
+            for i, proc in bots.items():
+                if proc.poll() is not None:
+                    print(f"[WARN] Process {i} exited with {proc.returncode}, restarting in {RESTART_DELAY}s")
+                    time.sleep(RESTART_DELAY)
+                    bots[i] = start_bot(ranges[i], args.shards, store_address, bot_metrics_port(i))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in bots.values():
+            proc.terminate()
+        for proc in bots.values():
+            proc.wait()
+        store_proc.terminate()
+        store_proc.wait()
+
+if __name__ == "__main__":
+    main()
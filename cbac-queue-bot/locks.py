@@ -0,0 +1,28 @@
+"""Per-lobby and per-player asyncio locks.
+
+There's no global lock: each lobby and each player gets their own, so
+handlers for unrelated lobbies never wait on each other. Locks are kept in
+weak dictionaries and disappear once nobody holds or waits on them, so
+deleted lobbies and departed players don't pile up.
+
+They only order coroutines inside one process. Across processes the store's
+atomic operations (join_if_not_full, begin_match, apply_match_deltas, ...)
+are what keep lobbies and matches consistent.
+"""
+import asyncio
+import weakref
+
+lobby_locks = weakref.WeakValueDictionary()   # {(guild_id, lobby_name): asyncio.Lock}
+player_locks = weakref.WeakValueDictionary()  # {(guild_id, user_id): asyncio.Lock}
+
+def _get_lock(locks, key):
+    lock = locks.get(key)
+    if lock is None:
+        lock = locks[key] = asyncio.Lock()
+    return lock
+
+def lobby_lock(guild_id, lobby_name):
+    return _get_lock(lobby_locks, (guild_id, lobby_name))
+
+def player_lock(guild_id, user_id):
+    return _get_lock(player_locks, (guild_id, user_id))
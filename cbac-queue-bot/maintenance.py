@@ -0,0 +1,275 @@
+"""Offline maintenance of the data files, without starting the bot.
+
+    python maintenance.py migrate              # bring files up to the current layout
+    python maintenance.py validate [--guild ID]  # schema and cross-file checks, exit 1 on errors
+    python maintenance.py compact [--guild ID]   # fold ELO history journals into their snapshots
+    python maintenance.py rebuild [--guild ID]   # rewrite match log .idx files from the logs
+
+Only storage.py and its helper modules are imported, never discord. Stop
+the bot (or the store server) first: both keep the files open for writing
+and would overwrite what this changes. Big files are streamed where the
+format allows it: the match log and the ELO history journal are read line
+by line, and match log user ids are read off the front of each line.
+"""
+import argparse
+import os
+import sys
+from array import array
+from datetime import datetime
+
+import matchlog
+from analytics import record_guild, record_sides
+from seasons import archive_path
+from storage import (BLACKLIST_FILE, DATA_FILE, ELO_HISTORY_FILE, GUILDS_DIR, MATCH_HISTORY_FILE,
+                     MATCH_LOG_DIR, PLAYERS_FILE, SEASON_FILE, SEASONS_DIR, UNASSIGNED_FILE,
+                     GuildPlayers, load_json, migrate_players, save_json)
+
+EXAMPLES = 5  # Problems printed per check, the rest are counted
+PLAYER_FIELDS = {"elo": int, "wins": int, "losses": int, "total_elo_gained": int,
+                 "total_elo_lost": int, "version": int, "recent_matches": list}
+
+class Report:
+    """Problems found by validate, grouped by check"""
+
+    def __init__(self):
+        self.problems = {}  # {(level, check): [details]}
+
+    def add(self, level, check, detail):
+        self.problems.setdefault((level, check), []).append(detail)
+
+    def error(self, check, detail):
+        self.add("error", check, detail)
+
+    def warn(self, check, detail):
+        self.add("warning", check, detail)
+
+    def count(self, level):
+        return sum(len(details) for (found, _), details in self.problems.items() if found == level)
+
+    def print(self):
+        for (level, check), details in sorted(self.problems.items()):
+            print(f"{'❌' if level == 'error' else '⚠️'} {check}: {len(details)}")
+            for detail in details[:EXAMPLES]:
+                print(f"    {detail}")
+            if len(details) > EXAMPLES:
+                print(f"    ... and {len(details) - EXAMPLES} more")
+
+def guild_ids(guilds_dir, only=None):
+    if only:
+        return [only]
+    if not os.path.isdir(guilds_dir):
+        return []
+    return sorted(int(name) for name in os.listdir(guilds_dir)
+                  if name.isdigit() and os.path.isdir(os.path.join(guilds_dir, name)))
+
+def is_timestamp(value):
+    try:
+        datetime.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+# ==================== MIGRATE ====================
+
+def migrate_guild_partitions(args):
+    """Split the global players.json into per-guild files"""
+    unassigned_file = os.path.join(args.guilds_dir, UNASSIGNED_FILE)
+    if not os.path.exists(args.players_file) or os.path.exists(unassigned_file):
+        return False
+    migrate_players(args.players_file, args.guilds_dir, load_json(args.matches_file))
+    return True
+
+def migrate_ledger_guild_ids(args):
+    """Store the guild id in ledger records that only carry it in their key"""
+    matches = load_json(args.matches_file)
+    missing = [match_id for match_id, record in matches.items() if "guild_id" not in record]
+    for match_id in missing:
+        matches[match_id]["guild_id"] = record_guild(match_id, matches[match_id])
+    if missing:
+        save_json(args.matches_file, matches, "matches")
+        print(f"📦 Added guild ids to {len(missing)} ledger records")
+    return bool(missing)
+
+# Applied in order; each one is a no-op once its files are up to date
+MIGRATIONS = [
+    ("guild partitions", migrate_guild_partitions),
+    ("ledger guild ids", migrate_ledger_guild_ids),
+]
+
+def migrate(args):
+    for name, step in MIGRATIONS:
+        print(f"{'✅ Migrated' if step(args) else '➖ Up to date:'} {name}")
+    return 0
+
+# ==================== VALIDATE ====================
+
+def validate_player(report, guild_id, uid, data):
+    where = f"guild {guild_id} player {uid}"
+    if not uid.isdigit():
+        report.error("player ids", f"{where}: not a user id")
+    if not isinstance(data, dict):
+        return report.error("player schema", f"{where}: not an object")
+    for field, kind in PLAYER_FIELDS.items():
+        value = data.get(field)
+        if value is not None and (not isinstance(value, kind) or isinstance(value, bool)):
+            report.error("player schema", f"{where}: {field} is a {type(value).__name__}")
+    if isinstance(data.get("elo"), int) and data["elo"] < 0:
+        report.error("player schema", f"{where}: negative ELO {data['elo']}")
+
+def history_ids(directory):
+    """User ids in a guild's ELO history snapshot and journal, and the journal's unreadable lines"""
+    ids = set(load_json(os.path.join(directory, ELO_HISTORY_FILE)))
+    journal = os.path.splitext(os.path.join(directory, ELO_HISTORY_FILE))[0] + ".log"
+    torn = 0
+    if os.path.exists(journal):
+        with open(journal, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3:
+                    ids.add(parts[0])
+                else:
+                    torn += 1
+    return ids, torn
+
+def validate_match_log(report, guild_id, directory):
+    """Check each .idx against its .log. Returns the user ids in the log"""
+    ids = set()
+    if not os.path.isdir(directory):
+        return ids
+    for segment in matchlog.segment_numbers(directory):
+        where = f"guild {guild_id} match log segment {segment}"
+        entries = array("q")
+        idx_path = matchlog.segment_path(directory, segment, "idx")
+        if os.path.exists(idx_path):
+            with open(idx_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size % (2 * entries.itemsize):
+                    report.error("match log index", f"{where}: .idx size {size} isn't whole entries")
+                entries.fromfile(f, size // (2 * entries.itemsize) * 2)
+        lines = 0
+        for offset, user_id in matchlog.scan_segment(matchlog.segment_path(directory, segment, "log")):
+            ids.add(str(user_id))
+            i = lines * 2
+            if i < len(entries) and (entries[i], entries[i + 1]) != (user_id, offset):
+                report.error("match log index", f"{where}: entry {lines} doesn't match the log, run rebuild")
+                break
+            lines += 1
+        if lines * 2 < len(entries):
+            report.error("match log index", f"{where}: indexes {len(entries) // 2} entries, the log has {lines}")
+        elif lines * 2 > len(entries):
+            report.warn("match log index", f"{where}: {lines - len(entries) // 2} entries not indexed yet "
+                                            f"(indexed on the next load, or run rebuild)")
+    return ids
+
+def validate_guild(report, guild_id, guilds_dir, ledger_players):
+    directory = os.path.join(guilds_dir, str(guild_id))
+    players = load_json(os.path.join(directory, PLAYERS_FILE))
+    for uid, data in players.items():
+        validate_player(report, guild_id, uid, data)
+
+    season = load_json(os.path.join(directory, SEASON_FILE)) or {"season": 1, "archived": []}
+    for summary in season.get("archived", []):
+        if not os.path.exists(archive_path(os.path.join(directory, SEASONS_DIR), summary["season"])):
+            report.error("season archives", f"guild {guild_id}: season {summary['season']} has no archive")
+    # A season reset drops players left at 0 ELO while their history and match log stay
+    orphan = report.warn if season.get("archived") else report.error
+
+    history, torn = history_ids(directory)
+    if torn:
+        report.warn("ELO history journal", f"guild {guild_id}: {torn} unreadable lines (skipped on load)")
+    for uid in sorted(history - players.keys()):
+        orphan("ELO history without a player", f"guild {guild_id}: {uid}")
+    for uid in sorted(validate_match_log(report, guild_id, os.path.join(directory, MATCH_LOG_DIR)) - players.keys()):
+        orphan("match log without a player", f"guild {guild_id}: {uid}")
+    for uid in sorted(ledger_players.get(guild_id, set()) - players.keys()):
+        report.error("ledger player without stats", f"guild {guild_id}: {uid}")
+    return len(players)
+
+def validate_ledger(report, matches, guilds):
+    """Check every record. Returns {guild_id: user ids in its live ledger}"""
+    players = {}
+    for match_id, record in matches.items():
+        if not isinstance(record, dict):
+            report.error("ledger schema", f"{match_id}: not an object")
+            continue
+        guild_id = record_guild(match_id, record)
+        if not guild_id:
+            report.error("ledger guilds", f"{match_id}: no guild id")
+        elif guild_id not in guilds:
+            report.warn("ledger guilds", f"{match_id}: guild {guild_id} has no player files")
+        if not is_timestamp(record.get("timestamp")):
+            report.error("ledger schema", f"{match_id}: bad timestamp {record.get('timestamp')!r}")
+        if record.get("corrected_at") and not is_timestamp(record["corrected_at"]):
+            report.error("ledger schema", f"{match_id}: bad corrected_at {record['corrected_at']!r}")
+        sides = record_sides(record)
+        if sides is None:
+            report.error("ledger schema", f"{match_id}: winner {record.get('winner')!r} isn't T or CT")
+            continue
+        t_side, ct_side, _ = sides
+        if set(map(str, t_side)) & set(map(str, ct_side)):
+            report.error("ledger sides", f"{match_id}: a player is on both sides")
+        players.setdefault(guild_id, set()).update(str(uid) for uid in t_side + ct_side)
+    return players
+
+def validate_blacklist(report, blacklist):
+    for uid, entry in blacklist.items():
+        if not isinstance(entry, dict):
+            report.error("blacklist schema", f"{uid}: not an object")
+            continue
+        expires_at = entry.get("expires_at")
+        if expires_at != "permanent" and not is_timestamp(expires_at):
+            report.error("blacklist schema", f"{uid}: bad expires_at {expires_at!r}")
+        if entry.get("user_id", uid) != uid:
+            report.error("blacklist schema", f"{uid}: entry is for {entry['user_id']}")
+
+def validate(args):
+    report = Report()
+    guilds = guild_ids(args.guilds_dir, args.guild)
+    matches = load_json(args.matches_file)
+    if args.guild:
+        matches = {match_id: record for match_id, record in matches.items()
+                   if isinstance(record, dict) and record_guild(match_id, record) == args.guild}
+    ledger_players = validate_ledger(report, matches, set(guild_ids(args.guilds_dir)))
+    validate_blacklist(report, load_json(args.blacklist_file))
+    if os.path.exists(args.players_file) and not os.path.exists(os.path.join(args.guilds_dir, UNASSIGNED_FILE)):
+        report.warn("migrations", f"{args.players_file} isn't split by guild yet, run migrate")
+    player_total = sum(validate_guild(report, guild_id, args.guilds_dir, ledger_players) for guild_id in guilds)
+
+    report.print()
+    errors, warnings = report.count("error"), report.count("warning")
+    print(f"{'❌' if errors else '✅'} {len(guilds)} guilds, {player_total} players, {len(matches)} ledger matches: "
+          f"{errors} errors, {warnings} warnings")
+    return 1 if errors else 0
+
+# ==================== COMPACT / REBUILD ====================
+
+def compact(args):
+    for guild_id in guild_ids(args.guilds_dir, args.guild):
+        partition = GuildPlayers(guild_id, os.path.join(args.guilds_dir, str(guild_id)))
+        lines = partition.history_log_lines
+        partition.compact_history()
+        print(f"🗜️ Guild {guild_id}: folded {lines} journal lines into {partition.elo_history.point_count()} points")
+    return 0
+
+def rebuild(args):
+    for guild_id in guild_ids(args.guilds_dir, args.guild):
+        directory = os.path.join(args.guilds_dir, str(guild_id), MATCH_LOG_DIR)
+        if os.path.isdir(directory):
+            print(f"🔧 Guild {guild_id}: indexed {matchlog.rebuild_index(directory)} match log entries")
+    return 0
+
+COMMANDS = {"migrate": migrate, "validate": validate, "compact": compact, "rebuild": rebuild}
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate, validate and compact the bot's data files offline")
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("--guild", type=int, help="Only this guild (validate, compact, rebuild)")
+    parser.add_argument("--guilds-dir", default=GUILDS_DIR)
+    parser.add_argument("--players-file", default=DATA_FILE, help="Global players file from before guild partitions")
+    parser.add_argument("--blacklist-file", default=BLACKLIST_FILE)
+    parser.add_argument("--matches-file", default=MATCH_HISTORY_FILE)
+    args = parser.parse_args()
+    sys.exit(COMMANDS[args.command](args))
+
+if __name__ == "__main__":
+    main()
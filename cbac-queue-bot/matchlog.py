@@ -0,0 +1,177 @@
+"""Append-only, segmented log of every player's matches with an offset index.
+
+    log = MatchLog("match_log")
+    log.append(user_id, {"match_id": ..., "result": "win", ...})
+    log.flush()                            # one write per segment touched
+    log.page(user_id, page=0, per_page=10) # newest first, reads only that page
+
+Entries are JSON lines in numbered segment files (000001.log, ...); a new
+segment starts once the current one passes SEGMENT_BYTES. Next to each
+segment, its .idx file holds (user id, byte offset) pairs as raw int64s, so
+the index loads with array.fromfile instead of parsing the log. In memory,
+each player has an array of packed locations (segment << 32 | offset) in
+the order their matches were logged, which makes a player's match count
+free and a page a slice of that array plus one seek per entry.
+
+The log is written before its index. A crash between the two is repaired
+on load by indexing the last segment's unindexed lines, and a line cut
+short is truncated away.
+"""
+import json
+import os
+from array import array
+
+SEGMENT_BYTES = int(os.getenv("MATCH_LOG_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+USER_ID_PREFIX = b'{"user_id":'  # Every line starts with it, see MatchLog.append
+
+def segment_path(directory, segment, ext):
+    return os.path.join(directory, f"{segment:06d}.{ext}")
+
+def segment_numbers(directory):
+    return sorted(int(name[:-4]) for name in os.listdir(directory)
+                  if name.endswith(".log") and name[:-4].isdigit())
+
+def scan_segment(path):
+    """(offset, user id) of each complete line of a segment, in order. The id
+    is read off the front of the line, without parsing the whole entry"""
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # Cut short by a crash
+            end = line.find(b",")
+            if line.startswith(USER_ID_PREFIX) and end > 0:
+                user_id = int(line[len(USER_ID_PREFIX):end])
+            else:
+                user_id = json.loads(line)["user_id"]
+            yield offset, user_id
+            offset += len(line)
+
+def rebuild_index(directory):
+    """Rewrite every segment's .idx file from its .log. Returns the entries indexed"""
+    total = 0
+    for segment in segment_numbers(directory):
+        entries = array("q")
+        for offset, user_id in scan_segment(segment_path(directory, segment, "log")):
+            entries.extend((user_id, offset))
+        idx_path = segment_path(directory, segment, "idx")
+        with open(idx_path + ".tmp", "wb") as f:
+            entries.tofile(f)
+        os.replace(idx_path + ".tmp", idx_path)
+        total += len(entries) // 2
+    return total
+
+class MatchLog:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index = {}    # {user_id: array("Q") of segment << 32 | offset}, oldest first
+        self.pending = []  # (user_id, encoded line) not written yet
+        self.segments = segment_numbers(directory)
+        for segment in self.segments:
+            self._load_segment(segment, repair=segment == self.segments[-1])
+        if not self.segments:
+            self.segments.append(1)
+
+    def _path(self, segment, ext):
+        return segment_path(self.directory, segment, ext)
+
+    def _index_entry(self, user_id, segment, offset):
+        locations = self.index.get(user_id)
+        if locations is None:
+            locations = self.index[user_id] = array("Q")
+        locations.append(segment << 32 | offset)
+
+    def _load_segment(self, segment, repair=False):
+        entries = array("q")
+        idx_path = self._path(segment, "idx")
+        if os.path.exists(idx_path):
+            with open(idx_path, "rb") as f:
+                count = os.fstat(f.fileno()).st_size // (2 * entries.itemsize) * 2
+                entries.fromfile(f, count)
+        for i in range(0, len(entries), 2):
+            self._index_entry(entries[i], segment, entries[i + 1])
+        if repair:
+            self._repair(segment, entries)
+
+    def _repair(self, segment, entries):
+        """Index lines the .idx file missed, and cut off a torn last line"""
+        log_path = self._path(segment, "log")
+        with open(log_path, "rb+") as f:
+            if entries:
+                f.seek(entries[-1])
+                f.readline()
+            indexed_end = f.tell()
+            missed = array("q")
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    if line:
+                        f.truncate(offset)
+                    break
+                user_id = json.loads(line)["user_id"]
+                self._index_entry(user_id, segment, offset)
+                missed.extend((user_id, offset))
+        if missed:
+            print(f"🩹 Match log segment {segment}: indexed {len(missed) // 2} entries written after {indexed_end}")
+            with open(self._path(segment, "idx"), "r+b" if entries else "wb") as f:
+                f.seek(len(entries) * entries.itemsize)
+                f.truncate()
+                missed.tofile(f)
+
+    def append(self, user_id, entry):
+        """Queue one match for a player, written by the next flush()"""
+        user_id = int(user_id)
+        line = json.dumps({"user_id": user_id, **entry}, separators=(",", ":")) + "\n"
+        self.pending.append((user_id, line.encode()))
+
+    def flush(self):
+        """Write queued entries to the current segment, starting new ones as they fill"""
+        pending, self.pending = self.pending, []
+        written = 0
+        while written < len(pending):
+            segment = self.segments[-1]
+            entries = array("q")
+            with open(self._path(segment, "log"), "ab") as f:
+                offset = f.tell()
+                while written < len(pending) and offset < SEGMENT_BYTES:
+                    user_id, line = pending[written]
+                    f.write(line)
+                    entries.extend((user_id, offset))
+                    offset += len(line)
+                    written += 1
+            with open(self._path(segment, "idx"), "ab") as f:
+                entries.tofile(f)
+            for i in range(0, len(entries), 2):
+                self._index_entry(entries[i], segment, entries[i + 1])
+            if offset >= SEGMENT_BYTES:
+                self.segments.append(segment + 1)
+
+    def count(self, user_id):
+        return len(self.index.get(int(user_id), ()))
+
+    def page(self, user_id, page=0, per_page=10):
+        """Entries on one page of a player's matches, newest first"""
+        locations = self.index.get(int(user_id))
+        if not locations:
+            return []
+        end = len(locations) - page * per_page
+        wanted = locations[max(end - per_page, 0):max(end, 0)]
+        entries = []
+        files = {}
+        try:
+            for location in reversed(wanted):
+                segment, offset = location >> 32, location & 0xFFFFFFFF
+                f = files.get(segment)
+                if f is None:
+                    f = files[segment] = open(self._path(segment, "log"), "rb")
+                f.seek(offset)
+                entries.append(json.loads(f.readline()))
+        finally:
+            for f in files.values():
+                f.close()
+        return entries
+
+    def entry_count(self):
+        return sum(len(locations) for locations in self.index.values())
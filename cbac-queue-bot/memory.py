@@ -0,0 +1,82 @@
+"""Approximate memory accounting and tracemalloc snapshots.
+
+deep_sizeof() walks built-in containers and the given classes, but counts
+anything else (discord Members, Guilds, ...) shallowly: those are owned by
+discord.py's cache, so a lobby holding a Member is only billed for the
+reference.
+
+mark() starts tracemalloc if it isn't running and remembers a snapshot,
+diff() compares the current heap with it. Starting the bot with
+PYTHONTRACEMALLOC=1 traces from the first import instead.
+"""
+import gc
+import sys
+import tracemalloc
+from collections import deque
+
+def deep_sizeof(obj, follow=()):
+    """Bytes used by obj and everything it contains, each object counted once"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif follow and isinstance(o, follow):
+            if hasattr(o, "__dict__"):
+                stack.append(o.__dict__)
+            for slot in getattr(type(o), "__slots__", ()):
+                if hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return total
+
+def live_instances(base_class):
+    return [o for o in gc.get_objects() if isinstance(o, base_class)]
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+# ==================== TRACEMALLOC ====================
+
+marked = None  # (datetime, tracemalloc.Snapshot)
+
+def take_snapshot():
+    snapshot = tracemalloc.take_snapshot()
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+def mark(when, frames=1):
+    """Remember the heap as it is now. Returns (current, peak) traced bytes"""
+    global marked
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    marked = (when, take_snapshot())
+    return tracemalloc.get_traced_memory()
+
+def diff(limit=10, key_type="lineno"):
+    """Top `limit` allocation sites by growth since mark(), or None without a mark"""
+    if marked is None or not tracemalloc.is_tracing():
+        return None
+    stats = take_snapshot().compare_to(marked[1], key_type)
+    return stats[:limit]
+
+def stop():
+    global marked
+    marked = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
@@ -0,0 +1,221 @@
+"""Counters, gauges and histograms, served in Prometheus text format.
+
+    import metrics
+    COMMANDS = metrics.histogram("cbac_command_seconds", "Slash command latency", ["command", "status"])
+    COMMANDS.observe(0.12, command="join", status="ok")
+    metrics.start_http_server("127.0.0.1", 9108, health=..., ready=...)
+
+GET /metrics returns every registered metric, /healthz and /readyz answer
+200 or 503 from the given checks. The server runs in a daemon thread, so it
+keeps answering (and /healthz can report a stuck event loop) even when the
+bot's loop is blocked. Only the stdlib is used, so storage.py's store
+server can serve its own metrics too.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds, from a fast cache hit up to a slow REST call or a big save
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = {}  # {name: metric}, in registration order
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs += [f'{name}="{escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value):
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}  # {label values tuple: value}
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(suffix, label values, extra labels, value)]"""
+        with self.lock:
+            return [("", key, (), value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.labelnames, key, extra)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+class Gauge(Metric):
+    """A value that's set, or read from `callback` at scrape time.
+
+    callback returns a number, or {label values tuple: number} for a
+    labelled gauge.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        try:
+            result = self.callback()
+        except Exception as e:
+            print(f"[WARN] Gauge {self.name} failed: {e}")
+            return []
+        if isinstance(result, dict):
+            return [("", tuple(str(v) for v in key), (), value) for key, value in result.items()]
+        return [("", (), (), result)]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            entries = [(key, list(e["buckets"]), e["sum"], e["count"]) for key, e in self.values.items()]
+        samples = []
+        for key, buckets, total, count in entries:
+            cumulative = 0
+            for bound, n in zip(self.buckets, buckets):
+                cumulative += n
+                samples.append(("_bucket", key, (("le", format_value(bound)),), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), count))
+        return samples
+
+def register(metric):
+    """Add a metric, or return the one already registered under its name"""
+    existing = registry.get(metric.name)
+    if existing is not None:
+        return existing
+    registry[metric.name] = metric
+    return metric
+
+def counter(name, documentation, labelnames=()):
+    return register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=(), callback=None):
+    return register(Gauge(name, documentation, labelnames, callback))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return register(Histogram(name, documentation, labelnames, buckets))
+
+def render():
+    lines = []
+    for metric in list(registry.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ==================== HTTP ENDPOINT ====================
+
+def run_check(check):
+    """(ok, detail) from a check returning a bool or (bool, detail)"""
+    if check is None:
+        return True, "ok"
+    try:
+        result = check()
+    except Exception as e:
+        return False, f"check failed: {e}"
+    if isinstance(result, tuple):
+        return bool(result[0]), str(result[1])
+    return bool(result), "ok" if result else "not ready"
+
+def make_handler(health, ready):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                self.reply(200, render(), "text/plain; version=0.0.4; charset=utf-8")
+            elif path == "/healthz":
+                ok, detail = run_check(health)
+                self.reply(200 if ok else 503, detail + "\n")
+            elif path == "/readyz":
+                ok, detail = run_check(ready)
+                self.reply(200 if ok else 503, detail + "\n")
+            else:
+                self.reply(404, "not found\n")
+
+        def reply(self, status, body, content_type="text/plain; charset=utf-8"):
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would drown the console
+
+    return Handler
+
+def start_http_server(host, port, health=None, ready=None):
+    """Serve /metrics, /healthz and /readyz from a daemon thread. Returns the server"""
+    server = ThreadingHTTPServer((host, port), make_handler(health, ready))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    print(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
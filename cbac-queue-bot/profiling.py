@@ -0,0 +1,208 @@
+"""Per-invocation profiling for slash commands and view callbacks.
+
+    @app_commands.command(name="leaderboard", description="...")
+    @profiled
+    async def leaderboard(interaction): ...
+
+Every @profiled call records its wall time split into:
+- discord: time inside Discord REST calls (reported by the bot's aiohttp trace)
+- disk:    time inside disk_io() blocks, e.g. the store writing players.json
+- cpu:     CPU time of this call's own steps on the event loop
+- wait:    everything else, i.e. locks, sleeps, rate-limit backoff and the
+           loop running other tasks
+Calls slower than SLOW_COMMAND_MS are printed with that breakdown and kept
+in slow_log. start_capture() runs cProfile over the next N calls and dumps
+the combined stats to PROFILE_DIR.
+
+CPU time is measured per step of the coroutine (between two awaits), so
+other tasks interleaving with it aren't billed to it. A profiled call made
+from inside another one (start_match from a button) is timed on its own and
+also counted in the caller's totals.
+"""
+import contextvars
+import cProfile
+import functools
+import os
+import pstats
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+SLOW_COMMAND_MS = float(os.getenv("SLOW_COMMAND_MS", "1000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+current = contextvars.ContextVar("profiled_invocation", default=None)
+slow_log = deque(maxlen=50)  # Most recent slow invocations, newest last
+
+class Invocation:
+    __slots__ = ("name", "parent", "started_at", "wall", "discord", "disk", "cpu")
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.started_at = datetime.now()
+        self.wall = self.discord = self.disk = self.cpu = 0.0
+
+    def breakdown(self):
+        """{phase: seconds}, wait being whatever the other three don't explain"""
+        wait = max(0.0, self.wall - self.discord - self.disk - self.cpu)
+        return {"discord": self.discord, "disk": self.disk, "cpu": self.cpu, "wait": wait}
+
+    def summary(self):
+        parts = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.breakdown().items())
+        return f"{self.name}: {self.wall * 1000:.0f}ms ({parts})"
+
+def add_io(kind, seconds):
+    """Bill I/O time to the running invocation and every caller around it"""
+    invocation = current.get()
+    while invocation is not None:
+        setattr(invocation, kind, getattr(invocation, kind) + seconds)
+        invocation = invocation.parent
+
+def discord_io(seconds):
+    add_io("discord", seconds)
+
+@contextmanager
+def disk_io():
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_io("disk", time.perf_counter() - start)
+
+# ==================== CPROFILE CAPTURE ====================
+
+class Capture:
+    def __init__(self, count, command, path):
+        self.remaining = count   # Invocations still to start profiling
+        self.running = 0         # Profiled invocations that haven't finished
+        self.done = 0
+        self.command = command
+        self.path = path
+        self.stats = None
+
+capture = None
+last_dump = None  # Path of the last capture written, shown when there's none running
+
+def start_capture(count, command=None):
+    """Profile the next `count` invocations (of `command` only, if given). Returns the dump path"""
+    global capture
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    name = (command or "all").replace("/", "_").replace(".", "_")
+    path = os.path.join(PROFILE_DIR, f"{name}_{stamp}.prof")
+    capture = Capture(count, command, path)
+    return path
+
+def stop_capture():
+    """Stop capturing and dump whatever was collected. Returns the path or None"""
+    if capture is None:
+        return None
+    capture.remaining = 0
+    path = dump_capture() if capture.running == 0 else capture.path
+    return path
+
+def capture_status():
+    if capture is None:
+        return None
+    return {"command": capture.command, "done": capture.done,
+            "remaining": capture.remaining + capture.running, "path": capture.path}
+
+def matches_capture(name):
+    if capture is None or capture.remaining <= 0:
+        return False
+    return capture.command is None or name == capture.command or name.endswith("." + capture.command)
+
+def dump_capture():
+    global capture, last_dump
+    finished, capture = capture, None
+    if finished.stats is None:
+        return None
+    os.makedirs(os.path.dirname(finished.path) or ".", exist_ok=True)
+    finished.stats.dump_stats(finished.path)
+    last_dump = finished.path
+    print(f"📊 cProfile of {finished.done} invocations written to {finished.path}")
+    return finished.path
+
+def finish_capture(profiler):
+    if capture is None:
+        return
+    if capture.stats is None:
+        capture.stats = pstats.Stats(profiler)
+    else:
+        capture.stats.add(profiler)
+    capture.running -= 1
+    capture.done += 1
+    if capture.remaining <= 0 and capture.running == 0:
+        dump_capture()
+
+# ==================== DECORATOR ====================
+
+class Stepped:
+    """Awaitable that drives a coroutine one step at a time, timing only its own steps"""
+
+    def __init__(self, coro, invocation, profiler=None):
+        self.coro = coro
+        self.invocation = invocation
+        self.profiler = profiler
+
+    def step(self, value, error):
+        if self.profiler:
+            self.profiler.enable()
+        start = time.thread_time()
+        try:
+            if error is None:
+                return self.coro.send(value)
+            return self.coro.throw(error)
+        finally:
+            self.invocation.cpu += time.thread_time() - start
+            if self.profiler:
+                self.profiler.disable()
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            try:
+                yielded = self.step(value, error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                self.coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+def log_slow(invocation):
+    slow_log.append(invocation)
+    print(f"🐢 Slow {invocation.summary()}")
+
+def profiled(func):
+    """Record a wall time breakdown for every call of an async callback"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        parent = current.get()
+        invocation = Invocation(name, parent)
+        profiler = None
+        # Only top-level calls are profiled, cProfile can't nest
+        if parent is None and matches_capture(name):
+            capture.remaining -= 1
+            capture.running += 1
+            profiler = cProfile.Profile()
+
+        token = current.set(invocation)
+        start = time.perf_counter()
+        try:
+            return await Stepped(func(*args, **kwargs), invocation, profiler)
+        finally:
+            invocation.wall = time.perf_counter() - start
+            current.reset(token)
+            if profiler:
+                finish_capture(profiler)
+            if invocation.wall * 1000 >= SLOW_COMMAND_MS:
+                log_slow(invocation)
+
+    return wrapper
@@ -0,0 +1,70 @@
+"""Season archives: a finished season's stats and matches, gzipped and read-only.
+
+    path = write_archive(directory, season, data)
+    archive = archives.get(path)  # Loaded on first use, then LRU cached
+    archive.player(user_id), archive.top(limit)
+
+When a guild's season ends, its player stats and match ledger entries are
+written to <guild dir>/seasons/season-<n>.json.gz and dropped from memory.
+Old seasons are rarely looked at, so an archive is only read when a profile
+or leaderboard asks for it, and only the ARCHIVE_CACHE_SIZE most recently
+used stay loaded.
+"""
+import gzip
+import json
+import os
+from collections import OrderedDict
+
+ARCHIVE_CACHE_SIZE = int(os.getenv("SEASON_ARCHIVE_CACHE_SIZE", "4"))
+
+def archive_path(directory, season):
+    return os.path.join(directory, f"season-{season}.json.gz")
+
+def write_archive(directory, season, data):
+    """Write one season's archive, replacing the file only once it's complete"""
+    os.makedirs(directory, exist_ok=True)
+    path = archive_path(directory, season)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", compresslevel=6) as f:
+        # One dumps is several times faster than json.dump's many small writes
+        f.write(json.dumps(data, separators=(",", ":")))
+    if os.path.exists(path):
+        os.chmod(path, 0o644)
+    os.replace(tmp_path, path)
+    os.chmod(path, 0o444)
+    return path
+
+class SeasonArchive:
+    """A loaded archive: {user_id: stats dict} ranked by final ELO, and the season's ledger"""
+
+    def __init__(self, path):
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        self.season = data["season"]
+        self.started_at = data.get("started_at")
+        self.ended_at = data.get("ended_at")
+        self.players = data.get("players", {})
+        self.matches = data.get("matches", {})
+        self.match_count = len(self.matches)
+        self.ranking = sorted(self.players, key=lambda uid: self.players[uid].get("elo", 0), reverse=True)
+
+    def player(self, user_id):
+        return self.players.get(str(user_id))
+
+    def top(self, limit=10):
+        return [(uid, self.players[uid]) for uid in self.ranking[:limit]]
+
+class ArchiveCache:
+    def __init__(self, size=ARCHIVE_CACHE_SIZE):
+        self.size = size
+        self.archives = OrderedDict()  # {path: SeasonArchive}, least recently used first
+
+    def get(self, path):
+        archive = self.archives.get(path)
+        if archive is None:
+            archive = self.archives[path] = SeasonArchive(path)
+            while len(self.archives) > self.size:
+                self.archives.popitem(last=False)
+        else:
+            self.archives.move_to_end(path)
+        return archive
@@ -0,0 +1,1226 @@
+"""State storage shared by every bot process.
+
+The store holds player stats, the blacklist, the match ledger and the live
+lobby and party records (ids only, never discord objects). Anything that has
+to be checked and changed together, like joining a lobby that might be full,
+is a single store method, so it stays atomic however many processes call it.
+
+Backends:
+- LocalStore keeps everything in memory and saves player data to the JSON
+  files, the same way the single-process bot always has. Player stats are
+  split by guild, and a guild's are only loaded once it's used.
+- Running this file starts a store server that holds one LocalStore, and
+  connect_store() returns a proxy to it with the same methods. That way
+  several bot processes (one per shard range, see launcher.py) can share it
+  on one machine without a database.
+
+    python storage.py --port 50000
+"""
+import argparse
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+
+import memory
+import metrics
+from analytics import GuildMatches, MatchColumns, record_guild
+from backup import BACKUP_DIR, BACKUP_INTERVAL, BACKUP_KEEP, STAGING_DIR, Backups
+from export import EXPORT_PAGE_SIZE, blacklist_row, match_row, page_rows, player_row
+from matchlog import MatchLog
+import profiling
+from seasons import ArchiveCache, archive_path, write_archive
+from timeseries import EloHistory, EloSeries, Tier
+
+DATA_FILE = "players.json"  # Global player stats from before they were split by guild
+BLACKLIST_FILE = "blacklist.json"
+MATCH_HISTORY_FILE = "match_history.json"
+
+# Player stats are partitioned by guild, one directory each (see GuildPlayers)
+GUILDS_DIR = "guilds"
+PLAYERS_FILE = "players.json"
+ELO_HISTORY_FILE = "elo_history.json"
+MATCH_LOG_DIR = "match_log"
+UNASSIGNED_FILE = "unassigned.json"  # Migrated players without a guild yet
+SEASON_FILE = "season.json"
+SEASONS_DIR = "seasons"
+
+# Guilds whose players are kept in memory, least recently used dropped first
+GUILD_CACHE_SIZE = int(os.getenv("GUILD_CACHE_SIZE", "100"))
+
+# Rating changes are appended to the ELO history's journal; past this many
+# lines it's folded into the snapshot file and emptied
+HISTORY_COMPACT_LINES = int(os.getenv("HISTORY_COMPACT_LINES", "20000"))
+
+# Exports whose sorted keys are kept between pages
+EXPORT_KEYS_CACHE_SIZE = 4
+
+LOBBY_SIZE = 10
+PARTY_SIZE = 5
+
+# Secret the store server and its clients share. The server unpickles what
+# clients send, so there's no default: without it the server won't start
+STORE_AUTHKEY = os.getenv("STORE_AUTHKEY", "")
+
+SAVE_SECONDS = metrics.histogram("cbac_save_seconds", "Time spent writing a store file", ["file"])
+SAVE_BYTES = metrics.counter("cbac_save_bytes_total", "Bytes written to store files", ["file"])
+LAST_SAVE_BYTES = metrics.gauge("cbac_save_last_bytes", "Size of the last write of each store file", ["file"])
+
+# ==================== PLAYER STATS ====================
+
+class PlayerStats:
+    def __init__(self, data=None):
+        data = data or {}
+        self.elo = data.get("elo", 0)
+        self.wins = data.get("wins", 0)
+        self.losses = data.get("losses", 0)
+        self.recent_matches = data.get("recent_matches", [])  # Store last 10 matches
+        self.total_elo_gained = data.get("total_elo_gained", 0)
+        self.total_elo_lost = data.get("total_elo_lost", 0)
+        self.version = data.get("version", 0)  # Bumped on every change, for caches
+
+    def to_dict(self):
+        return {
+            "elo": self.elo,
+            "wins": self.wins,
+            "losses": self.losses,
+            "recent_matches": self.recent_matches[-10:],  # Keep last 10 matches
+            "total_elo_gained": self.total_elo_gained,
+            "total_elo_lost": self.total_elo_lost,
+            "version": self.version
+        }
+
+    def add_match_result(self, elo_change, opponent_elo=None, map_played=None, result="win"):
+        match_data = {
+            "timestamp": datetime.now().isoformat(),
+            "elo_change": elo_change,
+            "new_elo": self.elo,
+            "result": result,
+            "map": map_played
+        }
+        if opponent_elo:
+            match_data["opponent_elo"] = opponent_elo
+
+        self.recent_matches.append(match_data)
+        if len(self.recent_matches) > 10:
+            self.recent_matches.pop(0)
+
+        if elo_change > 0:
+            self.total_elo_gained += elo_change
+        else:
+            self.total_elo_lost += abs(elo_change)
+        return match_data
+
+def new_lobby_record(host_id=None):
+    return {
+        "players": [],
+        "host": host_id,
+        "is_open": True,
+        "match_started": False,
+        "channel_id": None,
+        "message_id": None,
+        "match_category_id": None,
+        "match_lobby_channel_id": None,
+        "selected_map": None,
+        "t_side": [],
+        "ct_side": [],
+        "replacements": {},
+        "lobby_id": uuid.uuid4().hex,  # Tells apart lobbies that reuse a name
+        "match_id": None,              # Set once by begin_match
+        "version": 1
+    }
+
+def match_key(guild_id, lobby_name, lobby_id):
+    """Idempotency key for starting and settling one lobby's match"""
+    return f"{guild_id}:{lobby_name}:{lobby_id}"
+
+def new_party_record(leader_id, code):
+    return {
+        "leader": leader_id,
+        "members": [leader_id],
+        "invites": [],
+        "lobby_name": None,
+        "created_at": datetime.now().isoformat(),
+        "party_code": code,
+        "version": 1
+    }
+
+# ==================== GUILD PARTITIONS ====================
+
+def load_json(path):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+def save_json(path, data, label, indent=4):
+    """Write to a temp file and swap it in, so readers (and backups) never see half a file"""
+    start = time.perf_counter()
+    with profiling.disk_io():
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, indent=indent)
+            size = f.tell()
+        os.replace(path + ".tmp", path)
+    SAVE_SECONDS.observe(time.perf_counter() - start, file=label)
+    SAVE_BYTES.inc(size, file=label)
+    LAST_SAVE_BYTES.set(size, file=label)
+
+class GuildPlayers:
+    """One guild's players: stats, ELO index, ELO history and match log.
+
+    Each guild has its own directory, so loading, saving and ranking a guild
+    never touches another guild's players:
+
+        <guilds_dir>/<guild_id>/players.json
+                                elo_history.json, elo_history.log
+                                match_log/
+                                season.json, seasons/season-<n>.json.gz
+
+    `legacy` is the store's unassigned players (see migrate_players): a
+    player found there but not here starts from those stats, until the
+    guild's first season ends.
+    """
+
+    def __init__(self, guild_id, directory, legacy=None):
+        self.guild_id = guild_id
+        self.directory = directory
+        self.legacy = legacy if legacy is not None else {}
+        os.makedirs(directory, exist_ok=True)
+        self.players_file = os.path.join(directory, PLAYERS_FILE)
+        self.history_file = os.path.join(directory, ELO_HISTORY_FILE)
+        self.history_log = os.path.splitext(self.history_file)[0] + ".log"
+        self.season_file = os.path.join(directory, SEASON_FILE)
+        self.seasons_dir = os.path.join(directory, SEASONS_DIR)
+        # {"season": n, "started_at": iso, "archived": [summary of each ended season]}
+        self.season = load_json(self.season_file) or {"season": 1, "started_at": None, "archived": []}
+        if self.season["archived"]:
+            self.legacy = {}
+        self.players = {uid: PlayerStats(stats) for uid, stats in load_json(self.players_file).items()}
+        # (elo, user_id) pairs, kept sorted for leaderboard and nearest-rating lookups
+        self.elo_index = sorted((stats.elo, uid) for uid, stats in self.players.items())
+        # Rating over time: the snapshot plus the journal of changes since
+        self.elo_history = EloHistory.from_dict(load_json(self.history_file))
+        self.history_pending = []  # Journal lines not written yet
+        self.history_log_lines = self._replay_history_log()
+        # Every player's full match list; recent_matches only keeps the last 10
+        self.match_log = MatchLog(os.path.join(directory, MATCH_LOG_DIR))
+
+    def save_players(self):
+        data = {uid: stats.to_dict() for uid, stats in self.players.items()}
+        save_json(self.players_file, data, "players")
+
+    def save(self):
+        self.save_players()
+        self.save_history()
+        self.save_match_log()
+
+    def _replay_history_log(self):
+        if not os.path.exists(self.history_log):
+            return 0
+        lines = 0
+        with open(self.history_log, "r") as f:
+            for line in f:
+                try:
+                    uid, ts, elo = line.split()
+                    self.elo_history.add(uid, float(ts), int(elo))
+                except ValueError:
+                    continue  # A line cut short by a crash
+                lines += 1
+        return lines
+
+    def save_history(self):
+        """Append pending rating changes to the journal, compacting it once it's long"""
+        if not self.history_pending:
+            return
+        start = time.perf_counter()
+        with profiling.disk_io(), open(self.history_log, "a") as f:
+            f.writelines(self.history_pending)
+            size = f.tell()
+        SAVE_SECONDS.observe(time.perf_counter() - start, file="elo_history_log")
+        SAVE_BYTES.inc(sum(len(line) for line in self.history_pending), file="elo_history_log")
+        LAST_SAVE_BYTES.set(size, file="elo_history_log")
+        self.history_log_lines += len(self.history_pending)
+        self.history_pending = []
+        if self.history_log_lines >= HISTORY_COMPACT_LINES:
+            self.compact_history()
+
+    def compact_history(self):
+        """Downsample every series, rewrite the snapshot and empty the journal"""
+        self.elo_history.roll_all(time.time())
+        save_json(self.history_file, self.elo_history.to_dict(), "elo_history", indent=None)
+        # A new empty file rather than truncating, so a backup pinning the old journal keeps it
+        with profiling.disk_io():
+            open(self.history_log + ".tmp", "w").close()
+            os.replace(self.history_log + ".tmp", self.history_log)
+        self.history_log_lines = 0
+
+    def save_match_log(self):
+        if not self.match_log.pending:
+            return
+        start = time.perf_counter()
+        size = sum(len(line) for _, line in self.match_log.pending)
+        with profiling.disk_io():
+            self.match_log.flush()
+        SAVE_SECONDS.observe(time.perf_counter() - start, file="match_log")
+        SAVE_BYTES.inc(size, file="match_log")
+
+    def _index_remove(self, user_id, elo):
+        entry = (elo, user_id)
+        pos = bisect.bisect_left(self.elo_index, entry)
+        if pos < len(self.elo_index) and self.elo_index[pos] == entry:
+            del self.elo_index[pos]
+
+    def _index_add(self, user_id, elo):
+        bisect.insort(self.elo_index, (elo, user_id))
+
+    def stats(self, str_id, create=True):
+        """This player's PlayerStats, created (from legacy stats if there are any) when missing"""
+        stats = self.players.get(str_id)
+        if stats is None and create:
+            stats = self.players[str_id] = PlayerStats(self.legacy.get(str_id))
+            self._index_add(str_id, stats.elo)
+        return stats
+
+    def apply_elo(self, str_id, change, match_info=None, match_id=None):
+        stats = self.stats(str_id)
+
+        # If player has 0 ELO and change is negative, don't deduct
+        if stats.elo == 0 and change < 0:
+            change = 0  # No deduction for 0 ELO players
+
+        old_elo = stats.elo
+        stats.elo += change
+        stats.version += 1
+        if change:
+            self._index_remove(str_id, old_elo)
+            self._index_add(str_id, stats.elo)
+            self._record_elo(str_id, stats.elo)
+
+        # Update win/loss counts
+        if change > 0:
+            stats.wins += 1
+            result = "win"
+        elif change < 0:
+            stats.losses += 1
+            result = "loss"
+        else:
+            result = "draw"
+
+        # Store match in history
+        if match_info:
+            match_data = stats.add_match_result(change, match_info.get("opponent_elo"),
+                                                match_info.get("map"), result)
+            if match_id:
+                match_data = dict(match_data, match_id=match_id)
+            self.match_log.append(str_id, match_data)
+
+        return old_elo, change
+
+    def save_season(self):
+        save_json(self.season_file, self.season, "season")
+
+    def reset_ratings(self, carryover):
+        """Start every player over at carryover * their ELO. Players left at 0
+        are dropped, they're recreated on their next match.
+        Returns [(user_id, old_elo, new_elo)]"""
+        changes = []
+        players = {}
+        for uid, stats in self.players.items():
+            new_elo = int(stats.elo * carryover)
+            changes.append((uid, stats.elo, new_elo))
+            if new_elo:
+                players[uid] = PlayerStats({"elo": new_elo, "version": stats.version + 1})
+            if new_elo != stats.elo:
+                self._record_elo(uid, new_elo)
+        self.players = players
+        self.elo_index = sorted((stats.elo, uid) for uid, stats in players.items())
+        self.legacy = {}
+        self.save_players()
+        self.save_history()
+        return changes
+
+    def _record_elo(self, str_id, elo):
+        ts = round(time.time(), 3)
+        if not self.elo_history.add(str_id, ts, elo):
+            # Two changes in the same millisecond, keep both in order
+            ts = round(self.elo_history.series[str_id].last_time() + 0.001, 3)
+            self.elo_history.add(str_id, ts, elo)
+        self.history_pending.append(f"{str_id} {ts} {elo}\n")
+
+def migrate_players(players_file, guilds_dir, matches):
+    """Split a global players.json into guild partitions. Returns the unassigned players.
+
+    A player is copied into every guild the match ledger has them playing
+    in, and their recent matches start that guild's match log. Players
+    without a recorded match are kept in unassigned.json and start from
+    those stats the first time they show up in any guild. The old file is
+    renamed to <name>.migrated, not deleted.
+    """
+    legacy = load_json(players_file)
+    guilds_of = {}
+    for match_id, record in matches.items():
+        guild_id = record_guild(match_id, record)
+        if not guild_id:
+            continue
+        for uid in record.get("winning_side", []) + record.get("losing_side", []):
+            guilds_of.setdefault(str(uid), set()).add(guild_id)
+
+    partitions, unassigned = {}, {}
+    for uid, data in legacy.items():
+        guild_ids = guilds_of.get(uid)
+        if not guild_ids:
+            unassigned[uid] = data
+        for guild_id in guild_ids or ():
+            partitions.setdefault(guild_id, {})[uid] = data
+
+    os.makedirs(guilds_dir, exist_ok=True)
+    for guild_id, players in partitions.items():
+        partition = GuildPlayers(guild_id, os.path.join(guilds_dir, str(guild_id)))
+        for uid, data in players.items():
+            stats = partition.players[uid] = PlayerStats(data)
+            for match in stats.recent_matches:
+                partition.match_log.append(uid, match)
+        partition.save_players()
+        partition.save_match_log()
+    save_json(os.path.join(guilds_dir, UNASSIGNED_FILE), unassigned, "players")
+    os.replace(players_file, players_file + ".migrated")
+    print(f"📦 Split {len(legacy)} players from {players_file} into {len(partitions)} guilds "
+          f"({len(unassigned)} without matches kept in {UNASSIGNED_FILE})")
+    return unassigned
+
+def blacklist_key(user_id, entry):
+    """Sort key of a blacklist entry: (0, expiry timestamp, id) for timed bans,
+    (1, 0, id) for permanent ones and (2, 0, id) if the expiry can't be read"""
+    expires_at = entry.get("expires_at")
+    if expires_at == "permanent":
+        return (1, 0, user_id)
+    try:
+        return (0, datetime.fromisoformat(expires_at).timestamp(), user_id)
+    except (TypeError, ValueError):
+        return (2, 0, user_id)
+
+# ==================== LOCAL STORE ====================
+
+class LocalStore:
+    """In-process store, persisted to per-guild player files and the blacklist
+    and match ledger JSON files.
+
+    Every public method takes the lock, so a LocalStore served to several
+    processes behaves the same as one used directly. Player methods take the
+    guild first: ratings are per guild, and a guild's players are loaded the
+    first time they're needed and dropped again past GUILD_CACHE_SIZE, least
+    recently used first.
+    """
+
+    def __init__(self, guilds_dir=GUILDS_DIR, blacklist_file=BLACKLIST_FILE, matches_file=MATCH_HISTORY_FILE,
+                 players_file=DATA_FILE):
+        self.guilds_dir = guilds_dir
+        self.blacklist_file = blacklist_file
+        self.matches_file = matches_file
+        self.lock = threading.RLock()
+        self.backup_lock = threading.Lock()  # One backup at a time, without blocking the store
+        self.blacklist = load_json(blacklist_file)
+        # blacklist_key of every entry, sorted: soonest expiry first, permanent bans last
+        self.blacklist_index = sorted(blacklist_key(uid, entry) for uid, entry in self.blacklist.items())
+        self.matches = load_json(matches_file)
+        # Each guild's ledger keys, in ledger order: {guild_id: {match_id: None}}
+        self.guild_match_ids = {}
+        for match_id, record in self.matches.items():
+            self.guild_match_ids.setdefault(record_guild(match_id, record), {})[match_id] = None
+        self.match_columns = MatchColumns()  # Per-guild stats tables over self.matches
+        # Sorted keys an export pages through: {(kind, guild_id, season): [key]}, least recently used first
+        self.export_keys = OrderedDict()
+
+        # Player stats by guild: {guild_id: GuildPlayers}, least recently used first
+        self.partitions = OrderedDict()
+        self.archives = ArchiveCache()  # Ended seasons, loaded when queried
+        self.seasons_ending = set()  # Guilds whose season archive is being written
+        unassigned_file = os.path.join(guilds_dir, UNASSIGNED_FILE)
+        if os.path.exists(players_file) and not os.path.exists(unassigned_file):
+            self.unassigned = migrate_players(players_file, guilds_dir, self.matches)
+        else:
+            os.makedirs(guilds_dir, exist_ok=True)
+            self.unassigned = load_json(unassigned_file)
+
+        # Live guild state: {guild_id: {lobby_name: record}} and {guild_id: {leader_id: record}}
+        self.lobbies = {}
+        self.parties = {}
+        # {guild_id: {party_code: leader_id}} and {guild_id: {user_id: leader_id}}
+        self.party_codes = {}
+        self.party_of = {}
+
+    def save_blacklist(self):
+        save_json(self.blacklist_file, self.blacklist, "blacklist")
+
+    def save_matches(self):
+        save_json(self.matches_file, self.matches, "matches")
+
+    def _guild_ledger(self, guild_id):
+        """{match_id: record} of one guild's ledger entries, without scanning the others"""
+        return {match_id: self.matches[match_id] for match_id in self.guild_match_ids.get(guild_id, ())}
+
+    def _guild(self, guild_id):
+        """This guild's GuildPlayers, loading it if needed"""
+        guild_id = int(guild_id)
+        partition = self.partitions.get(guild_id)
+        if partition is None:
+            directory = os.path.join(self.guilds_dir, str(guild_id))
+            partition = self.partitions[guild_id] = GuildPlayers(guild_id, directory, self.unassigned)
+            while len(self.partitions) > GUILD_CACHE_SIZE:
+                _, evicted = self.partitions.popitem(last=False)
+                evicted.save()  # Normally a no-op, every change is saved as it's made
+        else:
+            self.partitions.move_to_end(guild_id)
+        return partition
+
+    # ---------- players ----------
+
+    def get_player(self, guild_id, user_id):
+        str_id = str(user_id)
+        with self.lock:
+            partition = self._guild(guild_id)
+            if str_id not in partition.players:
+                partition.stats(str_id)
+                partition.save_players()
+            return partition.players[str_id]
+
+    def has_player(self, guild_id, user_id):
+        with self.lock:
+            return str(user_id) in self._guild(guild_id).players
+
+    def player_count(self, guild_id=None):
+        """Players in this guild, or in every guild currently loaded"""
+        with self.lock:
+            if guild_id is not None:
+                return len(self._guild(guild_id).players)
+            return sum(len(p.players) for p in self.partitions.values())
+
+    def player_version(self, guild_id, user_id):
+        """Stats version, cheaper than get_player when only checking for changes"""
+        with self.lock:
+            stats = self._guild(guild_id).players.get(str(user_id))
+            return stats.version if stats else 0
+
+    def update_elo(self, guild_id, user_id, change, match_info=None):
+        """Update ELO with protection for 0 ELO players"""
+        with self.lock:
+            partition = self._guild(guild_id)
+            old_elo, change = partition.apply_elo(str(user_id), change, match_info)
+            partition.save()
+            return old_elo, change
+
+    def apply_match_deltas(self, guild_id, match_id, deltas, match_record=None):
+        """Apply every player's ELO change for one match in a single step.
+
+        deltas is [(user_id, change, match_info)]. match_id is the settlement's
+        idempotency key: the match is recorded in the ledger under it, and a
+        match that's already there isn't applied again (returns None).
+        Players are saved once for the whole match. Returns
+        [(user_id, old_elo, change, new_elo)].
+        """
+        with self.lock:
+            if match_id in self.matches:
+                return None
+            partition = self._guild(guild_id)
+            results = []
+            for user_id, change, match_info in deltas:
+                old_elo, applied = partition.apply_elo(str(user_id), change, match_info, match_id)
+                results.append((str(user_id), old_elo, applied, old_elo + applied))
+            partition.save()
+            self.matches[match_id] = match_record if match_record is not None else {}
+            self.guild_match_ids.setdefault(record_guild(match_id, self.matches[match_id]), {})[match_id] = None
+            self.match_columns.add(match_id, self.matches[match_id])
+            self.save_matches()
+            return results
+
+    def elo_history_range(self, guild_id, user_id, since=None, until=None):
+        """[(timestamp, low, high, close)] of a player's rating, oldest first.
+        Recent points are single changes (low == high == close), older ones daily or weekly buckets"""
+        with self.lock:
+            return self._guild(guild_id).elo_history.range(str(user_id), since, until)
+
+    def compact_history(self, guild_id):
+        with self.lock:
+            self._guild(guild_id).compact_history()
+
+    def match_history_page(self, guild_id, user_id, page=0, per_page=10):
+        """([entry], total) for one page of a player's matches, newest first.
+        Entries of matches that were corrected afterwards have "corrected": True"""
+        with self.lock:
+            match_log = self._guild(guild_id).match_log
+            entries = match_log.page(user_id, page, per_page)
+            for entry in entries:
+                match = self.matches.get(entry.get("match_id"))
+                entry["corrected"] = bool(match and match.get("corrected_at"))
+            return entries, match_log.count(user_id)
+
+    def top_players(self, guild_id, limit=10):
+        """[(user_id, PlayerStats)] with the highest ELO in this guild first"""
+        with self.lock:
+            partition = self._guild(guild_id)
+            top = partition.elo_index[-limit:] if limit else []
+            return [(uid, partition.players[uid]) for elo, uid in reversed(top)]
+
+    def player_elos(self, guild_id, user_ids):
+        """{user_id: elo} in this guild, keyed by the ids as given. Players
+        without stats count as 0 ELO, or their unassigned rating"""
+        with self.lock:
+            players = self._guild(guild_id).players
+            elos = {}
+            for user_id in user_ids:
+                stats = players.get(str(user_id))
+                elos[user_id] = stats.elo if stats else self.unassigned.get(str(user_id), {}).get("elo", 0)
+            return elos
+
+    # ---------- seasons ----------
+
+    def end_season(self, guild_id, carryover=0.0):
+        """Archive this guild's season and start the next one.
+
+        The players' stats and the guild's ledger entries go to a gzipped,
+        read-only archive and leave memory; every player then starts over at
+        carryover * their ELO (0 for a hard reset). The match log and ELO
+        history carry on across seasons. Returns (ended season, [(user_id,
+        old_elo, new_elo)]), or (None, []) if the season is already ending.
+
+        The lock isn't held while the archive is compressed and written:
+        the season is copied first and only reset once the archive is on
+        disk, so a crash in between leaves it as it was. Matches settled in
+        the meantime count towards the next season."""
+        with self.lock:
+            partition = self._guild(guild_id)
+            if partition.guild_id in self.seasons_ending:
+                return None, []
+            self.seasons_ending.add(partition.guild_id)
+            meta = partition.season
+            season = meta["season"]
+            guild_matches = {match_id: dict(record)
+                             for match_id, record in self._guild_ledger(partition.guild_id).items()}
+            ended_at = datetime.now().isoformat()
+            archive = {
+                "guild_id": partition.guild_id,
+                "season": season,
+                "started_at": meta["started_at"],
+                "ended_at": ended_at,
+                "carryover": carryover,
+                "players": {uid: stats.to_dict() for uid, stats in partition.players.items()},
+                "matches": guild_matches
+            }
+        try:
+            write_archive(partition.seasons_dir, season, archive)
+            with self.lock:
+                partition = self._guild(guild_id)
+                meta = partition.season
+                match_ids = self.guild_match_ids.get(partition.guild_id, {})
+                for match_id in guild_matches:
+                    self.matches.pop(match_id, None)
+                    match_ids.pop(match_id, None)
+                self.match_columns.drop(partition.guild_id)
+                self.save_matches()
+
+                changes = partition.reset_ratings(carryover)
+                meta["archived"].append({"season": season, "started_at": meta["started_at"], "ended_at": ended_at,
+                                         "players": len(archive["players"]), "matches": len(guild_matches)})
+                meta["season"] = season + 1
+                meta["started_at"] = ended_at
+                partition.save_season()
+                return season, changes
+        finally:
+            with self.lock:
+                self.seasons_ending.discard(partition.guild_id)
+
+    def seasons(self, guild_id):
+        """(current season number, [summary of each ended season])"""
+        with self.lock:
+            meta = self._guild(guild_id).season
+            return meta["season"], [dict(summary) for summary in meta["archived"]]
+
+    def _archive(self, guild_id, season):
+        partition = self._guild(guild_id)
+        if not any(summary["season"] == season for summary in partition.season["archived"]):
+            return None
+        return self.archives.get(archive_path(partition.seasons_dir, season))
+
+    def season_player(self, guild_id, season, user_id):
+        """A player's final PlayerStats in an ended season, None if they didn't play it"""
+        with self.lock:
+            archive = self._archive(guild_id, season)
+            data = archive.player(user_id) if archive else None
+            return PlayerStats(data) if data is not None else None
+
+    def season_top(self, guild_id, season, limit=10):
+        """[(user_id, PlayerStats)] of an ended season's final standings, None if there's no such season"""
+        with self.lock:
+            archive = self._archive(guild_id, season)
+            if archive is None:
+                return None
+            return [(uid, PlayerStats(data)) for uid, data in archive.top(limit)]
+
+    # ---------- backups ----------
+
+    def backup(self, directory=BACKUP_DIR, keep=BACKUP_KEEP):
+        """Take an incremental backup of every data file (see backup.py) and prune
+        old ones. The lock is only held while the files are pinned. Returns the
+        backup's name, or None if another backup is still running"""
+        if not self.backup_lock.acquire(blocking=False):
+            return None
+        try:
+            staging = os.path.join(os.path.dirname(os.path.abspath(self.guilds_dir)), STAGING_DIR)
+            backups = Backups(directory, staging)
+            with self.lock:
+                pinned = backups.pin([self.guilds_dir, self.matches_file, self.blacklist_file])
+            name = backups.write(pinned)
+            dropped, _ = backups.prune(keep)
+            print(f"💾 Backup {name}: {len(pinned)} files, {memory.format_bytes(backups.written)} copied"
+                  f"{f', {dropped} old backups pruned' if dropped else ''}")
+            return name
+        finally:
+            self.backup_lock.release()
+
+    # ---------- exports ----------
+
+    def export_page(self, kind, guild_id=None, season=None, since=None, until=None, cursor=None,
+                    limit=EXPORT_PAGE_SIZE):
+        """One page of export rows (see export.py): (rows, next cursor or None).
+
+        Players and matches come from guild_id's live season, or from an ended
+        season's archive (None if there's no such season); the blacklist is
+        bot-wide. The cursor is the last key of the previous page (None for
+        the first): keys are sorted once when an export starts, without the
+        lock, so each page starts with a bisect, and players, matches or bans
+        added or removed meanwhile don't shift the rest."""
+        with self.lock:
+            source = self._export_source(kind, guild_id, season)
+            if source is None:
+                return None
+            cache_key, items, get, make_row = source
+            keys = self.export_keys.get(cache_key) if cursor is not None else None
+            unsorted = keys is None
+            if unsorted:
+                keys = list(items)
+        if unsorted:
+            keys.sort()
+        with self.lock:
+            self.export_keys[cache_key] = keys
+            self.export_keys.move_to_end(cache_key)
+            while len(self.export_keys) > EXPORT_KEYS_CACHE_SIZE:
+                self.export_keys.popitem(last=False)
+            return page_rows(keys, get, make_row, kind, cursor, limit, since, until)
+
+    def _export_source(self, kind, guild_id, season):
+        """(cache key, items keyed like the export, get(key), make_row(key, item)), None if there's no such season"""
+        if kind == "blacklist":
+            return (kind, None, None), self.blacklist, self.blacklist.get, blacklist_row
+        partition = self._guild(guild_id)
+        guild_id = partition.guild_id
+        if season is None or season == partition.season["season"]:
+            season = partition.season["season"]
+            players = partition.players
+            matches = self.matches
+            match_ids = self.guild_match_ids.get(guild_id, {})
+
+            def get_player(uid):
+                stats = players.get(uid)
+                return vars(stats) if stats else None
+        else:
+            archive = self._archive(guild_id, season)
+            if archive is None:
+                return None
+            players = archive.players
+            get_player = players.get
+            matches = match_ids = archive.matches
+        if kind == "players":
+            return ((kind, guild_id, season), players, get_player,
+                    lambda uid, stats: player_row(guild_id, season, uid, stats))
+        return ((kind, guild_id, season), match_ids, matches.get,
+                lambda match_id, record: match_row(guild_id, season, match_id, record))
+
+    # ---------- match ledger ----------
+
+    def find_match(self, guild_id, lobby_name):
+        """(match_id, record) of the most recent match played in this guild's lobby_name"""
+        with self.lock:
+            for match_id in reversed(list(self.guild_match_ids.get(guild_id, ()))):
+                match = self.matches[match_id]
+                if match.get("corrected_at"):
+                    continue
+                if match.get("lobby_name") == lobby_name and match.get("guild_id", guild_id) == guild_id:
+                    return match_id, dict(match)
+        return None, None
+
+    def mark_match_corrected(self, match_id):
+        """Claim a match for correction. False if it's gone or already corrected,
+        so a result is only ever corrected once"""
+        with self.lock:
+            match = self.matches.get(match_id)
+            if match is None or match.get("corrected_at"):
+                return False
+            match["corrected_at"] = datetime.now().isoformat()
+            self.match_columns.flip(match_id, match)
+            self.save_matches()
+            return True
+
+    # ---------- match analytics ----------
+
+    def _match_table(self, guild_id):
+        """This guild's GuildMatches, built from its ledger entries only if it isn't cached"""
+        return self.match_columns.guild(guild_id, lambda: self._guild_ledger(guild_id))
+
+    def map_stats(self, guild_id):
+        """{map: [matches, T wins, CT wins]} over this guild's match history"""
+        with self.lock:
+            return self._match_table(guild_id).map_stats()
+
+    def player_match_stats(self, guild_id, user_id):
+        """({map: [played, wins]}, {"T"|"CT": [played, wins]}) for one player"""
+        with self.lock:
+            return self._match_table(guild_id).player_stats(user_id)
+
+    def head_to_head(self, guild_id, user_id, other_id):
+        """{"against": [matches, user_id's wins], "together": [matches, wins]}"""
+        with self.lock:
+            return self._match_table(guild_id).head_to_head(user_id, other_id)
+
+    # ---------- lobbies ----------
+
+    @staticmethod
+    def _bump(record):
+        record["version"] = record.get("version", 0) + 1
+
+    def _lobby(self, guild_id, name):
+        return self.lobbies.get(guild_id, {}).get(name)
+
+    def get_lobbies(self, guild_id):
+        """{lobby_name: record} copies for one guild"""
+        with self.lock:
+            return {name: dict(record) for name, record in self.lobbies.get(guild_id, {}).items()}
+
+    def get_lobby(self, guild_id, name):
+        with self.lock:
+            record = self._lobby(guild_id, name)
+            return dict(record) if record else None
+
+    def create_lobby(self, guild_id, name, host_id):
+        """Create an open lobby, False if the name is taken in this guild"""
+        with self.lock:
+            guild_lobbies = self.lobbies.setdefault(guild_id, {})
+            if name in guild_lobbies:
+                return False
+            guild_lobbies[name] = new_lobby_record(host_id)
+            return True
+
+    def update_lobby(self, guild_id, name, fields):
+        with self.lock:
+            record = self._lobby(guild_id, name)
+            if record is None:
+                return None
+            record.update(fields)
+            self._bump(record)
+            return dict(record)
+
+    def begin_match(self, guild_id, name, min_players=LOBBY_SIZE):
+        """Mark a full lobby's match as started, once.
+
+        Returns (match_id, reason). Only the first caller gets reason "ok";
+        later ones get "started", so the match is only set up once however
+        many start clicks arrive. match_id doubles as the settlement key for
+        apply_match_deltas.
+        """
+        with self.lock:
+            record = self._lobby(guild_id, name)
+            if record is None:
+                return None, "missing"
+            if record["match_started"]:
+                return record["match_id"], "started"
+            if len(record["players"]) < min_players:
+                return None, "not_full"
+            record["match_started"] = True
+            record["match_id"] = match_key(guild_id, name, record["lobby_id"])
+            self._bump(record)
+            return record["match_id"], "ok"
+
+    def join_if_not_full(self, guild_id, name, user_ids, capacity=LOBBY_SIZE):
+        """Add all of user_ids to an open lobby, or none of them.
+
+        Returns (ok, reason), reason being "ok", "closed", "already_in" or "full".
+        """
+        with self.lock:
+            record = self._lobby(guild_id, name)
+            if record is None or not record["is_open"]:
+                return False, "closed"
+            if any(user_id in record["players"] for user_id in user_ids):
+                return False, "already_in"
+            if len(record["players"]) + len(user_ids) > capacity:
+                return False, "full"
+            record["players"] = record["players"] + list(user_ids)
+            self._bump(record)
+            return True, "ok"
+
+    def leave_lobby(self, guild_id, name, user_ids):
+        """Remove user_ids from a lobby (and as host). Returns how many were in it"""
+        with self.lock:
+            record = self._lobby(guild_id, name)
+            if record is None:
+                return 0
+            remaining = [p for p in record["players"] if p not in user_ids]
+            removed = len(record["players"]) - len(remaining)
+            record["players"] = remaining
+            if record["host"] in user_ids:
+                record["host"] = None
+            self._bump(record)
+            return removed
+
+    def replace_in_lobby(self, guild_id, name, old_id, new_id):
+        """Swap a player in a started match, keeping the side.
+
+        Returns "T-SIDE" or "CT-SIDE", or None if the swap isn't possible.
+        """
+        with self.lock:
+            record = self._lobby(guild_id, name)
+            if (record is None or not record["match_started"]
+                    or new_id in record["players"] or old_id not in record["players"]):
+                return None
+            if old_id in record["t_side"]:
+                side, team = "t_side", "T-SIDE"
+            elif old_id in record["ct_side"]:
+                side, team = "ct_side", "CT-SIDE"
+            else:
+                return None
+            record["players"] = [p for p in record["players"] if p != old_id] + [new_id]
+            record[side] = [p for p in record[side] if p != old_id] + [new_id]
+            record["replacements"] = dict(record["replacements"], **{str(old_id): str(new_id)})
+            self._bump(record)
+            return team
+
+    def delete_lobby(self, guild_id, name):
+        """Remove a lobby and unqueue any party queued for it. Returns the record"""
+        with self.lock:
+            record = self.lobbies.get(guild_id, {}).pop(name, None)
+            for party in self.parties.get(guild_id, {}).values():
+                if party["lobby_name"] == name:
+                    party["lobby_name"] = None
+                    self._bump(party)
+            return record
+
+    def lobby_stats(self, guild_ids):
+        """Lobby, queued player and party counts over these guilds, for metrics"""
+        with self.lock:
+            stats = {"open": 0, "started": 0, "queued_players": 0, "parties": 0}
+            for gid in guild_ids:
+                for record in self.lobbies.get(gid, {}).values():
+                    stats["started" if record["match_started"] else "open"] += 1
+                    if not record["match_started"]:
+                        stats["queued_players"] += len(record["players"])
+                stats["parties"] += len(self.parties.get(gid, {}))
+            return stats
+
+    # ---------- parties ----------
+
+    def get_parties(self, guild_id):
+        """{leader_id: record} copies for one guild"""
+        with self.lock:
+            return {leader: dict(record) for leader, record in self.parties.get(guild_id, {}).items()}
+
+    def get_party(self, guild_id, leader_id):
+        with self.lock:
+            record = self.parties.get(guild_id, {}).get(leader_id)
+            return dict(record) if record else None
+
+    def claim_party_code(self, guild_id, code, leader_id):
+        """Create a party for leader_id under code.
+
+        Fails with None if the code is taken or the leader is already in a
+        party, so two leaders can never end up sharing a code.
+        """
+        with self.lock:
+            codes = self.party_codes.setdefault(guild_id, {})
+            party_of = self.party_of.setdefault(guild_id, {})
+            if code in codes or leader_id in party_of:
+                return None
+            record = new_party_record(leader_id, code)
+            codes[code] = leader_id
+            party_of[leader_id] = leader_id
+            self.parties.setdefault(guild_id, {})[leader_id] = record
+            return dict(record)
+
+    def join_party(self, guild_id, code, user_id, max_size=PARTY_SIZE):
+        """Join the party with this code. Returns (ok, reason, leader_id)"""
+        with self.lock:
+            leader_id = self.party_codes.get(guild_id, {}).get(code)
+            if leader_id is None:
+                return False, "invalid_code", None
+            party_of = self.party_of.setdefault(guild_id, {})
+            if user_id in party_of:
+                return False, "already_in_party", party_of[user_id]
+            record = self.parties[guild_id][leader_id]
+            if len(record["members"]) >= max_size:
+                return False, "full", leader_id
+            record["members"] = record["members"] + [user_id]
+            party_of[user_id] = leader_id
+            self._bump(record)
+            return True, "ok", leader_id
+
+    def disband_party(self, guild_id, leader_id):
+        with self.lock:
+            record = self.parties.get(guild_id, {}).pop(leader_id, None)
+            if record is None:
+                return None
+            self.party_codes.get(guild_id, {}).pop(record["party_code"], None)
+            party_of = self.party_of.get(guild_id, {})
+            for member_id in record["members"]:
+                party_of.pop(member_id, None)
+            return record
+
+    def leave_party(self, guild_id, user_id):
+        """Leave a party, disbanding it if the leader leaves.
+
+        Returns (leader_id, disbanded), leader_id None if not in a party.
+        """
+        with self.lock:
+            leader_id = self.party_of.get(guild_id, {}).get(user_id)
+            if leader_id is None:
+                return None, False
+            if user_id == leader_id:
+                self.disband_party(guild_id, leader_id)
+                return leader_id, True
+            record = self.parties[guild_id][leader_id]
+            record["members"] = [m for m in record["members"] if m != user_id]
+            del self.party_of[guild_id][user_id]
+            self._bump(record)
+            return leader_id, False
+
+    def set_party_lobby(self, guild_id, leader_id, lobby_name):
+        with self.lock:
+            record = self.parties.get(guild_id, {}).get(leader_id)
+            if record is None:
+                return False
+            record["lobby_name"] = lobby_name
+            self._bump(record)
+            return True
+
+    # ---------- snapshots ----------
+
+    def dump_guild_state(self, guild_ids):
+        """Lobby and party records for these guilds, for snapshotting"""
+        with self.lock:
+            return {
+                "lobbies": {gid: self.get_lobbies(gid) for gid in guild_ids if self.lobbies.get(gid)},
+                "parties": {gid: self.get_parties(gid) for gid in guild_ids if self.parties.get(gid)}
+            }
+
+    def load_guild_state(self, state):
+        """Load snapshotted records, keeping any the store already has"""
+        with self.lock:
+            for gid, guild_lobbies in state.get("lobbies", {}).items():
+                existing = self.lobbies.setdefault(int(gid), {})
+                for name, record in guild_lobbies.items():
+                    record.setdefault("version", 1)
+                    record.setdefault("lobby_id", uuid.uuid4().hex)
+                    record.setdefault("match_id", None)
+                    existing.setdefault(name, record)
+            for gid, guild_parties in state.get("parties", {}).items():
+                gid = int(gid)
+                codes = self.party_codes.setdefault(gid, {})
+                party_of = self.party_of.setdefault(gid, {})
+                for record in guild_parties.values():
+                    leader_id = record["leader"]
+                    if (leader_id in self.parties.get(gid, {}) or record["party_code"] in codes
+                            or any(m in party_of for m in record["members"])):
+                        continue
+                    record.setdefault("version", 1)
+                    self.parties.setdefault(gid, {})[leader_id] = record
+                    codes[record["party_code"]] = leader_id
+                    for member_id in record["members"]:
+                        party_of[member_id] = leader_id
+
+    def memory_stats(self):
+        """{structure: (entries, approx bytes)}, sized where the store lives"""
+        with self.lock:
+            partitions = list(self.partitions.values())
+            structures = {
+                "players": ([p.players for p in partitions], sum(len(p.players) for p in partitions)),
+                "elo_index": ([p.elo_index for p in partitions], sum(len(p.elo_index) for p in partitions)),
+                "unassigned_players": (self.unassigned, len(self.unassigned)),
+                "blacklist": (self.blacklist, len(self.blacklist)),
+                "blacklist_index": (self.blacklist_index, len(self.blacklist_index)),
+                "matches": (self.matches, len(self.matches)),
+                "match_columns": (self.match_columns, sum(len(t) for t in self.match_columns.guilds.values())),
+                "elo_history": ([p.elo_history for p in partitions],
+                                sum(p.elo_history.point_count() for p in partitions)),
+                "match_log_index": ([p.match_log.index for p in partitions],
+                                    sum(p.match_log.entry_count() for p in partitions)),
+                "store_lobbies": (self.lobbies, sum(len(l) for l in self.lobbies.values())),
+                "store_parties": (self.parties, sum(len(p) for p in self.parties.values())),
+                "party_codes": ((self.party_codes, self.party_of), sum(len(c) for c in self.party_codes.values())),
+            }
+            return {name: (count, memory.deep_sizeof(obj, follow=(PlayerStats, MatchColumns, GuildMatches,
+                                                                   EloHistory, EloSeries, Tier)))
+                    for name, (obj, count) in structures.items()}
+
+    # ---------- blacklist ----------
+
+    def is_blacklisted(self, user_id):
+        """Check if a user is blacklisted, dropping the entry once it expired"""
+        str_id = str(user_id)
+        with self.lock:
+            if str_id not in self.blacklist:
+                return False
+
+            expires_at = self.blacklist[str_id].get("expires_at")
+
+            # Check if permanent ban
+            if expires_at == "permanent":
+                return True
+
+            # Check if temporary ban has expired
+            if expires_at:
+                try:
+                    expire_time = datetime.fromisoformat(expires_at)
+                    if datetime.now() > expire_time:
+                        # Ban expired, remove from blacklist
+                        self.remove_from_blacklist(str_id)
+                        return False
+                except ValueError:
+                    pass
+
+            return True
+
+    def blacklisted_ids(self, user_ids):
+        """The user_ids whose ban is still in force. Unlike is_blacklisted this
+        never drops expired entries, so it only reads"""
+        active = (0, time.time())
+        with self.lock:
+            return {user_id for user_id in user_ids if str(user_id) in self.blacklist
+                    and blacklist_key(str(user_id), self.blacklist[str(user_id)]) >= active}
+
+    def get_blacklist_info(self, user_id):
+        with self.lock:
+            entry = self.blacklist.get(str(user_id))
+            return dict(entry) if entry else None
+
+    def _blacklist_index_remove(self, str_id):
+        key = blacklist_key(str_id, self.blacklist[str_id])
+        pos = bisect.bisect_left(self.blacklist_index, key)
+        if pos < len(self.blacklist_index) and self.blacklist_index[pos] == key:
+            del self.blacklist_index[pos]
+
+    def add_to_blacklist(self, user_id, entry):
+        str_id = str(user_id)
+        with self.lock:
+            if str_id in self.blacklist:
+                self._blacklist_index_remove(str_id)
+            self.blacklist[str_id] = entry
+            bisect.insort(self.blacklist_index, blacklist_key(str_id, entry))
+            self.save_blacklist()
+        return True
+
+    def remove_from_blacklist(self, user_id):
+        str_id = str(user_id)
+        with self.lock:
+            if str_id in self.blacklist:
+                self._blacklist_index_remove(str_id)
+                del self.blacklist[str_id]
+                self.save_blacklist()
+                return True
+        return False
+
+    def blacklist_page(self, status=None, admin_id=None, page=0, per_page=5):
+        """One page of the blacklist sorted by expiry, soonest first and permanent
+        bans last: ([(user_id, entry)], entries matching the filters).
+
+        status is None for every entry, "active" for bans still in force,
+        "expired" for ones past their expiry (dropped on their next check) or
+        "permanent"; admin_id keeps the bans that admin issued. The status
+        filters are slices of the index; only admin_id scans."""
+        with self.lock:
+            index = self.blacklist_index
+            expired_end = bisect.bisect_left(index, (0, time.time()))
+            bounds = {
+                None: (0, len(index)),
+                "active": (expired_end, len(index)),
+                "expired": (0, expired_end),
+                "permanent": (bisect.bisect_left(index, (1,)), bisect.bisect_left(index, (2,))),
+            }
+            start, end = bounds[status]
+            if admin_id is None:
+                total = end - start
+                keys = index[start + page * per_page:min(start + (page + 1) * per_page, end)]
+            else:
+                admin_id = str(admin_id)
+                matching = [key for key in index[start:end] if self.blacklist[key[2]].get("admin_id") == admin_id]
+                total = len(matching)
+                keys = matching[page * per_page:(page + 1) * per_page]
+            return [(key[2], dict(self.blacklist[key[2]])) for key in keys], total
+
+# ==================== STORE SERVER ====================
+
+class StoreManager(BaseManager):
+    pass
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+def store_authkey(authkey=None):
+    """authkey, or STORE_AUTHKEY, as bytes. Raises ValueError if neither is set"""
+    authkey = authkey or STORE_AUTHKEY
+    if not authkey:
+        raise ValueError("STORE_AUTHKEY isn't set: the store server needs a secret shared with "
+                         "the bot processes (launcher.py generates one)")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+def connect_store(address, authkey=None):
+    """Proxy to the LocalStore held by a running store server ("host:port")"""
+    StoreManager.register("get_store")
+    manager = StoreManager(address=parse_address(address), authkey=store_authkey(authkey))
+    manager.connect()
+    return manager.get_store()
+
+def backup_loop(store, minutes):
+    while True:
+        time.sleep(minutes * 60)
+        try:
+            store.backup()
+        except Exception as e:
+            print(f"[WARN] Backup failed: {e}")
+
+def serve(host, port, guilds_dir=GUILDS_DIR, blacklist_file=BLACKLIST_FILE,
+          matches_file=MATCH_HISTORY_FILE, authkey=None, metrics_port=None,
+          players_file=DATA_FILE):
+    authkey = store_authkey(authkey)
+    store = LocalStore(guilds_dir, blacklist_file, matches_file, players_file)
+    if metrics_port:
+        metrics.gauge("cbac_store_players", "Players in the guilds loaded by the store", callback=store.player_count)
+        metrics.gauge("cbac_store_guilds_loaded", "Guild partitions held in memory",
+                      callback=lambda: len(store.partitions))
+        metrics.start_http_server(host, metrics_port)
+    if BACKUP_INTERVAL:
+        threading.Thread(target=backup_loop, args=(store, BACKUP_INTERVAL), name="store-backup", daemon=True).start()
+    StoreManager.register("get_store", callable=lambda: store)
+    manager = StoreManager(address=(host, port), authkey=authkey)
+    server = manager.get_server()
+    print(f"✅ Store serving guild players from {guilds_dir} on {host}:{port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve player, match, lobby and party state to bot processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50000)
+    parser.add_argument("--guilds-dir", default=GUILDS_DIR)
+    parser.add_argument("--players-file", default=DATA_FILE, help="Global players file to split by guild on first start")
+    parser.add_argument("--blacklist-file", default=BLACKLIST_FILE)
+    parser.add_argument("--matches-file", default=MATCH_HISTORY_FILE)
+    parser.add_argument("--metrics-port", type=int, help="Serve save metrics on this port")
+    args = parser.parse_args()
+    if not STORE_AUTHKEY:
+        parser.exit(1, "❌ Set STORE_AUTHKEY to a secret shared with the bot processes\n")
+
+    # Serve through the imported module so pickled PlayerStats are storage.PlayerStats, not __main__'s
+    import storage
+    storage.serve(args.host, args.port, args.guilds_dir, args.blacklist_file, args.matches_file,
+                  metrics_port=args.metrics_port, players_file=args.players_file)
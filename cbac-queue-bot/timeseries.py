@@ -0,0 +1,185 @@
+"""Per-player ELO time series, downsampled as it ages.
+
+    history = EloHistory()
+    history.add(user_id, timestamp, elo)
+    history.range(user_id, since, until)  # [(timestamp, low, high, close)]
+
+Every rating change is a raw point. Once a point is older than RAW_DAYS it's
+folded into its day's bucket, and days older than DAILY_DAYS into their
+week's bucket. Buckets keep the low, high and closing ELO and are stamped
+with their start (UTC midnight, Monday for weeks). A player's storage is
+bounded by their last RAW_DAYS of matches, one bucket per day for the
+DAILY_DAYS before that and one per week beyond, so the whole trajectory
+stays queryable without keeping every match forever.
+
+Each tier is sorted by time in parallel arrays and the tiers never overlap,
+so a range query is a bisect per tier plus the points it returns.
+"""
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+
+RAW_DAYS = int(os.getenv("ELO_HISTORY_RAW_DAYS", "30"))
+DAILY_DAYS = int(os.getenv("ELO_HISTORY_DAILY_DAYS", "365"))
+
+DAY = 86400
+WEEK = 7 * DAY
+MONDAY = 4 * DAY  # The epoch was a Thursday
+
+def day_start(ts):
+    return ts - ts % DAY
+
+def week_start(ts):
+    return ts - (ts - MONDAY) % WEEK
+
+class Tier:
+    """Rollup buckets: start time, low, high and closing ELO"""
+    __slots__ = ("ts", "low", "high", "close")
+
+    def __init__(self):
+        self.ts = array("d")
+        self.low = array("i")
+        self.high = array("i")
+        self.close = array("i")
+
+    def __len__(self):
+        return len(self.ts)
+
+    def merge(self, bucket, low, high, close):
+        """Fold a point or bucket into `bucket`, which is the last one or a new one after it"""
+        if self.ts and self.ts[-1] == bucket:
+            self.low[-1] = min(self.low[-1], low)
+            self.high[-1] = max(self.high[-1], high)
+            self.close[-1] = close
+        else:
+            self.ts.append(bucket)
+            self.low.append(low)
+            self.high.append(high)
+            self.close.append(close)
+
+    def drop(self, count):
+        for column in (self.ts, self.low, self.high, self.close):
+            del column[:count]
+
+    def range(self, since, until):
+        lo, hi = bisect_left(self.ts, since), bisect_right(self.ts, until)
+        return list(zip(self.ts[lo:hi], self.low[lo:hi], self.high[lo:hi], self.close[lo:hi]))
+
+    def to_list(self):
+        return [list(row) for row in zip(self.ts, self.low, self.high, self.close)]
+
+    @classmethod
+    def from_list(cls, rows):
+        tier = cls()
+        for row in rows:
+            tier.merge(*row)
+        return tier
+
+class EloSeries:
+    """One player's history: raw points, then daily and weekly buckets before them"""
+    __slots__ = ("raw_ts", "raw_elo", "daily", "weekly")
+
+    def __init__(self):
+        self.raw_ts = array("d")
+        self.raw_elo = array("i")
+        self.daily = Tier()
+        self.weekly = Tier()
+
+    def __len__(self):
+        return len(self.raw_ts) + len(self.daily) + len(self.weekly)
+
+    def last_time(self):
+        for ts in (self.raw_ts, self.daily.ts, self.weekly.ts):
+            if ts:
+                return ts[-1]
+        return None
+
+    def add(self, ts, elo):
+        self.raw_ts.append(ts)
+        self.raw_elo.append(elo)
+        self.roll(ts)
+
+    def roll(self, now):
+        """Fold raw points and daily buckets that have aged out into the next tier.
+        Cutoffs are whole days and weeks, so a bucket is never split between tiers"""
+        cutoff = day_start(now - RAW_DAYS * DAY)
+        if self.raw_ts and self.raw_ts[0] < cutoff:
+            count = bisect_left(self.raw_ts, cutoff)
+            for ts, elo in zip(self.raw_ts[:count], self.raw_elo[:count]):
+                self.daily.merge(day_start(ts), elo, elo, elo)
+            del self.raw_ts[:count]
+            del self.raw_elo[:count]
+
+        cutoff = week_start(now - DAILY_DAYS * DAY)
+        daily = self.daily
+        if daily.ts and daily.ts[0] < cutoff:
+            count = bisect_left(daily.ts, cutoff)
+            for i in range(count):
+                self.weekly.merge(week_start(daily.ts[i]), daily.low[i], daily.high[i], daily.close[i])
+            daily.drop(count)
+
+    def range(self, since, until):
+        lo, hi = bisect_left(self.raw_ts, since), bisect_right(self.raw_ts, until)
+        raw = [(ts, elo, elo, elo) for ts, elo in zip(self.raw_ts[lo:hi], self.raw_elo[lo:hi])]
+        return self.weekly.range(since, until) + self.daily.range(since, until) + raw
+
+    def to_dict(self):
+        return {
+            "raw": [[ts, elo] for ts, elo in zip(self.raw_ts, self.raw_elo)],
+            "daily": self.daily.to_list(),
+            "weekly": self.weekly.to_list()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        series = cls()
+        for ts, elo in data.get("raw", []):
+            series.raw_ts.append(ts)
+            series.raw_elo.append(elo)
+        series.daily = Tier.from_list(data.get("daily", []))
+        series.weekly = Tier.from_list(data.get("weekly", []))
+        return series
+
+class EloHistory:
+    """{user_id: EloSeries}, keyed by the string ids the store uses"""
+
+    def __init__(self, series=None):
+        self.series = series or {}
+
+    def __len__(self):
+        return len(self.series)
+
+    def point_count(self):
+        return sum(len(s) for s in self.series.values())
+
+    def add(self, user_id, ts, elo):
+        """Record a rating change. Points at or before the player's latest are
+        ignored, so replaying a journal that's partly in the snapshot is harmless"""
+        series = self.series.get(user_id)
+        if series is None:
+            series = self.series[user_id] = EloSeries()
+        else:
+            last = series.last_time()
+            if last is not None and ts <= last:
+                return False
+        series.add(ts, elo)
+        return True
+
+    def range(self, user_id, since=None, until=None):
+        """[(timestamp, low, high, close)] oldest first, raw points have low == high == close"""
+        series = self.series.get(user_id)
+        if series is None:
+            return []
+        return series.range(float("-inf") if since is None else since,
+                            float("inf") if until is None else until)
+
+    def roll_all(self, now):
+        for series in self.series.values():
+            series.roll(now)
+
+    def to_dict(self):
+        return {uid: series.to_dict() for uid, series in self.series.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({uid: EloSeries.from_dict(series) for uid, series in data.items()})
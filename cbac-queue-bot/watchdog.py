@@ -0,0 +1,150 @@
+"""Event-loop lag watchdog that catches the code blocking the loop.
+
+    watchdog.start()          # from inside the running loop, e.g. setup_hook
+    watchdog.report(limit=5)  # [Offender], worst first
+
+A task on the loop wakes every TICK_SECONDS and records how late it woke in
+cbac_event_loop_lag_seconds. A daemon thread watches the time of the last
+tick: once the loop hasn't ticked for LAG_THRESHOLD_MS, it grabs the loop
+thread's stack with sys._current_frames(), i.e. the blocking code caught in
+the act, and keeps sampling until the loop comes back. When the tick finally
+runs, the stall is billed to the site it was sampled at most often.
+
+Sites are the innermost frame in this project's own files (the line in
+storage.py that calls json.dump, not json's encoder), so one slow call
+shows up as one offender however deep the blocking library code goes.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+import metrics
+
+LAG_THRESHOLD_MS = float(os.getenv("LAG_THRESHOLD_MS", "100"))
+TICK_SECONDS = 0.05
+STACK_DEPTH = 8  # Frames kept per offender, innermost last
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOOP_LAG = metrics.histogram("cbac_event_loop_lag_seconds", "How late the event loop ran a due timer",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_STALLS = metrics.counter("cbac_event_loop_stalls_total", "Event loop stalls over the lag threshold")
+
+class Offender:
+    __slots__ = ("site", "stalls", "seconds", "worst", "last_seen", "stack")
+
+    def __init__(self, site):
+        self.site = site
+        self.stalls = 0
+        self.seconds = 0.0
+        self.worst = 0.0
+        self.last_seen = None
+        self.stack = []  # Formatted frames of the latest sample
+
+offenders = {}                  # {site: Offender}
+recent_stalls = deque(maxlen=50)  # (datetime, seconds, site), newest last
+max_lag = 0.0
+
+lock = threading.Lock()
+pending = []          # (site, stack) samples of the stall in progress
+last_tick = time.perf_counter()
+loop_thread_id = None
+tick_task = None
+monitor_thread = None
+
+def is_own_file(filename):
+    return (filename.startswith(PROJECT_DIR) and "site-packages" not in filename
+            and os.path.abspath(filename) != os.path.abspath(__file__))
+
+def blocking_site(frame):
+    """(site, formatted stack) for the loop thread's current frame"""
+    summary = traceback.extract_stack(frame)
+    site = None
+    for entry in reversed(summary):
+        if is_own_file(entry.filename):
+            site = f"{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}"
+            break
+    if site is None:
+        innermost = summary[-1]
+        site = f"{os.path.basename(innermost.filename)}:{innermost.lineno} in {innermost.name}"
+    stack = [f"{os.path.basename(e.filename)}:{e.lineno} {e.name}" for e in summary[-STACK_DEPTH:]]
+    return site, stack
+
+def sample_loop():
+    """Daemon thread: sample the loop thread's stack while it's overdue"""
+    threshold = LAG_THRESHOLD_MS / 1000
+    poll = max(threshold / 4, 0.01)
+    while True:
+        time.sleep(poll)
+        if time.perf_counter() - last_tick < threshold + TICK_SECONDS:
+            continue
+        frame = sys._current_frames().get(loop_thread_id)
+        if frame is None:
+            continue
+        sample = blocking_site(frame)
+        del frame
+        with lock:
+            pending.append(sample)
+
+def record_stall(lag):
+    global max_lag
+    with lock:
+        samples = pending[:]
+        pending.clear()
+    max_lag = max(max_lag, lag)
+    if lag * 1000 < LAG_THRESHOLD_MS:
+        return
+    LOOP_STALLS.inc()
+    if samples:
+        site = Counter(s for s, _ in samples).most_common(1)[0][0]
+        stack = next(stack for s, stack in reversed(samples) if s == site)
+    else:
+        site, stack = "unsampled (shorter than a sampling interval)", []
+    offender = offenders.get(site)
+    if offender is None:
+        offender = offenders[site] = Offender(site)
+    offender.stalls += 1
+    offender.seconds += lag
+    offender.worst = max(offender.worst, lag)
+    offender.last_seen = datetime.now()
+    offender.stack = stack or offender.stack
+    recent_stalls.append((offender.last_seen, lag, site))
+    print(f"🧊 Event loop blocked {lag * 1000:.0f}ms at {site}")
+
+async def tick():
+    global last_tick
+    while True:
+        start = last_tick = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        last_tick = time.perf_counter()
+        lag = max(0.0, last_tick - start - TICK_SECONDS)
+        LOOP_LAG.observe(lag)
+        if lag * 1000 >= LAG_THRESHOLD_MS or pending:
+            record_stall(lag)
+
+def start():
+    """Start watching the running loop. Safe to call again after a reconnect"""
+    global loop_thread_id, tick_task, monitor_thread, last_tick
+    if tick_task is not None and not tick_task.done():
+        return
+    loop_thread_id = threading.get_ident()
+    last_tick = time.perf_counter()
+    tick_task = asyncio.get_running_loop().create_task(tick())
+    if monitor_thread is None:
+        monitor_thread = threading.Thread(target=sample_loop, name="loop-watchdog", daemon=True)
+        monitor_thread.start()
+
+def report(limit=10):
+    """Offenders with the most total stall time first"""
+    return sorted(offenders.values(), key=lambda o: o.seconds, reverse=True)[:limit]
+
+def reset():
+    global max_lag
+    offenders.clear()
+    recent_stalls.clear()
+    max_lag = 0.0